@@ -34,12 +34,55 @@ TOP_K_CHUNKS: int = int(os.getenv("TOP_K_CHUNKS", "3"))  # Reduced to 3 to prior
 # Performance Settings
 ENABLE_STREAMING: bool = os.getenv("ENABLE_STREAMING", "true").lower() == "true"
 PARALLEL_EMBEDDINGS: bool = os.getenv("PARALLEL_EMBEDDINGS", "true").lower() == "true"
+PARALLEL_EMBEDDING_WORKERS: int = int(os.getenv("PARALLEL_EMBEDDING_WORKERS", "5"))  # In-flight embedding batches; higher values tend to hit 429s
 CACHE_EMBEDDINGS: bool = os.getenv("CACHE_EMBEDDINGS", "true").lower() == "true"
+# Chunk embedding requests: max inputs per request and estimated tokens (chars/4) per request
+EMBEDDING_BATCH_SIZE: int = int(os.getenv("EMBEDDING_BATCH_SIZE", "100"))
+EMBEDDING_BATCH_MAX_TOKENS: int = int(os.getenv("EMBEDDING_BATCH_MAX_TOKENS", "280000"))
+EMBEDDING_MAX_RETRIES: int = int(os.getenv("EMBEDDING_MAX_RETRIES", "5"))  # Attempts per request on 429/5xx
+EMBEDDING_RETRY_BASE_DELAY: float = float(os.getenv("EMBEDDING_RETRY_BASE_DELAY", "1.0"))  # Seconds, doubled per attempt
+
+# Chat completion retries on 429/5xx/timeouts (attempts, and base seconds doubled per attempt)
+LLM_MAX_RETRIES: int = int(os.getenv("LLM_MAX_RETRIES", "3"))
+LLM_RETRY_BASE_DELAY: float = float(os.getenv("LLM_RETRY_BASE_DELAY", "2.0"))
+
+# Client-side pacing against the account's rate limits (0 = unlimited)
+LLM_REQUESTS_PER_MINUTE: int = int(os.getenv("LLM_REQUESTS_PER_MINUTE", "0"))
+LLM_TOKENS_PER_MINUTE: int = int(os.getenv("LLM_TOKENS_PER_MINUTE", "0"))
+# Reports analyzed at once by the web API; further requests wait their turn
+# without holding a worker thread
+MAX_CONCURRENT_ANALYSES: int = int(os.getenv("MAX_CONCURRENT_ANALYSES", "8"))
+
+# Request Structured Outputs (strict JSON schema) for eligibility responses;
+# falls back to plain JSON mode if the model/provider rejects json_schema
+LLM_STRUCTURED_OUTPUTS: bool = os.getenv("LLM_STRUCTURED_OUTPUTS", "true").lower() == "true"
 
 # Batch Processing Settings
 # Maximum number of drugs to process in a single batched LLM call
 # For more drugs, sequential processing is used for better accuracy
 MAX_BATCH_SIZE: int = int(os.getenv("MAX_BATCH_SIZE", "10"))  # Increased from 3 for better batching
+# Reports extracted together in one LLM call by InputParser.parse_reports
+MAX_REPORTS_PER_CALL: int = int(os.getenv("MAX_REPORTS_PER_CALL", "6"))
+# Estimated (chars/4) token budget for one batched eligibility prompt; larger
+# reports are split into several batches instead of one oversized call
+MAX_PROMPT_TOKENS: int = int(os.getenv("MAX_PROMPT_TOKENS", "32000"))
+# Concurrent batched eligibility calls for reports split into several batches
+ELIGIBILITY_BATCH_WORKERS: int = int(os.getenv("ELIGIBILITY_BATCH_WORKERS", "4"))
+# Concurrent per-drug LLM calls when a batched call fails; 1 = sequential (low rate-limit tiers)
+ELIGIBILITY_FALLBACK_WORKERS: int = int(os.getenv("ELIGIBILITY_FALLBACK_WORKERS", "4"))
+# Answer drugs with no retrieved SUT chunks without an LLM call (manual review result)
+ELIGIBILITY_FAST_PATH: bool = os.getenv("ELIGIBILITY_FAST_PATH", "true").lower() == "true"
+# Per-drug eligibility result cache: identical inputs (drug, diagnosis, patient,
+# doctor, SUT chunks, model, prompt templates) reuse the stored result instead of a
+# new LLM call. Off by default: it stores report-derived patient data on disk, and
+# the service is otherwise stateless (docs/architecture.md §12.2)
+CACHE_ELIGIBILITY: bool = os.getenv("CACHE_ELIGIBILITY", "false").lower() == "true"
+ELIGIBILITY_CACHE_TTL: int = int(os.getenv("ELIGIBILITY_CACHE_TTL", str(7 * 24 * 3600)))  # Seconds
+# Raw LLM response cache keyed by (model, provider, prompts, response format). Report
+# parsing calls never use it. Off by default: eligibility prompts and responses contain
+# report-derived patient data, and the service is otherwise stateless (docs/architecture.md §12.2)
+CACHE_LLM_RESPONSES: bool = os.getenv("CACHE_LLM_RESPONSES", "false").lower() == "true"
+LLM_CACHE_TTL: int = int(os.getenv("LLM_CACHE_TTL", str(7 * 24 * 3600)))  # Seconds
 
 # Chunking Strategy - can be "semantic", "fixed", or "hybrid"
 CHUNKING_STRATEGY: str = os.getenv("CHUNKING_STRATEGY", "semantic")
@@ -48,6 +91,8 @@ CHUNKING_STRATEGY: str = os.getenv("CHUNKING_STRATEGY", "semantic")
 MIN_CHUNK_SIZE: int = int(os.getenv("MIN_CHUNK_SIZE", "512"))  # ~128 tokens minimum
 MAX_CHUNK_SIZE: int = int(os.getenv("MAX_CHUNK_SIZE", "4096"))  # ~1024 tokens maximum
 PRESERVE_PARAGRAPHS: bool = os.getenv("PRESERVE_PARAGRAPHS", "true").lower() == "true"
+PARALLEL_ENRICH_MIN_CHUNKS: int = int(os.getenv("PARALLEL_ENRICH_MIN_CHUNKS", "200"))  # Below this, process-pool startup costs more than it saves
+PARALLEL_PDF_MIN_PAGES: int = int(os.getenv("PARALLEL_PDF_MIN_PAGES", "64"))  # PDFs with fewer pages are extracted in-process
 
 # Language Settings
 OUTPUT_LANGUAGE: str = os.getenv("OUTPUT_LANGUAGE", "turkish")
@@ -55,10 +100,42 @@ OUTPUT_LANGUAGE: str = os.getenv("OUTPUT_LANGUAGE", "turkish")
 # FAISS Settings
 FAISS_INDEX_PATH: str = "data/faiss_index"
 FAISS_METADATA_PATH: str = "data/faiss_metadata.json"
+# Corpora at or above this size get an IVF index (approximate, probes nprobe lists)
+# instead of exact flat search
+FAISS_IVF_MIN_VECTORS: int = int(os.getenv("FAISS_IVF_MIN_VECTORS", "10000"))
+# IVF lists probed per query (0 = nlist/16, min 4); applied on create and load.
+# Higher = better recall, slower search.
+FAISS_NPROBE: int = int(os.getenv("FAISS_NPROBE", "0"))
+# Product-quantize IVF vectors into this many 1-byte codes (0 = keep full vectors).
+# Must divide the embedding dimension; needs >= 9984 training vectors.
+FAISS_IVF_PQ_M: int = int(os.getenv("FAISS_IVF_PQ_M", "0"))
+# Metric for newly built indexes: "ip" (cosine on L2-normalized vectors) or "l2".
+# Existing indexes keep the metric they were built with.
+FAISS_METRIC: str = os.getenv("FAISS_METRIC", "ip").lower()
+# Storage precision of vectors in newly built indexes: "float32" (exact),
+# "float16" (half the memory/disk, scores differ by ~1e-5) or "int8" (a quarter,
+# per-dimension 8-bit scalar quantization trained on the corpus; scores differ by ~1e-3)
+EMBEDDING_DTYPE: str = os.getenv("EMBEDDING_DTYPE", "float32").lower()
+
+# Chunk embedding cache (content hash -> vector), used when CACHE_EMBEDDINGS is on
+CHUNK_EMBEDDING_CACHE_PATH: str = "data/chunk_emb_cache.sqlite"
+
+# Whole-document processing output (chunks + vectors) keyed by PDF bytes and
+# chunking/embedding settings, used by SUTDocumentProcessor when CACHE_EMBEDDINGS is on
+DOCUMENT_CACHE_DIR: str = os.getenv("DOCUMENT_CACHE_DIR", "data/document_cache")
+
+# Eligibility result cache, used when CACHE_ELIGIBILITY is on
+ELIGIBILITY_CACHE_PATH: str = "data/eligibility_cache.sqlite"
+
+# LLM response cache, used when CACHE_LLM_RESPONSES is on
+LLM_CACHE_PATH: str = "data/llm_cache.sqlite"
 
 # File Paths
 SUT_PDF_PATH: str = "data/SUT.pdf"
 SAMPLE_REPORTS_DIR: str = "data/sample_reports"
+# PDF text extraction: "auto" (pypdfium2 if installed, else PyPDF2), "pdfium" or "pypdf2".
+# Backends split text slightly differently; rebuild the index after switching.
+PDF_BACKEND: str = os.getenv("PDF_BACKEND", "auto").lower()
 
 # EK-4 Document Paths
 EK4_DOCUMENTS = {
@@ -7,7 +7,10 @@ This module implements multiple chunking strategies:
 """
 
 import logging
-from typing import List, Dict, Any, Tuple
+import multiprocessing
+import re
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Any, Optional, Tuple
 from dataclasses import dataclass
 
 from app.models.eligibility import Chunk, ChunkMetadata
@@ -17,11 +20,17 @@ from app.config.settings import (
     CHUNKING_STRATEGY,
     MIN_CHUNK_SIZE,
     MAX_CHUNK_SIZE,
-    PRESERVE_PARAGRAPHS
+    PRESERVE_PARAGRAPHS,
+    PARALLEL_ENRICH_MIN_CHUNKS
 )
 
 logger = logging.getLogger(__name__)
 
+# Compiled once at import; the tokenizers run on every chunk during indexing
+_LOWER_TOKEN_RE = re.compile(r'[^\W_]+')          # runs of str.isalnum() characters
+_PRESERVE_TOKEN_RE = re.compile(r'[\w.\-]+')      # alnum plus '.', '-', '_'
+_SENTENCE_END_RE = re.compile(r'[.?!][ \t\n\r]*')  # terminator and trailing whitespace
+
 
 class SUTDocumentChunker:
     """
@@ -33,6 +42,35 @@ class SUTDocumentChunker:
     - hybrid: Section-based chunking with size constraints (default)
     """
 
+    # Metadata term lists (built once, shared by every chunk)
+    ETKIN_MADDE_TERMS = frozenset({
+        "ezetimib", "statin", "atorvastatin", "rosuvastatin", "simvastatin", "niasin",
+        "metoprolol", "bisoprolol", "carvedilol", "clopidogrel", "aspirin", "warfarin",
+        "interferon", "glatiramer", "teriflunomid", "dimetil", "fumarat", "fingolimod",
+        "natalizumab", "alemtuzumab", "okrelizumab", "kladribin", "fampiridin",
+        "iloprost", "bosentan", "masitentan", "sildenafil", "riociguat", "seleksipag",
+        "tadalafil", "epoprostenol", "treprostinil", "ambrisentan",
+        "bevacizumab", "ranibizumab", "aflibersept", "deksametazon", "verteporfin",
+        "dienogest", "progesteron", "östrojen", "östradiol", "tibolon",
+        "evokumab", "prokumab"
+    })
+    ETKIN_MADDE_SUFFIXES = ("mab", "stat", "pril")
+    KEYWORD_UNITS = frozenset({"yaş", "ay", "hafta", "yıl"})
+    SPECIAL_TERMS = (
+        "kardiyoloji", "iç hastalıkları", "endokrinoloji",
+        "hipertansiyon", "diabet", "kolesterol",
+        "uzman hekim", "raporu", "tedavi"
+    )
+    DRUG_INDICATORS = (
+        "ilaç", "etkin madde", "doz", "tedavi",
+        "kullanım", "reçete", "farmakolojik"
+    )
+    CONDITION_INDICATORS = (
+        "gerekli", "şart", "koşul", "ancak",
+        "yalnızca", "sadece", "mutlaka",
+        "en az", "en fazla", "üstünde", "altında"
+    )
+
     def __init__(self, strategy: str = CHUNKING_STRATEGY, doc_type: str = "SUT", doc_source: str = "9.5.17229.pdf"):
         """
         Initialize the chunker.
@@ -71,6 +109,9 @@ class SUTDocumentChunker:
         else:  # hybrid (default)
             chunks = self._hybrid_chunking(cleaned_text)
 
+        # Metadata çıkarımı tüm chunk'lar için tek geçişte
+        self._enrich_chunks(chunks)
+
         self.logger.info(f"Created {len(chunks)} chunks")
         return chunks
 
@@ -281,7 +322,7 @@ class SUTDocumentChunker:
 
     def _create_chunk(self, text: str, idx: int, start_ref: int, end_ref: int) -> Chunk:
         """
-        Create a chunk object with metadata.
+        Create a chunk object (metadata is filled in by _enrich_chunks).
         
         Args:
             text: Chunk text
@@ -296,10 +337,17 @@ class SUTDocumentChunker:
         doc_prefix = self.doc_type.lower().replace("/", "_").replace("-", "_")
         chunk_id = f"{doc_prefix}_chunk_{idx:04d}"
         
-        metadata = self._enrich_metadata(text, start_ref, end_ref)
-        # Add document source metadata
-        metadata.doc_type = self.doc_type
-        metadata.doc_source = self.doc_source
+        # Filled in by _enrich_chunks once all chunks exist
+        metadata = ChunkMetadata(
+            section="",
+            topic="",
+            etkin_madde=[],
+            keywords=[],
+            drug_related=False,
+            has_conditions=False,
+            doc_type=self.doc_type,
+            doc_source=self.doc_source
+        )
         
         return Chunk(
             chunk_id=chunk_id,
@@ -309,49 +357,76 @@ class SUTDocumentChunker:
             end_line=end_ref
         )
 
+    def _enrich_chunks(self, chunks: List[Chunk]) -> None:
+        """
+        Chunk metadata'sını doldurur.
+
+        Large documents are enriched in a process pool (pure-Python CPU work,
+        so threads would serialize on the GIL). Inside a worker process, e.g.
+        setup_faiss's per-document pool, enrichment stays serial.
+        """
+        texts = [chunk.content for chunk in chunks]
+        starts = [chunk.start_line for chunk in chunks]
+        ends = [chunk.end_line for chunk in chunks]
+
+        if len(chunks) >= PARALLEL_ENRICH_MIN_CHUNKS and multiprocessing.parent_process() is None:
+            self.logger.info(f"Enriching {len(chunks)} chunks in a process pool")
+            with ProcessPoolExecutor() as executor:
+                metadatas = list(executor.map(self._enrich_metadata, texts, starts, ends, chunksize=32))
+        else:
+            metadatas = [self._enrich_metadata(*args) for args in zip(texts, starts, ends)]
+
+        for chunk, metadata in zip(chunks, metadatas):
+            # Add document source metadata
+            metadata.doc_type = self.doc_type
+            metadata.doc_source = self.doc_source
+            chunk.metadata = metadata
+
     def _chunk_by_sections(self, lines: List[str]) -> List[tuple[str, int, int]]:
         """
         Metni madde bazlı bölümlere ayırır.
 
+        The current chunk is tracked as the span lines[current_start:i + 1];
+        text is only joined when a chunk is emitted.
+
         Returns:
             List of (chunk_text, start_line, end_line)
         """
         chunks = []
-        current_chunk = []
         current_start = 0
         current_length = 0
 
         for i, line in enumerate(lines):
-            current_chunk.append(line)
             current_length += len(line)
 
             # Madde başı kontrolü (örn: "4.2.28")
             if self._is_section_header(line):
-                # Önceki chunk'ı kaydet
-                if current_chunk and i > current_start:
-                    chunk_text = '\n'.join(current_chunk[:-1])  # Son satır hariç
+                # Önceki chunk'ı kaydet (son satır hariç)
+                if i > current_start:
+                    chunk_text = '\n'.join(lines[current_start:i])
                     if chunk_text.strip():
                         chunks.append((chunk_text, current_start, i-1))
 
                 # Yeni chunk başlat
-                current_chunk = [line]
                 current_start = i
                 current_length = len(line)
 
             # Chunk boyutu limiti
             elif current_length >= CHUNK_SIZE:
-                chunk_text = '\n'.join(current_chunk)
-                chunks.append((chunk_text, current_start, i))
+                chunks.append(('\n'.join(lines[current_start:i+1]), current_start, i))
 
-                # Overlap için geri git
-                overlap_lines = self._get_overlap_lines(current_chunk, CHUNK_OVERLAP)
-                current_chunk = overlap_lines
-                current_start = i - len(overlap_lines) + 1
-                current_length = sum(len(line) for line in overlap_lines)
+                # Overlap için geri git: en az CHUNK_OVERLAP karakter olana kadar satır al
+                overlap_start = i + 1
+                overlap_length = 0
+                while overlap_start > current_start and overlap_length < CHUNK_OVERLAP:
+                    overlap_start -= 1
+                    overlap_length += len(lines[overlap_start])
+                current_start = overlap_start
+                current_length = overlap_length
 
         # Son chunk'ı ekle
-        if current_chunk:
-            chunk_text = '\n'.join(current_chunk)
+        if current_start < len(lines):
+            chunk_text = '\n'.join(lines[current_start:])
             chunks.append((chunk_text, current_start, len(lines)-1))
 
         return chunks
@@ -360,19 +435,6 @@ class SUTDocumentChunker:
         """Satırın madde başı olup olmadığını kontrol eder."""
         return bool(self._normalize_section_token(line.strip()))
 
-    def _get_overlap_lines(self, lines: List[str], overlap_chars: int) -> List[str]:
-        """Overlap için gerekli satırları döndürür."""
-        overlap_lines = []
-        total_chars = 0
-
-        for line in reversed(lines):
-            if total_chars >= overlap_chars:
-                break
-            overlap_lines.insert(0, line)
-            total_chars += len(line)
-
-        return overlap_lines
-
     def _normalize_section_token(self, text: str) -> str:
         """Satırdaki ilk section benzeri token'ı normalize eder."""
         if not text:
@@ -403,19 +465,14 @@ class SUTDocumentChunker:
         """Basit cümle bölme yardımcı metodu."""
         sentences: List[str] = []
         start = 0
-        length = len(paragraph)
-
-        for idx, char in enumerate(paragraph):
-            if char in '.?!':
-                next_idx = idx + 1
-                while next_idx < length and paragraph[next_idx] in ' \t\n\r':
-                    next_idx += 1
-                sentence = paragraph[start:next_idx].strip()
-                if sentence:
-                    sentences.append(sentence)
-                start = next_idx
-
-        if start < length:
+
+        for match in _SENTENCE_END_RE.finditer(paragraph):
+            sentence = paragraph[start:match.end()].strip()
+            if sentence:
+                sentences.append(sentence)
+            start = match.end()
+
+        if start < len(paragraph):
             tail = paragraph[start:].strip()
             if tail:
                 sentences.append(tail)
@@ -424,33 +481,11 @@ class SUTDocumentChunker:
 
     def _tokenize_lower(self, text: str) -> List[str]:
         """Metni küçük harfli token'lara böler."""
-        tokens: List[str] = []
-        current: List[str] = []
-        for char in text.lower():
-            if char.isalnum() or char in ['ç', 'ğ', 'ı', 'ö', 'ş', 'ü']:
-                current.append(char)
-            else:
-                if current:
-                    tokens.append(''.join(current))
-                    current = []
-        if current:
-            tokens.append(''.join(current))
-        return tokens
+        return _LOWER_TOKEN_RE.findall(text.lower())
 
     def _tokenize_preserve(self, text: str) -> List[str]:
         """Metni noktalama işaretlerini koruyarak token'lara böler."""
-        tokens: List[str] = []
-        current: List[str] = []
-        for char in text:
-            if char.isalnum() or char in ['.', '-', '_']:
-                current.append(char)
-            else:
-                if current:
-                    tokens.append(''.join(current))
-                    current = []
-        if current:
-            tokens.append(''.join(current))
-        return tokens
+        return _PRESERVE_TOKEN_RE.findall(text)
 
     def _looks_like_icd_code(self, token: str) -> bool:
         """Basit kontrollerle ICD koduna benzerliği denetler."""
@@ -486,17 +521,21 @@ class SUTDocumentChunker:
         # Topic çıkar
         topic = self._extract_topic(chunk_text)
 
+        # Lowercase text and tokens are shared by the extractors below
+        text_lower = chunk_text.lower()
+        tokens_lower = self._tokenize_lower(chunk_text)
+
         # Etkin maddeler çıkar
-        etkin_madde = self._extract_etkin_maddeler(chunk_text)
+        etkin_madde = self._extract_etkin_maddeler(chunk_text, tokens_lower)
 
         # Keywords çıkar
-        keywords = self._extract_keywords(chunk_text)
+        keywords = self._extract_keywords(chunk_text, text_lower, tokens_lower)
 
         # Drug related kontrolü
-        drug_related = self._is_drug_related(chunk_text)
+        drug_related = self._is_drug_related(chunk_text, text_lower)
 
         # Conditions kontrolü
-        has_conditions = self._has_conditions(chunk_text)
+        has_conditions = self._has_conditions(chunk_text, text_lower)
 
         return ChunkMetadata(
             section=section,
@@ -525,23 +564,12 @@ class SUTDocumentChunker:
                 return line[:100]  # İlk 100 karakter
         return "Genel"
 
-    def _extract_etkin_maddeler(self, text: str) -> List[str]:
+    def _extract_etkin_maddeler(self, text: str, tokens_lower: Optional[List[str]] = None) -> List[str]:
         """Metinden etkin maddeleri çıkarır."""
-        base_terms = {
-            "ezetimib", "statin", "atorvastatin", "rosuvastatin", "simvastatin", "niasin",
-            "metoprolol", "bisoprolol", "carvedilol", "clopidogrel", "aspirin", "warfarin",
-            "interferon", "glatiramer", "teriflunomid", "dimetil", "fumarat", "fingolimod",
-            "natalizumab", "alemtuzumab", "okrelizumab", "kladribin", "fampiridin",
-            "iloprost", "bosentan", "masitentan", "sildenafil", "riociguat", "seleksipag",
-            "tadalafil", "epoprostenol", "treprostinil", "ambrisentan",
-            "bevacizumab", "ranibizumab", "aflibersept", "deksametazon", "verteporfin",
-            "dienogest", "progesteron", "östrojen", "östradiol", "tibolon",
-            "evokumab", "prokumab"
-        }
-
-        suffixes = ("mab", "stat", "pril")
-
-        tokens = self._tokenize_lower(text)
+        base_terms = self.ETKIN_MADDE_TERMS
+        suffixes = self.ETKIN_MADDE_SUFFIXES
+
+        tokens = tokens_lower if tokens_lower is not None else self._tokenize_lower(text)
         etkin_maddeler: Dict[str, None] = {}
 
         for token in tokens:
@@ -549,14 +577,21 @@ class SUTDocumentChunker:
                 etkin_maddeler[token] = None
                 continue
 
-            for suffix in suffixes:
-                if token.endswith(suffix) and len(token) > len(suffix) + 1:
-                    etkin_maddeler[token] = None
-                    break
+            # One C-level check rejects most tokens before the per-suffix length test
+            if token.endswith(suffixes):
+                for suffix in suffixes:
+                    if token.endswith(suffix) and len(token) > len(suffix) + 1:
+                        etkin_maddeler[token] = None
+                        break
 
         return list(etkin_maddeler.keys())
 
-    def _extract_keywords(self, text: str) -> List[str]:
+    def _extract_keywords(
+        self,
+        text: str,
+        text_lower: Optional[str] = None,
+        tokens_lower: Optional[List[str]] = None
+    ) -> List[str]:
         """Metinden önemli anahtar kelimeleri çıkarır."""
         keywords = []
 
@@ -569,43 +604,29 @@ class SUTDocumentChunker:
                 keywords.append(candidate)
 
         # Yaş, süre gibi sayısal değerler
-        words = self._tokenize_lower(text)
-        units = {"yaş", "ay", "hafta", "yıl"}
+        words = tokens_lower if tokens_lower is not None else self._tokenize_lower(text)
+        units = self.KEYWORD_UNITS
         for idx in range(len(words) - 1):
             if words[idx].isdigit() and words[idx + 1] in units:
                 keywords.append(f"{words[idx]}{words[idx + 1]}")
 
         # Özel terimler
-        special_terms = [
-            "kardiyoloji", "iç hastalıkları", "endokrinoloji",
-            "hipertansiyon", "diabet", "kolesterol",
-            "uzman hekim", "raporu", "tedavi"
-        ]
-
-        text_lower = text.lower()
-        for term in special_terms:
+        if text_lower is None:
+            text_lower = text.lower()
+        for term in self.SPECIAL_TERMS:
             if term in text_lower:
                 keywords.append(term)
 
-        return list(set(keywords))  # Tekrarları kaldır
+        return list(dict.fromkeys(keywords))  # Tekrarları kaldır (sırayı koruyarak)
 
-    def _is_drug_related(self, text: str) -> bool:
+    def _is_drug_related(self, text: str, text_lower: Optional[str] = None) -> bool:
         """Metnin ilaçla ilgili olup olmadığını kontrol eder."""
-        drug_indicators = [
-            "ilaç", "etkin madde", "doz", "tedavi",
-            "kullanım", "reçete", "farmakolojik"
-        ]
-
-        text_lower = text.lower()
-        return any(indicator in text_lower for indicator in drug_indicators)
+        if text_lower is None:
+            text_lower = text.lower()
+        return any(indicator in text_lower for indicator in self.DRUG_INDICATORS)
 
-    def _has_conditions(self, text: str) -> bool:
+    def _has_conditions(self, text: str, text_lower: Optional[str] = None) -> bool:
         """Metinde koşul ifadeleri olup olmadığını kontrol eder."""
-        condition_indicators = [
-            "gerekli", "şart", "koşul", "ancak",
-            "yalnızca", "sadece", "mutlaka",
-            "en az", "en fazla", "üstünde", "altında"
-        ]
-
-        text_lower = text.lower()
-        return any(indicator in text_lower for indicator in condition_indicators)
+        if text_lower is None:
+            text_lower = text.lower()
+        return any(indicator in text_lower for indicator in self.CONDITION_INDICATORS)
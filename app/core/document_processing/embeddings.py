@@ -1,8 +1,18 @@
 """Embeddings generation utilities using OpenAI or OpenRouter."""
 
+import os
+import base64
+import hashlib
 import logging
-from typing import List, Dict, Any, Optional
-from openai import OpenAI
+import random
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Tuple
+
+import numpy as np
+from openai import OpenAI, APIConnectionError, APIStatusError, APITimeoutError
 
 from app.models.eligibility import Chunk
 from app.config.settings import (
@@ -13,10 +23,111 @@ from app.config.settings import (
     OPENROUTER_BASE_URL,
     OPENAI_API_KEY,
     OPENROUTER_EMBEDDING_PROVIDER,
+    CACHE_EMBEDDINGS,
+    CHUNK_EMBEDDING_CACHE_PATH,
+    EMBEDDING_BATCH_SIZE,
+    EMBEDDING_BATCH_MAX_TOKENS,
+    PARALLEL_EMBEDDINGS,
+    PARALLEL_EMBEDDING_WORKERS,
+    EMBEDDING_MAX_RETRIES,
+    EMBEDDING_RETRY_BASE_DELAY,
 )
 
 logger = logging.getLogger(__name__)
 
+RETRYABLE_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+MAX_RETRY_DELAY = 60.0
+
+
+class AdaptiveLimiter:
+    """
+    Caps in-flight embedding requests and adapts the cap to rate limiting.
+
+    A 429 halves the limit (min 1); every ``recover_after`` successful
+    requests raise it by one again, up to ``max_workers``.
+    """
+
+    def __init__(self, max_workers: int, recover_after: int = 10):
+        self.max_workers = max(1, max_workers)
+        self.current_workers = self.max_workers
+        self.recover_after = recover_after
+        self._in_flight = 0
+        self._successes = 0
+        self._cond = threading.Condition()
+
+    def acquire(self) -> None:
+        with self._cond:
+            while self._in_flight >= self.current_workers:
+                self._cond.wait()
+            self._in_flight += 1
+
+    def release(self) -> None:
+        with self._cond:
+            self._in_flight -= 1
+            self._cond.notify_all()
+
+    def on_success(self) -> None:
+        with self._cond:
+            self._successes += 1
+            if self._successes >= self.recover_after and self.current_workers < self.max_workers:
+                self.current_workers += 1
+                self._successes = 0
+                self._cond.notify_all()
+
+    def on_rate_limit(self) -> None:
+        with self._cond:
+            self.current_workers = max(1, self.current_workers // 2)
+            self._successes = 0
+            logger.warning(f"Rate limited, reducing embedding concurrency to {self.current_workers}")
+
+
+class ChunkEmbeddingCache:
+    """
+    SQLite-backed chunk embedding cache (content hash -> float32 vector).
+
+    Rows are written per batch, so a rerun only embeds chunks whose content
+    changed and an interrupted run keeps what it already paid for.
+    """
+
+    _LOOKUP_BATCH = 500  # Stay well under SQLite's bound-parameter limit
+
+    def __init__(self, path: str):
+        self.logger = logging.getLogger(self.__class__.__name__)
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()  # One connection shared by embedding threads
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("CREATE TABLE IF NOT EXISTS emb (h TEXT PRIMARY KEY, v BLOB NOT NULL)")
+        self._conn.commit()
+
+    def get_many(self, hashes: List[str]) -> Dict[str, np.ndarray]:
+        """Return cached vectors for the given hashes (misses are omitted)."""
+        found: Dict[str, np.ndarray] = {}
+        try:
+            with self._lock:
+                for start in range(0, len(hashes), self._LOOKUP_BATCH):
+                    part = hashes[start:start + self._LOOKUP_BATCH]
+                    placeholders = ",".join("?" * len(part))
+                    rows = self._conn.execute(
+                        f"SELECT h, v FROM emb WHERE h IN ({placeholders})", part
+                    ).fetchall()
+                    for content_hash, blob in rows:
+                        found[content_hash] = np.frombuffer(blob, dtype=np.float32)
+        except sqlite3.Error as e:
+            self.logger.warning(f"Could not read chunk embedding cache: {e}")
+        return found
+
+    def put_many(self, items: Iterable[Tuple[str, np.ndarray]]) -> None:
+        """Insert or replace vectors."""
+        rows = [(content_hash, np.asarray(vector, dtype=np.float32).tobytes()) for content_hash, vector in items]
+        try:
+            with self._lock:
+                self._conn.executemany("INSERT OR REPLACE INTO emb (h, v) VALUES (?, ?)", rows)
+                self._conn.commit()
+        except sqlite3.Error as e:
+            self.logger.warning(f"Could not write chunk embedding cache: {e}")
+
 
 class EmbeddingGenerator:
     """Embeddings generator using OpenAI or OpenRouter."""
@@ -30,21 +141,34 @@ class EmbeddingGenerator:
         """
         self.logger = logging.getLogger(self.__class__.__name__)
         self.provider_preferences: List[str] = []
+        self.limiter = AdaptiveLimiter(PARALLEL_EMBEDDING_WORKERS if PARALLEL_EMBEDDINGS else 1)
+        self._chunk_cache: Optional[ChunkEmbeddingCache] = None
+        self._cache_lock = threading.Lock()
         
         # Determine which client to use based on provider
         if EMBEDDING_PROVIDER == "openrouter":
             self.client = OpenAI(
                 api_key=OPENROUTER_API_KEY,
-                base_url=OPENROUTER_BASE_URL
+                base_url=OPENROUTER_BASE_URL,
+                max_retries=0  # Retries are handled by _with_retry
             )
             self.provider_preferences = self._parse_provider_override(OPENROUTER_EMBEDDING_PROVIDER)
             if self.provider_preferences:
                 self.logger.info(f"OpenRouter embedding provider preference order: {self.provider_preferences}")
             self.logger.info(f"✅ Using OpenRouter embeddings with model: {EMBEDDING_MODEL} (dimension: {EMBEDDING_DIMENSION}) via {OPENROUTER_EMBEDDING_PROVIDER or 'default'}")
         else:
-            self.client = client or OpenAI(api_key=OPENAI_API_KEY)
+            self.client = client or OpenAI(api_key=OPENAI_API_KEY, max_retries=0)
             self.logger.info(f"✅ Using OpenAI embeddings with model: {EMBEDDING_MODEL} (dimension: {EMBEDDING_DIMENSION})")
 
+        # Provider-specific request fields are resolved once here, not on every call.
+        # base64 returns each vector as packed float32 bytes instead of a JSON
+        # number list, so no per-component Python float is ever built.
+        self._request_defaults: Dict[str, Any] = {
+            "model": EMBEDDING_MODEL,
+            "encoding_format": "base64"
+        }
+        self._inject_provider_preferences(self._request_defaults)
+
     @staticmethod
     def _parse_provider_override(raw_value: Optional[str]) -> List[str]:
         """Return a provider preference list from a comma-delimited string."""
@@ -65,7 +189,68 @@ class EmbeddingGenerator:
         extra_body = kwargs.setdefault("extra_body", {})
         extra_body["provider"] = provider_body
     
-    def _create_embedding(self, text: str) -> List[float]:
+    @staticmethod
+    def _retry_after(error: Exception) -> Optional[float]:
+        """Seconds requested by the server's Retry-After header, if any."""
+        response = getattr(error, "response", None)
+        if response is None:
+            return None
+        value = response.headers.get("retry-after")
+        try:
+            return float(value) if value is not None else None
+        except ValueError:
+            return None  # HTTP-date form; fall back to our own backoff
+
+    @staticmethod
+    def _is_retryable(error: Exception) -> bool:
+        if isinstance(error, (APITimeoutError, APIConnectionError)):
+            return True
+        return isinstance(error, APIStatusError) and error.status_code in RETRYABLE_STATUS_CODES
+
+    def _with_retry(self, kwargs: Dict[str, Any]):
+        """
+        Call the embeddings endpoint, retrying 429/5xx/timeouts with exponential
+        backoff (±25% jitter) or the server's Retry-After. Raises once
+        EMBEDDING_MAX_RETRIES attempts are exhausted.
+        """
+        attempts = max(1, EMBEDDING_MAX_RETRIES)
+        for attempt in range(attempts):
+            self.limiter.acquire()
+            try:
+                response = self.client.embeddings.create(**kwargs)
+            except Exception as e:
+                if not self._is_retryable(e) or attempt == attempts - 1:
+                    raise
+                if isinstance(e, APIStatusError) and e.status_code == 429:
+                    self.limiter.on_rate_limit()
+                delay = self._retry_after(e)
+                if delay is None:
+                    delay = EMBEDDING_RETRY_BASE_DELAY * (2 ** attempt) * random.uniform(0.75, 1.25)
+                delay = min(delay, MAX_RETRY_DELAY)
+                self.logger.warning(
+                    f"Embedding request failed ({e.__class__.__name__}), "
+                    f"retrying in {delay:.1f}s (attempt {attempt + 1}/{attempts})"
+                )
+            else:
+                self.limiter.on_success()
+                return response
+            finally:
+                self.limiter.release()
+            time.sleep(delay)
+
+    @staticmethod
+    def _decode_embedding(raw: Any) -> np.ndarray:
+        """
+        Response embedding -> float32 vector.
+
+        base64 payloads are decoded straight into an array; providers that
+        ignore encoding_format and send a float list are still accepted.
+        """
+        if isinstance(raw, str):
+            return np.frombuffer(base64.b64decode(raw), dtype=np.float32)
+        return np.asarray(raw, dtype=np.float32)
+
+    def _create_embedding(self, text: str) -> np.ndarray:
         """
         Create embedding using configured provider.
         
@@ -77,17 +262,12 @@ class EmbeddingGenerator:
         """
         try:
             # Create embedding (OpenRouter's Qwen3 returns 4096 dimensions by default)
-            kwargs = {
-                "model": EMBEDDING_MODEL,
-                "input": text,
-                "encoding_format": "float"
-            }
-
-            self._inject_provider_preferences(kwargs)
+            kwargs = {**self._request_defaults, "input": text}
             
-            response = self.client.embeddings.create(**kwargs)
+            response = self._with_retry(kwargs)
             
-            embedding = response.data[0].embedding
+            # Writable copy: frombuffer over the decoded bytes is read-only
+            embedding = self._decode_embedding(response.data[0].embedding).copy()
             
             # Verify dimension
             if len(embedding) != EMBEDDING_DIMENSION:
@@ -102,10 +282,94 @@ class EmbeddingGenerator:
             self.logger.error(f"Error creating embedding: {e}")
             raise
 
+    def _create_embeddings_batch(self, texts: List[str]) -> np.ndarray:
+        """
+        Create embeddings for several texts with a single API request.
+
+        Args:
+            texts: Texts to embed
+
+        Returns:
+            float32 array of shape (len(texts), dimension), rows in ``texts`` order
+        """
+        if not texts:
+            return np.empty((0, EMBEDDING_DIMENSION), dtype=np.float32)
+
+        try:
+            kwargs = {**self._request_defaults, "input": texts}
+
+            response = self._with_retry(kwargs)
+
+            # Providers are not required to return items in input order
+            data = sorted(response.data, key=lambda item: item.index)
+            if len(data) != len(texts):
+                raise ValueError(f"Expected {len(texts)} embeddings, got {len(data)}")
+
+            vectors = [self._decode_embedding(item.embedding) for item in data]
+            dimension = len(vectors[0])
+            if dimension != EMBEDDING_DIMENSION:
+                self.logger.warning(
+                    f"⚠️ Dimension mismatch! Expected {EMBEDDING_DIMENSION}, got {dimension}. "
+                    f"Update EMBEDDING_DIMENSION in .env to {dimension}"
+                )
+
+            # Fill one float32 block straight from the response; rows are handed
+            # out as views, so no per-vector list or extra copy is kept
+            embeddings = np.empty((len(data), dimension), dtype=np.float32)
+            for i, vector in enumerate(vectors):
+                embeddings[i] = vector
+
+            return embeddings
+
+        except Exception as e:
+            self.logger.error(f"Error creating batch embeddings: {e}")
+            raise
+
+    @staticmethod
+    def _content_hash(text: str) -> str:
+        """Cache key for a chunk; includes the model so a model switch never reuses vectors."""
+        return hashlib.blake2b(f"{EMBEDDING_MODEL}\0{text}".encode("utf-8"), digest_size=16).hexdigest()
+
+    def _get_chunk_cache(self) -> Optional["ChunkEmbeddingCache"]:
+        """Open the on-disk cache once per generator and share it between calls."""
+        with self._cache_lock:
+            if self._chunk_cache is None:
+                try:
+                    self._chunk_cache = ChunkEmbeddingCache(CHUNK_EMBEDDING_CACHE_PATH)
+                except sqlite3.Error as e:
+                    self.logger.warning(f"Could not open chunk embedding cache, continuing without it: {e}")
+                    return None
+            return self._chunk_cache
+
+    @staticmethod
+    def _build_embedding_data(chunk: Chunk, embedding: np.ndarray) -> Dict[str, Any]:
+        """FAISS formatında veri hazırla."""
+        md = chunk.metadata
+        return {
+            "id": chunk.chunk_id,
+            "values": embedding,
+            "metadata": {
+                "content": chunk.content,
+                "section": md.section,
+                "topic": md.topic,
+                "etkin_madde": md.etkin_madde,
+                "keywords": md.keywords,
+                "drug_related": md.drug_related,
+                "has_conditions": md.has_conditions,
+                "doc_type": md.doc_type,
+                "doc_source": md.doc_source,
+                "start_line": chunk.start_line,
+                "end_line": chunk.end_line
+            }
+        }
+
     def create_embeddings(self, chunks: List[Chunk]) -> List[Dict[str, Any]]:
         """
         Chunk'lar için embeddings oluşturur.
 
+        CACHE_EMBEDDINGS açıksa, içeriği daha önce embed edilmiş chunk'lar
+        diskteki cache'ten alınır ve API'ye yalnızca yeni içerik gönderilir.
+
         Args:
             chunks: Chunk listesi
 
@@ -114,45 +378,125 @@ class EmbeddingGenerator:
         """
         self.logger.info(f"Creating embeddings for {len(chunks)} chunks")
 
-        embeddings_data = []
+        cache = self._get_chunk_cache() if CACHE_EMBEDDINGS else None
+        embeddings: List[Optional[np.ndarray]] = [None] * len(chunks)
+        content_hashes = [self._content_hash(chunk.content) for chunk in chunks]
+        cached_vectors = cache.get_many(content_hashes) if cache is not None else {}
 
-        for i, chunk in enumerate(chunks):
-            try:
-                # Embedding oluştur
-                embedding = self._create_embedding(chunk.content)
-
-                # FAISS formatında veri hazırla
-                embedding_data = {
-                    "id": chunk.chunk_id,
-                    "values": embedding,
-                    "metadata": {
-                        "content": chunk.content,
-                        "section": chunk.metadata.section,
-                        "topic": chunk.metadata.topic,
-                        "etkin_madde": chunk.metadata.etkin_madde,
-                        "keywords": chunk.metadata.keywords,
-                        "drug_related": chunk.metadata.drug_related,
-                        "has_conditions": chunk.metadata.has_conditions,
-                        "doc_type": chunk.metadata.doc_type,
-                        "doc_source": chunk.metadata.doc_source,
-                        "start_line": chunk.start_line,
-                        "end_line": chunk.end_line
-                    }
-                }
-
-                embeddings_data.append(embedding_data)
-
-                if (i + 1) % 10 == 0:
-                    self.logger.info(f"Processed {i + 1}/{len(chunks)} chunks")
+        # Uncached chunks grouped by content: identical texts are embedded once
+        missing_by_hash: Dict[str, List[int]] = {}
+        for i, content_hash in enumerate(content_hashes):
+            cached = cached_vectors.get(content_hash)
+            if cached is not None:
+                embeddings[i] = cached
+            else:
+                missing_by_hash.setdefault(content_hash, []).append(i)
+        missing = [positions[0] for positions in missing_by_hash.values()]
+        missing_chunks = sum(len(positions) for positions in missing_by_hash.values())
+        cache_hits = len(chunks) - missing_chunks
+        if len(missing) < missing_chunks:
+            self.logger.info(f"Embedding {len(missing)} unique texts for {missing_chunks} uncached chunks")
 
-            except Exception as e:
-                self.logger.error(f"Error creating embedding for chunk {chunk.chunk_id}: {e}")
-                continue
+        # One embeddings request per batch of uncached texts
+        batches = [
+            [missing[j] for j in batch]
+            for batch in self._make_batches([chunks[i].content for i in missing])
+        ]
+
+        processed = 0
+        for batch_indices, batch_embeddings in zip(batches, self._run_batches(chunks, batches)):
+            for i, embedding in zip(batch_indices, batch_embeddings):
+                for k in missing_by_hash[content_hashes[i]]:
+                    embeddings[k] = embedding  # float32 row view of the batch array
 
+            # Persist per batch so an interrupted run keeps what it already paid for
+            if cache is not None:
+                cache.put_many((content_hashes[i], embeddings[i]) for i in batch_indices)
+
+            processed += len(batch_indices)
+            self.logger.info(f"Processed {processed}/{len(missing)} uncached texts")
+
+        embeddings_data = [
+            self._build_embedding_data(chunk, embedding)
+            for chunk, embedding in zip(chunks, embeddings)
+        ]
+
+        if cache is not None:
+            self.logger.info(f"Chunk embedding cache: {cache_hits}/{len(chunks)} hits")
         self.logger.info(f"Successfully created {len(embeddings_data)} embeddings")
         return embeddings_data
 
-    def create_query_embedding(self, query: str) -> List[float]:
+    @staticmethod
+    def _make_batches(texts: List[str]) -> List[List[int]]:
+        """
+        Group text positions into request-sized batches.
+
+        A batch closes at EMBEDDING_BATCH_SIZE inputs or when the estimated
+        token count (len/4) would exceed EMBEDDING_BATCH_MAX_TOKENS.
+        """
+        batches: List[List[int]] = []
+        current: List[int] = []
+        current_tokens = 0
+
+        for i, text in enumerate(texts):
+            tokens = len(text) // 4
+            if current and (
+                len(current) >= EMBEDDING_BATCH_SIZE
+                or current_tokens + tokens > EMBEDDING_BATCH_MAX_TOKENS
+            ):
+                batches.append(current)
+                current, current_tokens = [], 0
+            current.append(i)
+            current_tokens += tokens
+
+        if current:
+            batches.append(current)
+        return batches
+
+    def _run_batches(self, chunks: List[Chunk], batches: List[List[int]]) -> Iterator[np.ndarray]:
+        """
+        Yield embeddings for each batch, in batch order.
+
+        With PARALLEL_EMBEDDINGS, up to PARALLEL_EMBEDDING_WORKERS requests are
+        in flight at once; the SDK releases the GIL while waiting on the network.
+        """
+        if not PARALLEL_EMBEDDINGS or len(batches) <= 1:
+            for batch_indices in batches:
+                yield self._embed_batch(chunks, batch_indices)
+            return
+
+        workers = min(PARALLEL_EMBEDDING_WORKERS, len(batches))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = []
+            for batch_indices in batches:
+                futures.append(executor.submit(self._embed_batch, chunks, batch_indices))
+                if len(futures) <= workers:
+                    time.sleep(0.02)  # Stagger the first wave so requests don't start in lockstep
+            for future in futures:
+                yield future.result()
+
+    def _embed_batch(self, chunks: List[Chunk], indices: List[int]) -> np.ndarray:
+        """
+        Embed one batch. If the batch is rejected for a non-transient reason
+        (e.g. one oversized input), retry its chunks one by one so the failing
+        chunk is identified; any chunk that still fails raises.
+        """
+        try:
+            return self._create_embeddings_batch([chunks[i].content for i in indices])
+        except Exception as e:
+            if self._is_retryable(e):
+                raise  # Retries already exhausted; single requests would hit the same limit
+            self.logger.warning(f"Batch of {len(indices)} chunks failed, falling back to single requests: {e}")
+
+        results: List[np.ndarray] = []
+        for i in indices:
+            try:
+                results.append(self._create_embedding(chunks[i].content))
+            except Exception as e:
+                raise RuntimeError(f"Error creating embedding for chunk {chunks[i].chunk_id}: {e}") from e
+        return np.asarray(results, dtype=np.float32)
+
+    def create_query_embedding(self, query: str) -> np.ndarray:
         """
         Sorgu için embedding oluşturur.
 
@@ -163,3 +507,15 @@ class EmbeddingGenerator:
             Embedding vektörü
         """
         return self._create_embedding(query)
+
+    def create_query_embeddings_batch(self, queries: List[str]) -> np.ndarray:
+        """
+        Birden fazla sorgu için tek istekte embedding oluşturur.
+
+        Args:
+            queries: Sorgu metinleri
+
+        Returns:
+            Sorgularla aynı sırada embedding vektörleri (float32, satır başına bir sorgu)
+        """
+        return self._create_embeddings_batch(queries)
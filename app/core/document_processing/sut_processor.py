@@ -1,13 +1,30 @@
 """SUT document processing pipeline."""
 
+import hashlib
+import json
 import logging
+import os
+from pathlib import Path
 from typing import List, Dict, Any, Optional
 
+import numpy as np
+
 from .pdf_loader import PDFLoader
 from .chunker import SUTDocumentChunker
 from .embeddings import EmbeddingGenerator
 from app.models.eligibility import Chunk
-from app.config.settings import SUT_PDF_PATH, EMBEDDING_PROVIDER
+from app.config.settings import (
+    SUT_PDF_PATH,
+    CACHE_EMBEDDINGS,
+    DOCUMENT_CACHE_DIR,
+    EMBEDDING_MODEL,
+    EMBEDDING_DIMENSION,
+    CHUNK_SIZE,
+    CHUNK_OVERLAP,
+    MIN_CHUNK_SIZE,
+    MAX_CHUNK_SIZE,
+    PRESERVE_PARAGRAPHS,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -15,10 +32,11 @@ logger = logging.getLogger(__name__)
 class SUTDocumentProcessor:
     """SUT doküman işleme pipeline'ı."""
 
-    def __init__(self, openai_client=None, provider: str = EMBEDDING_PROVIDER):
+    def __init__(self, openai_client=None):
         self.pdf_loader = PDFLoader()
         self.chunker = SUTDocumentChunker()
-        self.embedding_generator = EmbeddingGenerator(client=openai_client, provider=provider)
+        # Provider is chosen from EMBEDDING_PROVIDER inside EmbeddingGenerator
+        self.embedding_generator = EmbeddingGenerator(client=openai_client)
         self.logger = logging.getLogger(self.__class__.__name__)
 
     def process_document(self, pdf_path: str = SUT_PDF_PATH) -> List[Dict[str, Any]]:
@@ -34,6 +52,14 @@ class SUTDocumentProcessor:
         self.logger.info("Starting SUT document processing pipeline")
 
         try:
+            # 0. Doküman ve ayarlar değişmediyse önbellekteki çıktıyı kullan
+            cache_path = self._output_cache_path(pdf_path) if CACHE_EMBEDDINGS else None
+            if cache_path is not None:
+                cached = self._load_output(cache_path)
+                if cached is not None:
+                    self.logger.info(f"Unchanged document, loaded {len(cached)} embeddings from {cache_path}")
+                    return cached
+
             # 1. PDF'den metin çıkar
             self.logger.info("Step 1: Extracting text from PDF")
             text = self.pdf_loader.load_pdf(pdf_path)
@@ -47,12 +73,75 @@ class SUTDocumentProcessor:
             embeddings_data = self.embedding_generator.create_embeddings(chunks)
 
             self.logger.info(f"Successfully processed {len(embeddings_data)} chunks")
+            if cache_path is not None:
+                self._save_output(cache_path, embeddings_data)
             return embeddings_data
 
         except Exception as e:
             self.logger.error(f"Error in document processing pipeline: {e}")
             raise
 
+    def _output_cache_path(self, pdf_path: str) -> Path:
+        """
+        İşlenmiş çıktı için önbellek yolu.
+
+        The key covers the PDF bytes and every setting that shapes the output
+        (extraction backend, chunking, embedding model), so a changed file or
+        configuration never loads a stale result. Delete DOCUMENT_CACHE_DIR
+        after changing the chunker code itself.
+        """
+        digest = hashlib.sha256()
+        with open(pdf_path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        digest.update(json.dumps([
+            self.pdf_loader.backend,
+            self.chunker.strategy,
+            CHUNK_SIZE, CHUNK_OVERLAP, MIN_CHUNK_SIZE, MAX_CHUNK_SIZE, PRESERVE_PARAGRAPHS,
+            EMBEDDING_MODEL, EMBEDDING_DIMENSION,
+        ]).encode("utf-8"))
+        return Path(DOCUMENT_CACHE_DIR) / f"{Path(pdf_path).stem}_{digest.hexdigest()[:16]}.npy"
+
+    def _load_output(self, cache_path: Path) -> Optional[List[Dict[str, Any]]]:
+        """Önbellekteki çıktıyı yükler (yoksa veya okunamazsa None)."""
+        records_path = cache_path.with_suffix(".json")
+        if not cache_path.exists() or not records_path.exists():
+            return None
+        try:
+            # Memory-mapped: rows are read from disk as they are copied into the
+            # index instead of holding a second full copy of the vectors in RAM
+            vectors = np.load(cache_path, mmap_mode="r")
+            with open(records_path, "r", encoding="utf-8") as f:
+                records = json.load(f)
+        except (OSError, ValueError) as e:
+            self.logger.warning(f"Could not read document cache {cache_path}: {e}")
+            return None
+        if len(records) != len(vectors):
+            return None
+        return [
+            {"id": record["id"], "values": vector, "metadata": record["metadata"]}
+            for record, vector in zip(records, vectors)
+        ]
+
+    def _save_output(self, cache_path: Path, embeddings_data: List[Dict[str, Any]]) -> None:
+        """Çıktıyı vektörler (.npy) ve kayıtlar (.json) olarak yazar."""
+        if not embeddings_data:
+            return
+        try:
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            vectors = np.stack([np.asarray(item["values"], dtype=np.float32) for item in embeddings_data])
+            records = [{"id": item["id"], "metadata": item["metadata"]} for item in embeddings_data]
+
+            # Vectors last: _load_output needs both files, so a crash never leaves a readable half entry
+            records_path = cache_path.with_suffix(".json")
+            with open(records_path, "w", encoding="utf-8") as f:
+                json.dump(records, f, ensure_ascii=False)
+            tmp_path = cache_path.with_name(cache_path.stem + ".tmp.npy")
+            np.save(tmp_path, vectors)
+            os.replace(tmp_path, cache_path)
+        except OSError as e:
+            self.logger.warning(f"Could not write document cache {cache_path}: {e}")
+
     def load_and_chunk(self, pdf_path: str = SUT_PDF_PATH) -> List[Chunk]:
         """
         Sadece yükleme ve chunking yapar (embedding olmadan).
@@ -1,24 +1,123 @@
 """Main eligibility checker using LLM."""
 
+import hashlib
+import json
 import logging
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict
+from datetime import date
+from functools import cached_property
 from typing import List, Dict, Any, Optional
 
 from app.models.report import Drug, Diagnosis, PatientInfo, DoctorInfo
 from app.models.eligibility import EligibilityResult, Condition
-from .openai_client import OpenAIClientWrapper
-from .prompts import PromptBuilder, SYSTEM_PROMPT
-from app.config.settings import MAX_BATCH_SIZE
+from .openai_client import OpenAIClientWrapper, count_tokens, get_openai_client_wrapper
+from .prompts import PromptBuilder, SYSTEM_PROMPT, ELIGIBILITY_RESULT_SCHEMA, BATCH_ELIGIBILITY_SCHEMA
+from app.config.settings import (
+    MAX_BATCH_SIZE,
+    MAX_PROMPT_TOKENS,
+    ELIGIBILITY_BATCH_WORKERS,
+    ELIGIBILITY_FALLBACK_WORKERS,
+    ELIGIBILITY_FAST_PATH,
+    LLM_MODEL,
+    CACHE_ELIGIBILITY,
+    ELIGIBILITY_CACHE_PATH,
+    ELIGIBILITY_CACHE_TTL,
+)
 
 logger = logging.getLogger(__name__)
 
+# Max SUT chunks per drug in a batched prompt (more for EK-4 cases)
+MAX_CHUNKS_PER_DRUG = 5
+# System prompt plus the batch header/footer, in estimated tokens
+BATCH_PROMPT_OVERHEAD_TOKENS = 1500
+
+
+def _estimate_tokens(text: str) -> int:
+    """Token estimate for prompt budgeting (tiktoken when installed, else chars/4)."""
+    return count_tokens(text)
+
+
+class EligibilityResultCache:
+    """
+    SQLite-backed cache of per-drug eligibility results (input hash -> result JSON).
+
+    Entries older than the TTL are treated as misses and overwritten on the
+    next store. Only results parsed from a complete LLM response are stored.
+    """
+
+    def __init__(self, path: str, ttl: int):
+        self.logger = logging.getLogger(self.__class__.__name__)
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.ttl = ttl
+        self._lock = threading.Lock()  # One connection shared by fallback threads
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS results "
+            "(key TEXT PRIMARY KEY, result_json TEXT NOT NULL, created_at INTEGER NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[EligibilityResult]:
+        """Return the cached result, or None on a miss or expired entry."""
+        try:
+            with self._lock:
+                row = self._conn.execute(
+                    "SELECT result_json FROM results WHERE key = ? AND created_at >= ?",
+                    (key, int(time.time()) - self.ttl)
+                ).fetchone()
+        except sqlite3.Error as e:
+            self.logger.warning(f"Could not read eligibility cache: {e}")
+            return None
+        if row is None:
+            return None
+
+        try:
+            data = json.loads(row[0])
+            data["conditions"] = [Condition(**cond) for cond in data["conditions"]]
+            return EligibilityResult(**data)
+        except (ValueError, TypeError, KeyError) as e:
+            # Corrupt row, or stored by a version with a different result schema
+            self.logger.warning(f"Discarding unreadable eligibility cache entry: {e}")
+            self._delete(key)
+            return None
+
+    def _delete(self, key: str) -> None:
+        try:
+            with self._lock:
+                self._conn.execute("DELETE FROM results WHERE key = ?", (key,))
+                self._conn.commit()
+        except sqlite3.Error as e:
+            self.logger.warning(f"Could not delete eligibility cache entry: {e}")
+
+    def put(self, key: str, result: EligibilityResult) -> None:
+        """Insert or replace a result."""
+        try:
+            with self._lock:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO results (key, result_json, created_at) VALUES (?, ?, ?)",
+                    (key, json.dumps(asdict(result), ensure_ascii=False), int(time.time()))
+                )
+                self._conn.commit()
+        except sqlite3.Error as e:
+            self.logger.warning(f"Could not write eligibility cache: {e}")
+
 
 class EligibilityChecker:
     """LLM kullanarak ilaç uygunluğunu kontrol eden sınıf."""
 
-    def __init__(self, openai_client: OpenAIClientWrapper):
-        self.client = openai_client
+    def __init__(self, openai_client: OpenAIClientWrapper = None):
+        self.client = openai_client or get_openai_client_wrapper()
         self.prompt_builder = PromptBuilder()
         self.logger = logging.getLogger(self.__class__.__name__)
+        self._result_cache: Optional[EligibilityResultCache] = None
+        self._cache_lock = threading.Lock()
 
     def check_eligibility(
         self,
@@ -28,7 +127,8 @@ class EligibilityChecker:
         doctor: DoctorInfo,
         sut_chunks: List[Dict[str, Any]],
         explanations: str = None,
-        report_type: str = None
+        report_type: str = None,
+        use_cache: bool = True
     ) -> EligibilityResult:
         """
         Bir ilaç için SGK uygunluğunu kontrol eder.
@@ -41,10 +141,27 @@ class EligibilityChecker:
             sut_chunks: İlgili SUT chunk'ları
             explanations: Rapor açıklamaları
             report_type: Rapor türü (Uzman Hekim Raporu, Sağlık Kurulu Raporu vb.)
+            use_cache: False ise önbellekteki sonuç (ve LLM yanıt önbelleği) okunmaz;
+                yeni sonuç yine yazılır
 
         Returns:
             EligibilityResult
         """
+        fast_result = self._try_fast_path(drug, sut_chunks)
+        if fast_result is not None:
+            return fast_result
+
+        cache = self._get_result_cache()
+        # Key only when caching is on: it hashes every chunk text (and renders the prompts once)
+        cache_key = self._result_cache_key(
+            drug, diagnosis, patient, doctor, sut_chunks, explanations, report_type
+        ) if cache is not None else None
+        if cache is not None and use_cache:
+            cached = cache.get(cache_key)
+            if cached is not None:
+                self.logger.info(f"Using cached eligibility result for: {drug.etkin_madde}")
+                return cached
+
         self.logger.info(f"Checking eligibility for: {drug.etkin_madde}")
 
         # Prompt oluştur
@@ -63,11 +180,15 @@ class EligibilityChecker:
         try:
             response_json = self.client.chat_completion_json(
                 system_prompt=SYSTEM_PROMPT,
-                user_prompt=user_prompt
+                user_prompt=user_prompt,
+                json_schema=ELIGIBILITY_RESULT_SCHEMA,
+                bypass_cache=not use_cache
             )
 
             # JSON'dan EligibilityResult oluştur
             result = self._parse_response(response_json, drug.etkin_madde)
+            if cache is not None and self._is_cacheable(response_json, result):
+                cache.put(cache_key, result)
             
             self.logger.info(f"Eligibility check complete: {result.status}")
             return result
@@ -85,13 +206,16 @@ class EligibilityChecker:
         doctor: DoctorInfo,
         sut_chunks_per_drug: Dict[str, List[Dict[str, Any]]],
         explanations: str = None,
-        report_type: str = None
+        report_type: str = None,
+        use_cache: bool = True
     ) -> List[EligibilityResult]:
         """
         Birden fazla ilaç için uygunluk kontrolü.
         
-        OPTIMIZED: Uses a single batched LLM call instead of sequential calls.
-        For large numbers of drugs (>3), falls back to sequential to ensure accuracy.
+        OPTIMIZED: Drugs are checked in as few batched LLM calls as fit
+        MAX_BATCH_SIZE and MAX_PROMPT_TOKENS (usually one). A batch that fails
+        falls back to per-drug calls for that batch only. Drugs with a cached
+        result for the same inputs are not sent to the LLM at all.
 
         Args:
             drugs: İlaç listesi
@@ -101,6 +225,7 @@ class EligibilityChecker:
             sut_chunks_per_drug: Her ilaç için SUT chunks
             explanations: Rapor açıklamaları
             report_type: Rapor türü (Uzman Hekim Raporu, Sağlık Kurulu Raporu vb.)
+            use_cache: False ise tüm ilaçlar yeniden kontrol edilir ve önbellek yenilenir
 
         Returns:
             EligibilityResult listesi
@@ -115,100 +240,267 @@ class EligibilityChecker:
         )
 
         num_drugs = len(drugs)
-        
-        if num_drugs > MAX_BATCH_SIZE:
-            self.logger.warning(f"⚠️ {num_drugs} drugs detected - using sequential processing for reliability")
-            self.logger.info(f"(Batch processing works best for 1-{MAX_BATCH_SIZE} drugs; {num_drugs} drugs may cause incomplete responses)")
-            self.logger.info(f"💡 TIP: Adjust MAX_BATCH_SIZE in .env if using a more reliable model like gpt-5-mini")
-            
-            # Sequential processing with timing
-            import time
-            total_start = time.time()
-            results: List[EligibilityResult] = []
-            
-            for i, drug in enumerate(drugs, 1):
-                self.logger.info(f"   ▶ Processing drug {i}/{num_drugs}: {drug.etkin_madde}")
-                drug_start = time.time()
-                
-                sut_chunks = sut_chunks_per_drug.get(drug.etkin_madde, [])
+        batch_start = time.perf_counter()
+
+        # Drugs without SUT rules, or whose exact inputs were checked before,
+        # never reach the LLM
+        cache = self._get_result_cache()
+        cache_keys = [
+            self._result_cache_key(
+                drug, primary_diagnosis, patient, doctor,
+                sut_chunks_per_drug.get(drug.etkin_madde, []), explanations, report_type
+            )
+            for drug in drugs
+        ] if cache is not None else [None] * num_drugs
+        results: List[Optional[EligibilityResult]] = [
+            self._try_fast_path(drug, sut_chunks_per_drug.get(drug.etkin_madde, []))
+            for drug in drugs
+        ]
+        if cache is not None and use_cache:
+            for i, key in enumerate(cache_keys):
+                if results[i] is None:
+                    results[i] = cache.get(key)
+        pending = [i for i, result in enumerate(results) if result is None]
+        if len(pending) < num_drugs:
+            self.logger.info(f"♻️ {num_drugs - len(pending)}/{num_drugs} eligibility results resolved without an LLM call")
+
+        if pending:
+            pending_drugs = [drugs[i] for i in pending]
+            groups = self._plan_batches(pending_drugs, sut_chunks_per_drug)
+            self.logger.info(f"🔍 Starting eligibility check for {len(pending)} drugs in {len(groups)} batched call(s)")
+
+            pending_keys = [cache_keys[i] for i in pending]
+            group_keys: List[List[Optional[str]]] = []
+            offset = 0
+            for group in groups:
+                group_keys.append(pending_keys[offset:offset + len(group)])
+                offset += len(group)
+
+            def check_group(group: List[Drug], keys: List[Optional[str]]) -> List[EligibilityResult]:
+                return self._check_group(
+                    drugs=group,
+                    diagnosis=primary_diagnosis,
+                    patient=patient,
+                    doctor=doctor,
+                    sut_chunks_per_drug=sut_chunks_per_drug,
+                    explanations=explanations,
+                    report_type=report_type,
+                    cache=cache,
+                    cache_keys=keys,
+                    use_cache=use_cache
+                )
+
+            workers = max(1, min(ELIGIBILITY_BATCH_WORKERS, len(groups)))
+            if workers == 1:
+                group_results = [check_group(group, keys) for group, keys in zip(groups, group_keys)]
+            else:
+                # Batches are independent network-bound calls; map keeps report order
+                with ThreadPoolExecutor(max_workers=workers) as executor:
+                    group_results = list(executor.map(check_group, groups, group_keys))
+
+            checked = [result for batch in group_results for result in batch]
+            for i, result in zip(pending, checked):
+                results[i] = result
+
+        batch_elapsed = time.perf_counter() - batch_start
+        avg_ms = (batch_elapsed * 1000) / num_drugs
+        self.logger.info(f"✅ Eligibility check completed in {batch_elapsed:.2f}s (avg {avg_ms:.1f}ms/drug)")
+        return results
+
+    def _get_result_cache(self) -> Optional[EligibilityResultCache]:
+        """Sonuç önbelleğini ilk kullanımda açar (CACHE_ELIGIBILITY kapalıysa None)."""
+        if not CACHE_ELIGIBILITY:
+            return None
+        with self._cache_lock:
+            if self._result_cache is None:
                 try:
-                    result = self.check_eligibility(
-                        drug=drug,
-                        diagnosis=primary_diagnosis,
-                        patient=patient,
-                        doctor=doctor,
-                        sut_chunks=sut_chunks,
-                        explanations=explanations,
-                        report_type=report_type
-                    )
-                except Exception as e:
-                    self.logger.error(f"Error checking eligibility for {drug.etkin_madde}: {e}")
-                    result = self._create_fallback_result(drug.etkin_madde, str(e))
-                
-                drug_elapsed = time.time() - drug_start
-                self.logger.info(f"   ✓ {drug.etkin_madde} done in {drug_elapsed:.2f}s")
-                results.append(result)
-            
-            total_elapsed = time.time() - total_start
-            avg_time = total_elapsed / num_drugs if num_drugs > 0 else 0
-            self.logger.info(f"✅ Sequential processing completed: {total_elapsed:.2f}s total, {avg_time:.2f}s avg/drug")
-            return results
-        
-        # BATCHED PROCESSING: For 1-3 drugs, batch processing is reliable and fast
-        import time
-        batch_start = time.time()
-        self.logger.info(f"🔍 Starting eligibility check for {num_drugs} drugs (batched processing)")
+                    self._result_cache = EligibilityResultCache(ELIGIBILITY_CACHE_PATH, ELIGIBILITY_CACHE_TTL)
+                except sqlite3.Error as e:
+                    self.logger.warning(f"Could not open eligibility cache, continuing without it: {e}")
+                    return None
+            return self._result_cache
+
+    @staticmethod
+    def _is_cacheable(response_json: Any, result: EligibilityResult) -> bool:
+        """Only results parsed from a complete response are cached (no partial/fallback ones)."""
+        return (
+            isinstance(response_json, dict)
+            and 'parse_error' not in response_json
+            and result.confidence > 0.0  # _create_fallback_result
+        )
+
+    @cached_property
+    def _prompt_fingerprint(self) -> str:
+        """
+        Hash of the single-drug and batched prompts rendered for fixed sample
+        inputs: any edit to the prompt templates or builders changes it.
+        """
+        drug = Drug(
+            kod="KOD", etkin_madde="ETKİN MADDE", form="FORM", tedavi_sema="ŞEMA",
+            miktar=1, eklenme_zamani=date(2000, 1, 1)
+        )
+        diagnosis = Diagnosis(icd10_code="ICD", tanim="TANI")
+        patient = PatientInfo(cinsiyet="CİNSİYET", yas=1)
+        doctor = DoctorInfo(name="DOKTOR", specialty="BRANŞ", diploma="DİPLOMA")
+        sut_chunks = [{"metadata": {"content": "SUT KURALI", "doc_type": "SUT"}}]
+        single_prompt = self.prompt_builder.build_eligibility_prompt(
+            drug=drug,
+            diagnosis=diagnosis,
+            patient=patient,
+            doctor_name=doctor.name,
+            doctor_specialty=doctor.specialty,
+            sut_chunks=sut_chunks,
+            explanations="AÇIKLAMA",
+            report_type="RAPOR TÜRÜ"
+        )
+        batch_prompt = self._build_batch_prompt(
+            [drug], diagnosis, patient, doctor, {drug.etkin_madde: sut_chunks}, "AÇIKLAMA", "RAPOR TÜRÜ"
+        )
+        payload = json.dumps(
+            [SYSTEM_PROMPT, single_prompt, batch_prompt, ELIGIBILITY_RESULT_SCHEMA, BATCH_ELIGIBILITY_SCHEMA],
+            ensure_ascii=False
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _result_cache_key(
+        self,
+        drug: Drug,
+        diagnosis: Diagnosis,
+        patient: PatientInfo,
+        doctor: DoctorInfo,
+        sut_chunks: List[Dict[str, Any]],
+        explanations: Optional[str],
+        report_type: Optional[str]
+    ) -> str:
+        """
+        Bir ilacın uygunluk sonucunu belirleyen tüm girdilerin hash'i.
+
+        Covers every field that reaches the prompt, the SUT chunk texts the
+        prompt can include, the model and the prompt templates (system, user,
+        batch and response schemas), so a changed index, model or prompt never
+        serves a stale result.
+        """
+        chunk_texts = [
+            chunk.get('metadata', {}).get('content', '')
+            for chunk in sut_chunks[:MAX_CHUNKS_PER_DRUG]
+        ]
+        payload = json.dumps([
+            LLM_MODEL,
+            self._prompt_fingerprint,
+            [drug.etkin_madde, drug.form, drug.tedavi_sema, str(drug.miktar)],
+            [diagnosis.icd10_code, diagnosis.tanim],
+            [str(patient.yas), patient.cinsiyet],
+            [doctor.name, doctor.specialty],
+            chunk_texts,
+            explanations or "",
+            report_type or "",
+        ], ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _plan_batches(
+        self,
+        drugs: List[Drug],
+        sut_chunks_per_drug: Dict[str, List[Dict[str, Any]]]
+    ) -> List[List[Drug]]:
+        """
+        İlaçları, her biri tek bir LLM çağrısına sığan gruplara böler.
+
+        Groups are filled in report order until they reach MAX_BATCH_SIZE drugs
+        or MAX_PROMPT_TOKENS estimated tokens. A drug that does not fit on its
+        own gets a group of its own; its chunks are trimmed when the prompt is
+        built.
+        """
+        groups: List[List[Drug]] = []
+        current: List[Drug] = []
+        current_tokens = BATCH_PROMPT_OVERHEAD_TOKENS
+
+        for drug in drugs:
+            section = self._build_drug_section(1, 1, drug, sut_chunks_per_drug.get(drug.etkin_madde, []))
+            tokens = _estimate_tokens(section)
+            if current and (len(current) >= MAX_BATCH_SIZE or current_tokens + tokens > MAX_PROMPT_TOKENS):
+                groups.append(current)
+                current, current_tokens = [], BATCH_PROMPT_OVERHEAD_TOKENS
+            current.append(drug)
+            current_tokens += tokens
+
+        if current:
+            groups.append(current)
+        return groups
+
+    def _check_group(
+        self,
+        drugs: List[Drug],
+        diagnosis: Diagnosis,
+        patient: PatientInfo,
+        doctor: DoctorInfo,
+        sut_chunks_per_drug: Dict[str, List[Dict[str, Any]]],
+        explanations: str = None,
+        report_type: str = None,
+        cache: Optional[EligibilityResultCache] = None,
+        cache_keys: Optional[List[str]] = None,
+        use_cache: bool = True
+    ) -> List[EligibilityResult]:
+        """
+        Bir ilaç grubunu tek çağrıda kontrol eder; hata olursa ilaç ilaç dener.
 
+        Results are stored in cache under cache_keys (aligned with drugs).
+        use_cache=False also skips the LLM response cache.
+        """
         try:
-            self.logger.info(f"🚀 Batched LLM call for {num_drugs} drug(s)")
-            results = self._check_all_drugs_batched(
+            self.logger.info(f"🚀 Batched LLM call for {len(drugs)} drug(s)")
+            return self._check_all_drugs_batched(
                 drugs=drugs,
-                diagnosis=primary_diagnosis,
+                diagnosis=diagnosis,
                 patient=patient,
                 doctor=doctor,
                 sut_chunks_per_drug=sut_chunks_per_drug,
                 explanations=explanations,
-                report_type=report_type
+                report_type=report_type,
+                cache=cache,
+                cache_keys=cache_keys,
+                use_cache=use_cache
             )
 
-            batch_elapsed = time.time() - batch_start
-            avg_ms = (batch_elapsed * 1000) / num_drugs if num_drugs > 0 else 0
-
-            self.logger.info(f"✅ Batched check succeeded in {batch_elapsed:.2f}s (avg {avg_ms:.1f}ms/drug)")
-            return results
-
         except Exception as e:
             self.logger.error(f"❌ Batched LLM call failed: {type(e).__name__}: {e}")
             self.logger.exception("Batched eligibility failure stacktrace")
-            self.logger.warning("⚠️ Falling back to sequential processing")
+            workers = max(1, min(ELIGIBILITY_FALLBACK_WORKERS, len(drugs)))
+            self.logger.warning(f"⚠️ Falling back to per-drug processing ({workers} concurrent)")
 
-            # Sequential fallback
-            results: List[EligibilityResult] = []
-            for i, drug in enumerate(drugs, 1):
-                self.logger.info(f"   ▶ Processing drug {i}/{num_drugs}: {drug.etkin_madde}")
-                drug_start = time.time()
+            def check_one(i: int, drug: Drug) -> EligibilityResult:
+                self.logger.info(f"   ▶ Processing drug {i}/{len(drugs)}: {drug.etkin_madde}")
+                drug_start = time.perf_counter()
 
                 sut_chunks = sut_chunks_per_drug.get(drug.etkin_madde, [])
                 try:
                     result = self.check_eligibility(
                         drug=drug,
-                        diagnosis=primary_diagnosis,
+                        diagnosis=diagnosis,
                         patient=patient,
                         doctor=doctor,
                         sut_chunks=sut_chunks,
                         explanations=explanations,
-                        report_type=report_type
+                        report_type=report_type,
+                        use_cache=use_cache
                     )
                 except Exception as inner_e:
                     self.logger.error(f"Error checking eligibility for {drug.etkin_madde}: {inner_e}")
                     result = self._create_fallback_result(drug.etkin_madde, str(inner_e))
 
-                drug_elapsed = time.time() - drug_start
+                drug_elapsed = time.perf_counter() - drug_start
                 self.logger.info(f"   ✓ {drug.etkin_madde} done in {drug_elapsed:.2f}s")
-                results.append(result)
+                return result
 
-            total_elapsed = time.time() - batch_start
-            self.logger.warning(f"⚠️ Sequential fallback completed in {total_elapsed:.2f}s for {num_drugs} drugs")
+            fallback_start = time.perf_counter()
+            if workers == 1:
+                results = [check_one(i, drug) for i, drug in enumerate(drugs, 1)]
+            else:
+                # Drugs are independent; map keeps results in report order
+                with ThreadPoolExecutor(max_workers=workers) as executor:
+                    results = list(executor.map(check_one, range(1, len(drugs) + 1), drugs))
+
+            total_elapsed = time.perf_counter() - fallback_start
+            self.logger.warning(f"⚠️ Per-drug fallback completed in {total_elapsed:.2f}s for {len(drugs)} drugs")
             return results
 
     def _parse_response(self, response_json: Dict[str, Any], drug_name: str) -> EligibilityResult:
@@ -241,24 +533,25 @@ class EligibilityChecker:
                     return self._create_fallback_result(drug_name, response_json.get('parse_error', 'Unknown error'))
             
             # Normal parsing
-            conditions = []
-            for cond_data in response_json.get('conditions', []):
-                condition = Condition(
+            get = response_json.get
+            conditions = [
+                Condition(
                     description=cond_data.get('description', ''),
                     is_met=cond_data.get('is_met'),
                     required_info=cond_data.get('required_info', '')
                 )
-                conditions.append(condition)
+                for cond_data in get('conditions') or ()
+            ]
 
             # EligibilityResult oluştur
             result = EligibilityResult(
-                drug_name=response_json.get('drug_name', drug_name),
-                status=response_json.get('status', 'CONDITIONAL'),
-                confidence=float(response_json.get('confidence', 0.5)),
-                sut_reference=response_json.get('sut_reference', 'Referans bulunamadı'),
+                drug_name=get('drug_name', drug_name),
+                status=get('status', 'CONDITIONAL'),
+                confidence=float(get('confidence', 0.5)),
+                sut_reference=get('sut_reference', 'Referans bulunamadı'),
                 conditions=conditions,
-                explanation=response_json.get('explanation', ''),
-                warnings=response_json.get('warnings', [])
+                explanation=get('explanation', ''),
+                warnings=get('warnings') or []
             )
 
             return result
@@ -267,6 +560,35 @@ class EligibilityChecker:
             self.logger.error(f"Error parsing LLM response: {e}")
             return self._create_fallback_result(drug_name, f"Parse error: {e}")
 
+    def _try_fast_path(self, drug: Drug, sut_chunks: List[Dict[str, Any]]) -> Optional[EligibilityResult]:
+        """
+        LLM'e gerek olmayan açık durumlar için doğrudan sonuç döndürür; yoksa None.
+
+        Currently one rule: with no retrieved SUT chunks the LLM has no rule
+        text to evaluate, so the drug goes straight to manual review.
+        Outcomes that depend on reading the rules are always left to the LLM.
+        """
+        if not ELIGIBILITY_FAST_PATH or sut_chunks:
+            return None
+
+        self.logger.info(f"No SUT chunks for {drug.etkin_madde}, skipping LLM call")
+        return EligibilityResult(
+            drug_name=drug.etkin_madde,
+            status="CONDITIONAL",
+            confidence=0.0,
+            sut_reference="SUT kuralı bulunamadı",
+            conditions=[
+                Condition(
+                    description="İlgili SUT kuralı bulunamadı",
+                    is_met=None,
+                    required_info="Manuel SUT kontrolü gerekli"
+                )
+            ],
+            explanation="⚠️ Bu ilaç için ilgili SUT kuralı bulunamadığından otomatik "
+                       "değerlendirme yapılmadı. Lütfen SUT dokümanını manuel olarak kontrol edin.",
+            warnings=["İlgili SUT kuralı bulunamadı", "Manuel SUT kontrolü şarttır"]
+        )
+
     def _create_fallback_result(self, drug_name: str, error_msg: str) -> EligibilityResult:
         """Hata durumunda fallback sonuç oluşturur."""
         return EligibilityResult(
@@ -298,7 +620,10 @@ class EligibilityChecker:
         doctor: DoctorInfo,
         sut_chunks_per_drug: Dict[str, List[Dict[str, Any]]],
         explanations: str = None,
-        report_type: str = None
+        report_type: str = None,
+        cache: Optional[EligibilityResultCache] = None,
+        cache_keys: Optional[List[str]] = None,
+        use_cache: bool = True
     ) -> List[EligibilityResult]:
         """
         PERFORMANCE OPTIMIZATION: Check all drugs in a single LLM call.
@@ -314,21 +639,74 @@ class EligibilityChecker:
             sut_chunks_per_drug: SUT chunks for each drug
             explanations: Report explanations
             report_type: Report type (Uzman Hekim Raporu, Sağlık Kurulu Raporu vb.)
+            cache: Optional result cache; cleanly parsed results are stored in it
+            cache_keys: Cache key per drug (same order as drugs)
+            use_cache: False ise LLM yanıt önbelleği de okunmaz
             
         Returns:
             List of EligibilityResult, one per drug
         """
         self.logger.info(f"Batch checking {len(drugs)} drugs in single LLM call")
         
+        user_prompt = self._build_batch_prompt(
+            drugs, diagnosis, patient, doctor, sut_chunks_per_drug, explanations, report_type
+        )
+
+        # Make single LLM call
+        try:
+            response_json = self.client.chat_completion_json(
+                system_prompt=SYSTEM_PROMPT,
+                user_prompt=user_prompt,
+                json_schema=BATCH_ELIGIBILITY_SCHEMA,
+                bypass_cache=not use_cache
+            )
+            
+            # Parse results
+            results = []
+            for i, (drug, result_data) in enumerate(zip(drugs, response_json.get('results', []))):
+                try:
+                    result = self._parse_response(result_data, drug.etkin_madde)
+                    results.append(result)
+                    if cache is not None and cache_keys and self._is_cacheable(result_data, result):
+                        cache.put(cache_keys[i], result)
+                except Exception as e:
+                    self.logger.error(f"Error parsing result for {drug.etkin_madde}: {e}")
+                    results.append(self._create_fallback_result(drug.etkin_madde, str(e)))
+            
+            # If we got fewer results than drugs, fill with fallbacks
+            while len(results) < len(drugs):
+                drug = drugs[len(results)]
+                results.append(self._create_fallback_result(
+                    drug.etkin_madde, 
+                    "Yanıt eksik - LLM tüm ilaçları değerlendiremedi"
+                ))
+            
+            self.logger.info(f"Batch check complete: {len(results)} results")
+            return results
+            
+        except Exception as e:
+            self.logger.error(f"Batch eligibility check failed: {e}")
+            raise
+
+    def _build_batch_prompt(
+        self,
+        drugs: List[Drug],
+        diagnosis: Diagnosis,
+        patient: PatientInfo,
+        doctor: DoctorInfo,
+        sut_chunks_per_drug: Dict[str, List[Dict[str, Any]]],
+        explanations: str = None,
+        report_type: str = None
+    ) -> str:
+        """Birden fazla ilacı tek çağrıda değerlendiren toplu prompt'u oluşturur."""
         # Build combined prompt for all drugs
-        from .prompts import SYSTEM_PROMPT
-        
         explanations_section = f'📝 RAPOR AÇIKLAMALARI:\n{explanations}\n' if explanations else ''
         report_type_section = f'📄 RAPOR TÜRÜ: {report_type}\n' if report_type else ''
         
-        user_prompt = f"""Aşağıdaki {len(drugs)} ilacın SGK/SUT uygunluğunu AYNI ANDA değerlendir.
-
-📋 HASTA BİLGİLERİ:
+        # Report-level block first and byte-identical for every group of the
+        # report, so the provider's prompt cache can reuse the prefix; anything
+        # that varies per group (drug count, drug sections) comes after it
+        parts: List[str] = [f"""📋 HASTA BİLGİLERİ:
 - Tanı: {diagnosis.icd10_code} - {diagnosis.tanim}
 - Yaş: {patient.yas or 'Bilinmiyor'}
 - Cinsiyet: {patient.cinsiyet or 'Bilinmiyor'}
@@ -336,42 +714,21 @@ class EligibilityChecker:
 
 {report_type_section}{explanations_section}
 
-"""
+Aşağıdaki {len(drugs)} ilacın SGK/SUT uygunluğunu AYNI ANDA değerlendir.
+"""]
 
-        # Add each drug with its SUT chunks
+        # Add each drug with its SUT chunks; a single drug too large for the
+        # budget keeps only as many of its top chunks as fit
         separator = "=" * 60
+        max_chunk_tokens = None
+        if len(drugs) == 1:
+            max_chunk_tokens = MAX_PROMPT_TOKENS - BATCH_PROMPT_OVERHEAD_TOKENS
         for i, drug in enumerate(drugs, 1):
             sut_chunks = sut_chunks_per_drug.get(drug.etkin_madde, [])
-            
-            user_prompt += f"""
-{separator}
-💊 İLAÇ {i}/{len(drugs)}: {drug.etkin_madde}
-{separator}
-
-İlaç Bilgileri:
-- Etkin Madde: {drug.etkin_madde}
-- Form: {drug.form}
-- Tedavi Şeması: {drug.tedavi_sema}
-- Miktar: {drug.miktar}
-
-📖 İLGİLİ SUT KURALLARI:
-"""
-            
-            if sut_chunks:
-                for j, chunk in enumerate(sut_chunks[:5], 1):  # Top 5 chunks (more for EK-4 cases)
-                    metadata = chunk.get('metadata', {})
-                    content = metadata.get('content', 'İçerik bulunamadı')
-                    doc_type = metadata.get('doc_type', 'UNKNOWN')
-                    doc_source = metadata.get('doc_source', '')
-                    
-                    # Add document type label for clarity
-                    doc_label = f"[{doc_type}]" if doc_type != "UNKNOWN" else ""
-                    user_prompt += f"\n[Chunk {j}] {doc_label}\n{content}\n"
-            else:
-                user_prompt += "\n⚠️ Bu ilaç için SUT kuralı bulunamadı!\n"
+            parts.append(self._build_drug_section(i, len(drugs), drug, sut_chunks, max_chunk_tokens))
 
         # Request batch response
-        user_prompt += f"""
+        parts.append(f"""
 
 {separator}
 TOPLU DEĞERLENDİRME İSTEĞİ
@@ -402,39 +759,59 @@ JSON formatında döndür:
 }}
 
 Her ilaç için AYRI bir result objesi oluştur. Toplam {len(drugs)} result olmalı.
-"""
+""")
+        return "".join(parts)
 
-        # Make single LLM call
-        try:
-            response_json = self.client.chat_completion_json(
-                system_prompt=SYSTEM_PROMPT,
-                user_prompt=user_prompt
-            )
-            
-            # Parse results
-            results = []
-            for i, (drug, result_data) in enumerate(zip(drugs, response_json.get('results', []))):
-                try:
-                    result = self._parse_response(result_data, drug.etkin_madde)
-                    results.append(result)
-                except Exception as e:
-                    self.logger.error(f"Error parsing result for {drug.etkin_madde}: {e}")
-                    results.append(self._create_fallback_result(drug.etkin_madde, str(e)))
-            
-            # If we got fewer results than drugs, fill with fallbacks
-            while len(results) < len(drugs):
-                drug = drugs[len(results)]
-                results.append(self._create_fallback_result(
-                    drug.etkin_madde, 
-                    "Yanıt eksik - LLM tüm ilaçları değerlendiremedi"
-                ))
-            
-            self.logger.info(f"Batch check complete: {len(results)} results")
-            return results
-            
-        except Exception as e:
-            self.logger.error(f"Batch eligibility check failed: {e}")
-            raise
+    def _build_drug_section(
+        self,
+        index: int,
+        total: int,
+        drug: Drug,
+        sut_chunks: List[Dict[str, Any]],
+        max_chunk_tokens: Optional[int] = None
+    ) -> str:
+        """
+        Toplu prompt'taki tek bir ilacın bölümünü oluşturur.
+
+        With max_chunk_tokens set, chunks after the first stop being added once
+        their estimated tokens would exceed it.
+        """
+        separator = "=" * 60
+        parts: List[str] = [f"""
+{separator}
+💊 İLAÇ {index}/{total}: {drug.etkin_madde}
+{separator}
+
+İlaç Bilgileri:
+- Etkin Madde: {drug.etkin_madde}
+- Form: {drug.form}
+- Tedavi Şeması: {drug.tedavi_sema}
+- Miktar: {drug.miktar}
+
+📖 İLGİLİ SUT KURALLARI:
+"""]
+
+        if sut_chunks:
+            used_tokens = 0
+            for j, chunk in enumerate(sut_chunks[:MAX_CHUNKS_PER_DRUG], 1):
+                metadata = chunk.get('metadata', {})
+                content = metadata.get('content', 'İçerik bulunamadı')
+                doc_type = metadata.get('doc_type', 'UNKNOWN')
+
+                used_tokens += _estimate_tokens(content)
+                if max_chunk_tokens is not None and j > 1 and used_tokens > max_chunk_tokens:
+                    self.logger.warning(
+                        f"Prompt budget reached: using {j - 1}/{len(sut_chunks[:MAX_CHUNKS_PER_DRUG])} chunks for {drug.etkin_madde}"
+                    )
+                    break
+
+                # Add document type label for clarity
+                doc_label = f"[{doc_type}]" if doc_type != "UNKNOWN" else ""
+                parts.append(f"\n[Chunk {j}] {doc_label}\n{content}\n")
+        else:
+            parts.append("\n⚠️ Bu ilaç için SUT kuralı bulunamadı!\n")
+
+        return "".join(parts)
 
     def _extract_string_field(self, payload: str, key: str) -> Optional[str]:
         """Extract simple string values from a JSON-like snippet without regex."""
@@ -1,21 +1,197 @@
 """OpenAI client wrapper."""
 
+import hashlib
 import logging
-from typing import Optional, Dict, Any, List
+import os
+import random
+import sqlite3
+import time
+from functools import lru_cache
+from typing import Optional, Dict, Any, Iterator, List
 import json
-
-from openai import OpenAI
+import threading
+
+import httpx
+from openai import OpenAI, APIConnectionError, APIStatusError, APITimeoutError, BadRequestError
+
+try:
+    import orjson  # Optional: faster parsing of JSON-mode responses
+except ImportError:  # pragma: no cover - falls back to stdlib json
+    orjson = None
+
+try:
+    import h2  # noqa: F401  Optional: lets httpx multiplex requests over one HTTP/2 connection
+    HTTP2_AVAILABLE = True
+except ImportError:  # pragma: no cover - HTTP/1.1 keep-alive pool
+    HTTP2_AVAILABLE = False
+
+try:
+    import tiktoken  # Optional: exact token counts instead of the chars/4 estimate
+except ImportError:  # pragma: no cover - falls back to chars/4
+    tiktoken = None
 from app.config.settings import (
     OPENAI_API_KEY, 
     OPENROUTER_API_KEY,
     LLM_MODEL, 
+    EMBEDDING_MODEL,
     LLM_PROVIDER,
     OPENROUTER_BASE_URL,
     OPENROUTER_PROVIDER,
+    CACHE_LLM_RESPONSES,
+    LLM_CACHE_PATH,
+    LLM_CACHE_TTL,
+    LLM_MAX_RETRIES,
+    LLM_RETRY_BASE_DELAY,
+    LLM_REQUESTS_PER_MINUTE,
+    LLM_TOKENS_PER_MINUTE,
+    LLM_STRUCTURED_OUTPUTS,
 )
 
 logger = logging.getLogger(__name__)
 
+# Parser for LLM JSON responses, shared with the report parsers. orjson.JSONDecodeError
+# subclasses json.JSONDecodeError, so one except clause covers both
+json_loads = orjson.loads if orjson is not None else json.loads
+
+# Connection pool shared by every request a wrapper sends (chat, JSON, streaming).
+# Idle connections stay open 30s (httpx default: 5s) so consecutive reports
+# reuse the TLS session instead of handshaking again.
+HTTP_POOL_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=50, keepalive_expiry=30.0)
+# Fail fast on an unreachable host (_create_with_retry retries); keep the long read timeout
+CONNECT_TIMEOUT = 5.0
+
+RETRYABLE_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+MAX_RETRY_DELAY = 60.0
+# Substrings of a 400 error that mean the model/provider does not support Structured Outputs
+SCHEMA_REJECTION_MARKERS = ("response_format", "json_schema", "structured output")
+
+@lru_cache(maxsize=8)
+def _get_encoding(model: str):
+    """tiktoken encoder for the model (built once per model), or None without tiktoken."""
+    if tiktoken is None:
+        return None
+    try:
+        try:
+            # OpenRouter model ids carry a provider prefix ("openai/gpt-4o-mini")
+            return tiktoken.encoding_for_model(model.split("/")[-1])
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:  # BPE files are downloaded on first use
+        logger.warning(f"tiktoken encoding unavailable, using chars/4 estimate: {e}")
+        return None
+
+
+def count_tokens(text: str, model: str = LLM_MODEL) -> int:
+    """Token count of text for the model; chars/4 when tiktoken is not installed."""
+    encoding = _get_encoding(model)
+    if encoding is None:
+        return len(text) // 4
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+_shared_wrappers: Dict[str, "OpenAIClientWrapper"] = {}
+_shared_lock = threading.Lock()
+
+
+class LLMResponseCache:
+    """
+    SQLite-backed cache of raw LLM responses (request hash -> response text).
+
+    Entries older than the TTL are treated as misses and overwritten on the
+    next store.
+    """
+
+    def __init__(self, path: str, ttl: int):
+        self.logger = logging.getLogger(self.__class__.__name__)
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.ttl = ttl
+        self._lock = threading.Lock()  # One connection shared by request threads
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses "
+            "(key TEXT PRIMARY KEY, content TEXT NOT NULL, created_at INTEGER NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached response, or None on a miss or expired entry."""
+        try:
+            with self._lock:
+                row = self._conn.execute(
+                    "SELECT content FROM responses WHERE key = ? AND created_at >= ?",
+                    (key, int(time.time()) - self.ttl)
+                ).fetchone()
+        except sqlite3.Error as e:
+            self.logger.warning(f"Could not read LLM response cache: {e}")
+            return None
+        return row[0] if row is not None else None
+
+    def put(self, key: str, content: str) -> None:
+        """Insert or replace a response."""
+        try:
+            with self._lock:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO responses (key, content, created_at) VALUES (?, ?, ?)",
+                    (key, content, int(time.time()))
+                )
+                self._conn.commit()
+        except sqlite3.Error as e:
+            self.logger.warning(f"Could not write LLM response cache: {e}")
+
+
+class RateLimiter:
+    """
+    Thread-safe dual token bucket (requests/minute and tokens/minute).
+
+    Both buckets start full and refill continuously at limit/60 per second;
+    acquire() blocks until the request and its token estimate fit. A limit
+    of 0 disables that bucket.
+    """
+
+    def __init__(self, requests_per_minute: int, tokens_per_minute: int):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._available_requests = float(requests_per_minute)
+        self._available_tokens = float(tokens_per_minute)
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        elapsed = now - self._last_refill
+        self._last_refill = now
+        self._available_requests = min(
+            self.requests_per_minute, self._available_requests + elapsed * self.requests_per_minute / 60
+        )
+        self._available_tokens = min(
+            self.tokens_per_minute, self._available_tokens + elapsed * self.tokens_per_minute / 60
+        )
+
+    def acquire(self, tokens: int) -> float:
+        """Block until capacity is available; returns the seconds waited."""
+        # A request larger than the whole bucket waits for a full bucket instead of forever
+        tokens = min(tokens, self.tokens_per_minute)
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill()
+                missing_requests = 1 - self._available_requests if self.requests_per_minute else 0.0
+                missing_tokens = tokens - self._available_tokens if self.tokens_per_minute else 0.0
+                if missing_requests <= 0 and missing_tokens <= 0:
+                    if self.requests_per_minute:
+                        self._available_requests -= 1
+                    if self.tokens_per_minute:
+                        self._available_tokens -= tokens
+                    return waited
+                delay = max(
+                    missing_requests * 60 / self.requests_per_minute if missing_requests > 0 else 0.0,
+                    missing_tokens * 60 / self.tokens_per_minute if missing_tokens > 0 else 0.0,
+                )
+            time.sleep(delay)
+            waited += delay
+
 
 class OpenAIClientWrapper:
     """OpenAI/OpenRouter API client wrapper."""
@@ -25,6 +201,12 @@ class OpenAIClientWrapper:
         self.model = LLM_MODEL
         self.logger = logging.getLogger(self.__class__.__name__)
         self.provider_preferences: List[str] = []
+        self._response_cache: Optional[LLMResponseCache] = None
+        self._cache_lock = threading.Lock()
+        self.structured_outputs = LLM_STRUCTURED_OUTPUTS  # Cleared if the provider rejects json_schema
+        self.rate_limiter: Optional[RateLimiter] = None
+        if LLM_REQUESTS_PER_MINUTE > 0 or LLM_TOKENS_PER_MINUTE > 0:
+            self.rate_limiter = RateLimiter(max(0, LLM_REQUESTS_PER_MINUTE), max(0, LLM_TOKENS_PER_MINUTE))
         
         # Configure client based on provider
         if self.provider == "openrouter":
@@ -32,8 +214,9 @@ class OpenAIClientWrapper:
             self.client = OpenAI(
                 api_key=self.api_key,
                 base_url=OPENROUTER_BASE_URL,
-                timeout=120.0,  # OpenRouter may need more time for some models
-                max_retries=2
+                timeout=httpx.Timeout(120.0, connect=CONNECT_TIMEOUT),  # OpenRouter may need more time for some models
+                max_retries=0,  # Retries are handled by _create_with_retry
+                http_client=httpx.Client(limits=HTTP_POOL_LIMITS, http2=HTTP2_AVAILABLE)
             )
             # Store headers for use in requests
             self.extra_headers = {
@@ -49,8 +232,9 @@ class OpenAIClientWrapper:
             self.api_key = api_key or OPENAI_API_KEY
             self.client = OpenAI(
                 api_key=self.api_key,
-                timeout=90.0,
-                max_retries=1
+                timeout=httpx.Timeout(90.0, connect=CONNECT_TIMEOUT),
+                max_retries=0,  # Retries are handled by _create_with_retry
+                http_client=httpx.Client(limits=HTTP_POOL_LIMITS, http2=HTTP2_AVAILABLE)
             )
             self.extra_headers = {}
             self.logger.info(f"Initialized OpenAI client with model: {self.model}")
@@ -75,11 +259,98 @@ class OpenAIClientWrapper:
         extra_body = kwargs.setdefault("extra_body", {})
         extra_body["provider"] = provider_body
 
+    @staticmethod
+    def _retry_after(error: Exception) -> Optional[float]:
+        """Seconds requested by the server's Retry-After header, if any."""
+        response = getattr(error, "response", None)
+        if response is None:
+            return None
+        value = response.headers.get("retry-after")
+        try:
+            return float(value) if value is not None else None
+        except ValueError:
+            return None  # HTTP-date form; fall back to our own backoff
+
+    @staticmethod
+    def _is_retryable(error: Exception) -> bool:
+        if isinstance(error, (APITimeoutError, APIConnectionError)):
+            return True
+        return isinstance(error, APIStatusError) and error.status_code in RETRYABLE_STATUS_CODES
+
+    @staticmethod
+    def _is_schema_rejection(error: BadRequestError) -> bool:
+        """True if a 400 is about response_format/json_schema rather than the request itself."""
+        details = f"{error.message} {error.body}".lower()
+        return any(marker in details for marker in SCHEMA_REJECTION_MARKERS)
+
+    def _create_with_retry(self, kwargs: Dict[str, Any]):
+        """
+        Call the chat completions endpoint, retrying 429/5xx/timeouts with
+        exponential backoff (±25% jitter) or the server's Retry-After. Raises
+        once LLM_MAX_RETRIES attempts are exhausted. For streaming requests
+        only opening the stream is retried.
+        """
+        attempts = max(1, LLM_MAX_RETRIES)
+        for attempt in range(attempts):
+            if self.rate_limiter is not None:
+                waited = self.rate_limiter.acquire(self._request_tokens(kwargs))
+                if waited:
+                    self.logger.info(f"⏳ Rate limiter delayed LLM request by {waited:.1f}s")
+            try:
+                return self.client.chat.completions.create(**kwargs)
+            except Exception as e:
+                if not self._is_retryable(e) or attempt == attempts - 1:
+                    raise
+                delay = self._retry_after(e)
+                if delay is None:
+                    delay = LLM_RETRY_BASE_DELAY * (2 ** attempt) * random.uniform(0.75, 1.25)
+                delay = min(delay, MAX_RETRY_DELAY)
+                self.logger.warning(
+                    f"LLM request failed ({e.__class__.__name__}), "
+                    f"retrying in {delay:.1f}s (attempt {attempt + 1}/{attempts})"
+                )
+            time.sleep(delay)
+
+    def _request_tokens(self, kwargs: Dict[str, Any]) -> int:
+        """Tokens a request counts against the TPM limit: prompt plus max completion."""
+        prompt_tokens = sum(count_tokens(message["content"], self.model) for message in kwargs["messages"])
+        return prompt_tokens + kwargs.get("max_tokens", kwargs.get("max_completion_tokens", 0))
+
+    def _get_response_cache(self) -> Optional[LLMResponseCache]:
+        """Yanıt önbelleğini ilk kullanımda açar (CACHE_LLM_RESPONSES kapalıysa None)."""
+        if not CACHE_LLM_RESPONSES:
+            return None
+        with self._cache_lock:
+            if self._response_cache is None:
+                try:
+                    self._response_cache = LLMResponseCache(LLM_CACHE_PATH, LLM_CACHE_TTL)
+                except sqlite3.Error as e:
+                    self.logger.warning(f"Could not open LLM response cache, continuing without it: {e}")
+                    return None
+            return self._response_cache
+
+    def _response_cache_key(
+        self,
+        system_prompt: str,
+        user_prompt: str,
+        response_format: Optional[Dict[str, str]]
+    ) -> str:
+        """Yanıtı belirleyen istek alanlarının hash'i (model, sağlayıcı, prompt'lar, format)."""
+        payload = json.dumps(
+            [self.provider, self.model, self.provider_preferences, system_prompt, user_prompt, response_format],
+            ensure_ascii=False,
+            sort_keys=True
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
     def chat_completion(
         self,
         system_prompt: str,
         user_prompt: str,
-        response_format: Optional[Dict[str, str]] = None
+        response_format: Optional[Dict[str, str]] = None,
+        stream: bool = False,
+        bypass_cache: bool = False,
+        use_cache: bool = True
     ) -> str:
         """
         Chat completion isteği gönderir.
@@ -88,58 +359,159 @@ class OpenAIClientWrapper:
             system_prompt: System mesajı
             user_prompt: User mesajı
             response_format: Yanıt formatı (örn: {"type": "json_object"})
+            stream: Yanıtı token token al (ilk token gecikmesi loglanır)
+            bypass_cache: True ise önbellek okunmaz; yeni yanıt yine yazılır
+            use_cache: False ise önbellek hiç kullanılmaz (okunmaz, yazılmaz);
+                hasta verisi içeren rapor ayrıştırma çağrıları için
 
         Returns:
             Model yanıtı
         """
-        try:
-            import time
-            
-            messages = [
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ]
-
-            kwargs: Dict[str, Any] = {
-                "model": self.model,
-                "messages": messages,
-            }
+        cache = self._get_response_cache() if use_cache else None
+        cache_key = self._response_cache_key(system_prompt, user_prompt, response_format) if cache else None
+        if cache is not None and not bypass_cache:
+            cached = cache.get(cache_key)
+            if cached is not None:
+                self.logger.info(f"♻️ Using cached LLM response ({len(cached)} chars)")
+                return cached
+
+        content = self._send_chat_completion(system_prompt, user_prompt, response_format, stream)
 
-            # Handle different model families
-            if self.model.startswith("o1"):
-                # o1 models use max_completion_tokens, no temperature support
-                kwargs["max_completion_tokens"] = 8192
-            elif self.model.startswith("gpt-4"):
-                # gpt-4 models support standard parameters
-                kwargs["max_tokens"] = 4096
-                kwargs["temperature"] = 0.7
+        if cache is not None and self._is_cacheable(content, response_format):
+            cache.put(cache_key, content)
+        return content
 
-            if response_format:
-                kwargs["response_format"] = response_format
+    @staticmethod
+    def _is_cacheable(content: Optional[str], response_format: Optional[Dict[str, str]]) -> bool:
+        """Empty responses, and JSON-mode responses that do not parse, are never cached."""
+        if not content:
+            return False
+        if response_format and response_format.get("type") in ("json_object", "json_schema"):
+            try:
+                json_loads(content)
+            except json.JSONDecodeError:
+                return False
+        return True
 
-            # Calculate token estimate
-            prompt_tokens = len(system_prompt + user_prompt) // 4  # rough estimate
+    def chat_completion_stream(
+        self,
+        system_prompt: str,
+        user_prompt: str,
+        response_format: Optional[Dict[str, str]] = None,
+        bypass_cache: bool = False,
+        use_cache: bool = True
+    ) -> Iterator[str]:
+        """
+        Chat completion yanıtını token token üreten generator.
+
+        Düz metin yanıtlarını (CLI / web UI) ilk token gelir gelmez göstermek
+        için kullanılır. JSON modunda çağıran tarafın metni tamamlayıp
+        sonra parse etmesi gerekir; tam yanıt önbelleğe yalnızca generator
+        sonuna kadar tüketildiğinde yazılır.
+
+        Args:
+            system_prompt: System mesajı
+            user_prompt: User mesajı
+            response_format: Yanıt formatı (örn: {"type": "json_object"})
+            bypass_cache: True ise önbellek okunmaz; yeni yanıt yine yazılır
+            use_cache: False ise önbellek hiç kullanılmaz (okunmaz, yazılmaz);
+                hasta verisi içeren rapor ayrıştırma çağrıları için
+
+        Yields:
+            Model yanıtının parçaları
+        """
+        cache = self._get_response_cache() if use_cache else None
+        cache_key = self._response_cache_key(system_prompt, user_prompt, response_format) if cache else None
+        if cache is not None and not bypass_cache:
+            cached = cache.get(cache_key)
+            if cached is not None:
+                self.logger.info(f"♻️ Using cached LLM response ({len(cached)} chars)")
+                yield cached
+                return
+
+        kwargs = self._build_request(system_prompt, user_prompt, response_format)
+        parts: List[str] = []
+        for delta in self._iter_stream(kwargs, time.perf_counter()):
+            parts.append(delta)
+            yield delta
+
+        content = "".join(parts)
+        if cache is not None and self._is_cacheable(content, response_format):
+            cache.put(cache_key, content)
+
+    def _build_request(
+        self,
+        system_prompt: str,
+        user_prompt: str,
+        response_format: Optional[Dict[str, str]]
+    ) -> Dict[str, Any]:
+        """Chat completion isteğinin parametrelerini hazırlar."""
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt}
+        ]
+
+        kwargs: Dict[str, Any] = {
+            "model": self.model,
+            "messages": messages,
+        }
+
+        # Handle different model families
+        if self.model.startswith("o1"):
+            # o1 models use max_completion_tokens, no temperature support
+            kwargs["max_completion_tokens"] = 8192
+        elif self.model.startswith("gpt-4"):
+            # gpt-4 models support standard parameters
+            kwargs["max_tokens"] = 4096
+            kwargs["temperature"] = 0.7
+
+        if response_format:
+            kwargs["response_format"] = response_format
+
+        if self.logger.isEnabledFor(logging.INFO):
+            prompt_tokens = count_tokens(system_prompt, self.model) + count_tokens(user_prompt, self.model)
             self.logger.info(f"🚀 Sending LLM request (model={self.model}, ~{prompt_tokens} prompt tokens)")
-            
-            # Add extra headers for OpenRouter
-            if hasattr(self, 'extra_headers') and self.extra_headers:
-                kwargs['extra_headers'] = self.extra_headers
+        
+        # Add extra headers for OpenRouter
+        if hasattr(self, 'extra_headers') and self.extra_headers:
+            kwargs['extra_headers'] = self.extra_headers
 
-            # Force a specific OpenRouter provider when configured
-            self._inject_provider_preferences(kwargs)
-            
-            api_start = time.time()
-            response = self.client.chat.completions.create(**kwargs)
-            api_elapsed = time.time() - api_start
+        # Force a specific OpenRouter provider when configured
+        self._inject_provider_preferences(kwargs)
+        return kwargs
+
+    def _send_chat_completion(
+        self,
+        system_prompt: str,
+        user_prompt: str,
+        response_format: Optional[Dict[str, str]],
+        stream: bool
+    ) -> str:
+        """Chat completion isteğini API'ye gönderir (önbelleksiz)."""
+        try:
+            kwargs = self._build_request(system_prompt, user_prompt, response_format)
+            api_start = time.perf_counter()
+
+            if stream:
+                return "".join(self._iter_stream(kwargs, api_start))
+
+            response = self._create_with_retry(kwargs)
+            api_elapsed = time.perf_counter() - api_start
             
             content = response.choices[0].message.content
             
             # Log actual token usage if available
-            usage = getattr(response, 'usage', None)
-            if usage:
-                self.logger.info(f"✅ LLM response: {api_elapsed:.2f}s, {usage.prompt_tokens} prompt + {usage.completion_tokens} completion = {usage.total_tokens} total tokens")
-            else:
-                self.logger.info(f"✅ LLM response: {api_elapsed:.2f}s, {len(content)} chars")
+            if self.logger.isEnabledFor(logging.INFO):
+                usage = getattr(response, 'usage', None)
+                if usage:
+                    details = getattr(usage, 'prompt_tokens_details', None)
+                    cached_tokens = getattr(details, 'cached_tokens', None) or 0
+                    self.logger.info(
+                        f"✅ LLM response: {api_elapsed:.2f}s, {usage.prompt_tokens} prompt "
+                        f"({cached_tokens} cached) + {usage.completion_tokens} completion = {usage.total_tokens} total tokens"
+                    )
+                else:
+                    self.logger.info(f"✅ LLM response: {api_elapsed:.2f}s, {len(content)} chars")
             
             return content
 
@@ -147,11 +519,35 @@ class OpenAIClientWrapper:
             self.logger.error(f"Chat completion error: {e}")
             raise
 
+    def _iter_stream(self, kwargs: Dict[str, Any], api_start: float) -> Iterator[str]:
+        """Send a streaming request and yield the content deltas as they arrive."""
+        first_token_elapsed = None
+        total_chars = 0
+
+        for chunk in self._create_with_retry({**kwargs, "stream": True}):
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                if first_token_elapsed is None:
+                    first_token_elapsed = time.perf_counter() - api_start
+                total_chars += len(delta)
+                yield delta
+
+        if self.logger.isEnabledFor(logging.INFO):
+            api_elapsed = time.perf_counter() - api_start
+            self.logger.info(
+                f"✅ LLM response (streamed): {api_elapsed:.2f}s, "
+                f"first token {first_token_elapsed or api_elapsed:.2f}s, {total_chars} chars"
+            )
+
     def chat_completion_json(
         self,
         system_prompt: str,
         user_prompt: str,
-        max_retries: int = 2
+        max_retries: int = 2,
+        json_schema: Optional[Dict[str, Any]] = None,
+        bypass_cache: bool = False
     ) -> Dict[str, Any]:
         """
         JSON formatında yanıt döndürür.
@@ -160,6 +556,9 @@ class OpenAIClientWrapper:
             system_prompt: System mesajı
             user_prompt: User mesajı
             max_retries: JSON parse hatası durumunda retry sayısı
+            json_schema: Strict JSON şeması ({"name", "strict", "schema"}); verilirse
+                Structured Outputs istenir, desteklenmiyorsa JSON moduna düşülür
+            bypass_cache: True ise yanıt önbelleği okunmaz; yeni yanıt yine yazılır
 
         Returns:
             Parse edilmiş JSON objesi
@@ -169,14 +568,15 @@ class OpenAIClientWrapper:
         
         for attempt in range(max_retries + 1):
             try:
-                response_text = self.chat_completion(
-                    system_prompt=system_prompt,
-                    user_prompt=user_prompt,
-                    response_format={"type": "json_object"}
+                response_text = self._json_completion(
+                    system_prompt,
+                    user_prompt,
+                    json_schema,
+                    bypass_cache=bypass_cache or attempt > 0  # A retry must reach the model again
                 )
 
                 # Try to parse JSON
-                return json.loads(response_text)
+                return json_loads(response_text)
                 
             except json.JSONDecodeError as e:
                 last_error = e
@@ -188,7 +588,7 @@ class OpenAIClientWrapper:
                         candidate = self._extract_json_snippet(response_text)
                         if candidate:
                             try:
-                                return json.loads(candidate)
+                                return json_loads(candidate)
                             except Exception:
                                 pass
 
@@ -202,7 +602,38 @@ class OpenAIClientWrapper:
                     # Fallback: Return raw response
                     return {"raw_response": response_text or "", "parse_error": str(last_error)}
 
-    def create_embedding(self, text: str, model: str = "gpt-5-mini") -> list:
+    def _json_completion(
+        self,
+        system_prompt: str,
+        user_prompt: str,
+        json_schema: Optional[Dict[str, Any]],
+        bypass_cache: bool
+    ) -> str:
+        """JSON yanıt ister; şema varsa önce Structured Outputs (json_schema) dener."""
+        if json_schema is not None and self.structured_outputs:
+            try:
+                return self.chat_completion(
+                    system_prompt=system_prompt,
+                    user_prompt=user_prompt,
+                    response_format={"type": "json_schema", "json_schema": json_schema},
+                    bypass_cache=bypass_cache
+                )
+            except BadRequestError as e:
+                if not self._is_schema_rejection(e):
+                    raise
+                self.structured_outputs = False
+                self.logger.warning(
+                    f"Structured Outputs rejected for model {self.model}, using JSON mode instead: {e}"
+                )
+
+        return self.chat_completion(
+            system_prompt=system_prompt,
+            user_prompt=user_prompt,
+            response_format={"type": "json_object"},
+            bypass_cache=bypass_cache
+        )
+
+    def create_embedding(self, text: str, model: str = EMBEDDING_MODEL) -> list:
         """
         Metin için embedding oluşturur.
 
@@ -247,3 +678,21 @@ class OpenAIClientWrapper:
             return text[first_brace:last_brace + 1].strip()
 
         return None
+
+
+def get_openai_client_wrapper(provider: Optional[str] = None) -> OpenAIClientWrapper:
+    """
+    Process-wide OpenAIClientWrapper (provider başına bir tane).
+
+    Parser, checker ve arayüzler aynı wrapper'ı paylaşır; böylece keep-alive
+    bağlantıları tekrar kullanılır ve her çağrıda yeni TLS el sıkışması yapılmaz.
+    """
+    key = provider or LLM_PROVIDER
+    wrapper = _shared_wrappers.get(key)
+    if wrapper is None:
+        with _shared_lock:
+            wrapper = _shared_wrappers.get(key)
+            if wrapper is None:
+                wrapper = OpenAIClientWrapper(provider=key)
+                _shared_wrappers[key] = wrapper
+    return wrapper
@@ -1,6 +1,7 @@
 """Prompt templates for LLM."""
 
-from typing import List, Dict, Any, Optional
+from functools import lru_cache
+from typing import List, Dict, Any, Optional, Tuple
 from app.models.report import Drug, Diagnosis, PatientInfo
 
 
@@ -205,21 +206,107 @@ JSON format:
 # Eligibility Check System Prompt
 ELIGIBILITY_SYSTEM_PROMPT = SYSTEM_PROMPT  # Backward compatibility
 
+# Strict JSON schemas (Structured Outputs) mirroring the response formats above
+_ELIGIBILITY_RESULT_PROPERTIES = {
+    "drug_name": {"type": "string"},
+    "status": {"type": "string", "enum": ["ELIGIBLE", "NOT_ELIGIBLE", "CONDITIONAL"]},
+    "confidence": {"type": "number"},
+    "sut_reference": {"type": "string"},
+    "conditions": {
+        "type": "array",
+        "items": {
+            "type": "object",
+            "properties": {
+                "description": {"type": "string"},
+                "is_met": {"type": ["boolean", "null"]},
+                "required_info": {"type": ["string", "null"]},
+            },
+            "required": ["description", "is_met", "required_info"],
+            "additionalProperties": False,
+        },
+    },
+    "explanation": {"type": "string"},
+    "warnings": {"type": "array", "items": {"type": "string"}},
+}
+
+ELIGIBILITY_RESULT_SCHEMA = {
+    "name": "eligibility_result",
+    "strict": True,
+    "schema": {
+        "type": "object",
+        "properties": _ELIGIBILITY_RESULT_PROPERTIES,
+        "required": list(_ELIGIBILITY_RESULT_PROPERTIES),
+        "additionalProperties": False,
+    },
+}
+
+BATCH_ELIGIBILITY_SCHEMA = {
+    "name": "batch_eligibility_results",
+    "strict": True,
+    "schema": {
+        "type": "object",
+        "properties": {"results": {"type": "array", "items": ELIGIBILITY_RESULT_SCHEMA["schema"]}},
+        "required": ["results"],
+        "additionalProperties": False,
+    },
+}
+
 
 # Optimized User Prompt Template for Speed
-USER_PROMPT_TEMPLATE = """💊 İLAÇ: {drug_name}
-🏥 TANI: {diagnosis_name} ({icd_code})
+# Report-level fields come first so consecutive drugs of one report share the
+# longest possible prompt prefix (provider-side prompt caching); drug-specific
+# fields and SUT rules come last
+USER_PROMPT_TEMPLATE = """🏥 TANI: {diagnosis_name} ({icd_code})
 👤 HASTA: {patient_age}y, {patient_gender}
 👨‍⚕️ DOKTOR: {doctor_specialty}
 📄 RAPOR TÜRÜ: {report_type}
 {explanations}
 
+💊 İLAÇ: {drug_name}
+
 📋 SUT KURALLARI:
 {sut_chunks}
 
 GÖREV: SGK uygunluğunu değerlendir. Yanıtı KISA tut (max 500 kelime). JSON:"""
 
 
+@lru_cache(maxsize=512)
+def _format_chunk_entries(
+    entries: Tuple[Tuple[Any, ...], ...],
+    max_chars_per_chunk: int,
+    include_page_numbers: bool,
+    include_confidence: bool
+) -> str:
+    """(section, doc_type, page, confidence, content) kayıtlarını prompt metnine çevirir."""
+    formatted_chunks = []
+
+    for i, (section, doc_type, page_info, confidence, content) in enumerate(entries, 1):
+        # Add document type label for clarity (especially for EK-4 documents)
+        doc_label = f" [{doc_type}]" if doc_type else ""
+
+        # Ek bilgileri al
+        chunk_parts = [f"[{i}] {section}{doc_label}"]
+
+        # Sayfa numarası ekle
+        if include_page_numbers and page_info:
+            chunk_parts.append(f"Sayfa: {page_info}")
+
+        # Güven puanı ekle
+        if include_confidence and confidence is not None:
+            chunk_parts.append(f"Güven: {confidence}")
+
+        # İçeriği kısalt
+        if len(content) > max_chars_per_chunk:
+            content = content[:max_chars_per_chunk] + "..."
+
+        chunk_parts.append(content)
+
+        chunk_text = "\n".join(chunk_parts)
+        formatted_chunks.append(chunk_text.strip())
+
+    return "\n\n".join(formatted_chunks)
+
+
 class PromptBuilder:
     """LLM promptları oluşturan sınıf."""
 
@@ -289,42 +376,25 @@ class PromptBuilder:
         if not chunks:
             return "❌ İlgili kural bulunamadı"
 
-        formatted_chunks = []
-
-        for i, chunk in enumerate(chunks[:max_chunks], 1):
-            metadata = chunk.get('metadata', {})
-            content = metadata.get('content', '')
-            section = metadata.get('section', 'Bölüm ?')
-            doc_type = metadata.get('doc_type', '')
-            
-            # Add document type label for clarity (especially for EK-4 documents)
-            doc_label = f" [{doc_type}]" if doc_type else ""
-            
-            # Ek bilgileri al
-            chunk_parts = [f"[{i}] {section}{doc_label}"]
-            
-            # Sayfa numarası ekle
-            if include_page_numbers:
-                page_info = metadata.get('page_number', metadata.get('page', ''))
-                if page_info:
-                    chunk_parts.append(f"Sayfa: {page_info}")
-            
-            # Güven puanı ekle
-            if include_confidence:
-                confidence = metadata.get('confidence', metadata.get('score', ''))
-                if confidence is not None:
-                    chunk_parts.append(f"Güven: {confidence}")
-            
-            # İçeriği kısalt
-            if len(content) > max_chars_per_chunk:
-                content = content[:max_chars_per_chunk] + "..."
-            
-            chunk_parts.append(content)
-            
-            chunk_text = "\n".join(chunk_parts)
-            formatted_chunks.append(chunk_text.strip())
-
-        return "\n\n".join(formatted_chunks)
+        # Aynı chunk'lar (aynı ICD kodlu ilaçlar) tekrar formatlanmasın diye
+        # yalnızca çıktıyı etkileyen alanlardan hashable bir anahtar kurulur
+        key = tuple(
+            (
+                metadata.get('section', 'Bölüm ?'),
+                metadata.get('doc_type', ''),
+                metadata.get('page_number', metadata.get('page', '')),
+                metadata.get('confidence', metadata.get('score', '')),
+                metadata.get('content', ''),
+            )
+            for metadata in (chunk.get('metadata', {}) for chunk in chunks[:max_chunks])
+        )
+        try:
+            return _format_chunk_entries(key, max_chars_per_chunk, include_page_numbers, include_confidence)
+        except TypeError:
+            # Unhashable metadata value: format without the cache
+            return _format_chunk_entries.__wrapped__(
+                key, max_chars_per_chunk, include_page_numbers, include_confidence
+            )
 
     @staticmethod
     def build_summary_prompt(eligibility_results: List[Dict[str, Any]], format_type: str = 'markdown') -> str:
@@ -1,12 +1,11 @@
 """Diagnosis extraction from patient reports using LLM."""
 
 import logging
-import json
-from datetime import datetime
 from typing import List
 
 from app.models.report import Diagnosis
-from app.core.llm.openai_client import OpenAIClientWrapper
+from app.core.llm.openai_client import OpenAIClientWrapper, get_openai_client_wrapper, json_loads
+from .dates import parse_ddmmyyyy
 
 logger = logging.getLogger(__name__)
 
@@ -16,7 +15,7 @@ class DiagnosisExtractor:
 
     def __init__(self, openai_client: OpenAIClientWrapper = None):
         self.logger = logging.getLogger(self.__class__.__name__)
-        self.openai_client = openai_client or OpenAIClientWrapper()
+        self.openai_client = openai_client or get_openai_client_wrapper()
 
     def extract_diagnoses(self, text: str) -> List[Diagnosis]:
         """
@@ -52,40 +51,28 @@ JSON formatında döndür:
 
 Eğer bir bilgi bulunamazsa null veya "UNKNOWN" kullan."""
 
-            user_prompt = f"""Aşağıdaki rapor metninden tüm tanıları çıkar:
+            # Report text last: everything before it is a stable, cacheable prefix
+            user_prompt = f"""Aşağıdaki rapor metninden tüm tanıları çıkar.
+Lütfen sadece JSON formatında yanıt ver, başka açıklama ekleme.
 
-{text}
-
-Lütfen sadece JSON formatında yanıt ver, başka açıklama ekleme."""
+Rapor Metni:
+{text}"""
 
             response_text = self.openai_client.chat_completion(
                 system_prompt=system_prompt,
                 user_prompt=user_prompt,
-                response_format={"type": "json_object"}
+                response_format={"type": "json_object"},
+                use_cache=False  # Report contents are never written to the response cache
             )
 
             # JSON yanıtı parse et
-            data = json.loads(response_text)
+            data = json_loads(response_text)
             
             diagnoses = []
             for diag_data in data.get("diagnoses", []):
                 # Tarihleri parse et
-                baslangic = None
-                bitis = None
-                
-                if diag_data.get("baslangic") and diag_data["baslangic"] != "UNKNOWN":
-                    try:
-                        day, month, year = diag_data["baslangic"].split('/')
-                        baslangic = datetime(int(year), int(month), int(day)).date()
-                    except:
-                        pass
-                
-                if diag_data.get("bitis") and diag_data["bitis"] != "UNKNOWN":
-                    try:
-                        day, month, year = diag_data["bitis"].split('/')
-                        bitis = datetime(int(year), int(month), int(day)).date()
-                    except:
-                        pass
+                baslangic = parse_ddmmyyyy(diag_data.get("baslangic"))
+                bitis = parse_ddmmyyyy(diag_data.get("bitis"))
 
                 diagnosis = Diagnosis(
                     icd10_code=diag_data.get("icd10_code", "UNKNOWN"),
@@ -1,12 +1,12 @@
 """Drug extraction from patient reports using LLM."""
 
 import logging
-import json
 from datetime import datetime
 from typing import List
 
 from app.models.report import Drug
-from app.core.llm.openai_client import OpenAIClientWrapper
+from app.core.llm.openai_client import OpenAIClientWrapper, get_openai_client_wrapper, json_loads
+from .dates import parse_ddmmyyyy
 
 logger = logging.getLogger(__name__)
 
@@ -16,7 +16,7 @@ class DrugExtractor:
 
     def __init__(self, openai_client: OpenAIClientWrapper = None):
         self.logger = logging.getLogger(self.__class__.__name__)
-        self.openai_client = openai_client or OpenAIClientWrapper()
+        self.openai_client = openai_client or get_openai_client_wrapper()
 
     def extract_drugs(self, text: str) -> List[Drug]:
         """
@@ -57,32 +57,27 @@ JSON formatında döndür:
 
 Eğer bir bilgi bulunamazsa "UNKNOWN" veya varsayılan değer kullan."""
 
-            user_prompt = f"""Aşağıdaki rapor metninden tüm ilaçları çıkar:
+            # Report text last: everything before it is a stable, cacheable prefix
+            user_prompt = f"""Aşağıdaki rapor metninden tüm ilaçları çıkar.
+Lütfen sadece JSON formatında yanıt ver, başka açıklama ekleme.
 
-{text}
-
-Lütfen sadece JSON formatında yanıt ver, başka açıklama ekleme."""
+Rapor Metni:
+{text}"""
 
             response_text = self.openai_client.chat_completion(
                 system_prompt=system_prompt,
                 user_prompt=user_prompt,
-                response_format={"type": "json_object"}
+                response_format={"type": "json_object"},
+                use_cache=False  # Report contents are never written to the response cache
             )
 
             # JSON yanıtı parse et
-            data = json.loads(response_text)
+            data = json_loads(response_text)
             
             drugs = []
             for drug_data in data.get("drugs", []):
                 # Tarihi parse et
-                eklenme_zamani = datetime.now().date()
-                if "eklenme_zamani" in drug_data and drug_data["eklenme_zamani"] != "UNKNOWN":
-                    try:
-                        date_str = drug_data["eklenme_zamani"]
-                        day, month, year = date_str.split('/')
-                        eklenme_zamani = datetime(int(year), int(month), int(day)).date()
-                    except:
-                        pass
+                eklenme_zamani = parse_ddmmyyyy(drug_data.get("eklenme_zamani")) or datetime.now().date()
 
                 drug = Drug(
                     kod=drug_data.get("kod", "UNKNOWN"),
@@ -1,29 +1,89 @@
 """Main input parser for patient reports."""
 
 import logging
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Optional
+from functools import cached_property
+from typing import List, Optional
 
 from app.models.report import ParsedReport, DoctorInfo, PatientInfo, Drug, Diagnosis
-from app.core.llm.openai_client import OpenAIClientWrapper
+from app.core.llm.openai_client import OpenAIClientWrapper, get_openai_client_wrapper, json_loads
 from app.core.llm.prompts import FULL_REPORT_EXTRACTION_SYSTEM_PROMPT
+from app.config.settings import ENABLE_STREAMING, MAX_REPORTS_PER_CALL
+from .dates import parse_ddmmyyyy
 from .drug_extractor import DrugExtractor
 from .diagnosis_extractor import DiagnosisExtractor
 from .patient_extractor import PatientInfoExtractor
 
 logger = logging.getLogger(__name__)
 
+_DRUG_INFO_KEYWORDS = ("etkin madde", "sgk", "ilaç", "rapor")
+
+def _fold(label: str) -> str:
+    """Case-folds a field label, treating Turkish I/ı/İ/i alike ("ADI" == "adı")."""
+    return label.replace('İ', 'i').lower().replace('ı', 'i')
+
+
+# Personal-information sections of pasted reports are never extracted
+# (privacy), so their fields are not sent to the LLM
+_UNUSED_SECTION_HEADERS = frozenset({"hasta bilgileri", "personal information"})
+_PERSONAL_FIELDS = frozenset(_fold(field) for field in {
+    "ad", "adı", "soyad", "soyadı", "ad soyad", "adı soyadı", "hasta", "hasta adı", "hasta adı soyadı",
+    "name", "surname", "full name", "patient name",
+    "tc", "t.c.", "tc no", "tc kimlik no", "t.c. kimlik no", "kimlik no", "national id",
+    "doğum tarihi", "doğum yeri", "birth date", "date of birth", "yaş", "age", "cinsiyet", "gender", "sex",
+    "baba adı", "anne adı", "adres", "address", "telefon", "tel", "phone", "e-posta", "email",
+})
+_FIELD_LABEL_PATTERN = re.compile(r'^\s*([^:\t]+?)\s*(?::|\t)')
+
+
+def _strip_unused_sections(text: str) -> str:
+    """
+    Removes the patient personal-information fields from the LLM input.
+
+    After a personal-information header only blank lines and known personal
+    fields ("Ad Soyad: ...", "TC\t...") are dropped; any other line ends the
+    section, so clinical text following it is never lost.
+    """
+    kept: List[str] = []
+    skipping = False
+    for line in text.split('\n'):
+        stripped = line.strip()
+        if _fold(stripped.rstrip(':').strip()) in _UNUSED_SECTION_HEADERS:
+            skipping = True
+            continue
+        if skipping:
+            label = _FIELD_LABEL_PATTERN.match(line)
+            if not stripped or (label and _fold(label.group(1)) in _PERSONAL_FIELDS):
+                continue
+            skipping = False
+        kept.append(line)
+    return '\n'.join(kept)
+
 
 class InputParser:
     """Ham rapor metnini parse eden ana sınıf."""
 
     def __init__(self, openai_client: OpenAIClientWrapper = None):
-        self.openai_client = openai_client or OpenAIClientWrapper()
-        self.drug_extractor = DrugExtractor(self.openai_client)
-        self.diagnosis_extractor = DiagnosisExtractor(self.openai_client)
-        self.patient_extractor = PatientInfoExtractor(self.openai_client)
+        self.openai_client = openai_client or get_openai_client_wrapper()
         self.logger = logging.getLogger(self.__class__.__name__)
 
+    # Per-field extractors are only used when the combined extraction call
+    # fails, so they are built on first use
+    @cached_property
+    def drug_extractor(self) -> DrugExtractor:
+        return DrugExtractor(self.openai_client)
+
+    @cached_property
+    def diagnosis_extractor(self) -> DiagnosisExtractor:
+        return DiagnosisExtractor(self.openai_client)
+
+    @cached_property
+    def patient_extractor(self) -> PatientInfoExtractor:
+        return PatientInfoExtractor(self.openai_client)
+
     def parse_report(self, raw_text: str) -> ParsedReport:
         """
         Ham rapor metnini parse eder.
@@ -40,19 +100,70 @@ class InputParser:
         if not self.validate_input(raw_text):
             raise ValueError("Geçersiz rapor formatı")
 
-        import time
         self.logger.info("Parsing report...")
 
-        total_start = time.time()
+        total_start = time.perf_counter()
 
         # Metni temizle
         cleaned_text = self.clean_text(raw_text)
 
         # **OPTIMIZED: Single LLM call for all structured data**
-        llm_start = time.time()
+        llm_start = time.perf_counter()
         all_data = self._extract_all_with_single_llm_call(cleaned_text)
-        llm_time = (time.time() - llm_start) * 1000
+        llm_time = (time.perf_counter() - llm_start) * 1000
+
+        parsed_report = self._build_parsed_report(cleaned_text, all_data)
+
+        total_time = (time.perf_counter() - total_start) * 1000
+        self.logger.info(f"Parsing complete: total={total_time:.1f}ms, llm_extract={llm_time:.1f}ms")
+        if total_time > 5000:
+            self.logger.warning(f"⚠️ Parsing took {total_time/1000:.1f}s - investigate slow extractors or large LLM latency")
+
+        return parsed_report
 
+    def parse_reports(self, raw_texts: List[str]) -> List[ParsedReport]:
+        """
+        Birden fazla raporu, MAX_REPORTS_PER_CALL'lık gruplar halinde tek LLM
+        çağrısıyla parse eder (sıra korunur).
+
+        Toplu yanıtta eksik veya bozuk gelen raporlar tek tek yeniden çıkarılır.
+
+        Args:
+            raw_texts: Ham rapor metinleri
+
+        Returns:
+            ParsedReport listesi (girdiyle aynı sırada)
+
+        Raises:
+            ValueError: Raporlardan biri geçersizse
+        """
+        for raw_text in raw_texts:
+            if not self.validate_input(raw_text):
+                raise ValueError("Geçersiz rapor formatı")
+
+        cleaned_texts = [self.clean_text(raw_text) for raw_text in raw_texts]
+        group_size = max(1, MAX_REPORTS_PER_CALL)
+        self.logger.info(f"Parsing {len(cleaned_texts)} reports (up to {group_size} per LLM call)...")
+
+        total_start = time.perf_counter()
+        parsed_reports: List[ParsedReport] = []
+        for start in range(0, len(cleaned_texts), group_size):
+            group = cleaned_texts[start:start + group_size]
+            if len(group) == 1:
+                extracted = [self._extract_all_with_single_llm_call(group[0])]
+            else:
+                extracted = self._extract_reports_with_single_llm_call(group)
+            for text, all_data in zip(group, extracted):
+                if all_data is None:
+                    all_data = self._extract_all_with_single_llm_call(text)
+                parsed_reports.append(self._build_parsed_report(text, all_data))
+
+        total_time = (time.perf_counter() - total_start) * 1000
+        self.logger.info(f"Parsed {len(parsed_reports)} reports in {total_time:.1f}ms")
+        return parsed_reports
+
+    def _build_parsed_report(self, cleaned_text: str, all_data: dict) -> ParsedReport:
+        """Create a ParsedReport from the extracted data of one report."""
         report_info = all_data.get('report', {}) if isinstance(all_data, dict) else {}
         doctor_info = all_data.get('doctor', {}) if isinstance(all_data, dict) else {}
         drugs = all_data.get('drugs', []) if isinstance(all_data, dict) else []
@@ -67,11 +178,6 @@ class InputParser:
 
         doctor = self._build_doctor_info(doctor_info)
 
-        total_time = (time.time() - total_start) * 1000
-        self.logger.info(f"Parsing complete: total={total_time:.1f}ms, llm_extract={llm_time:.1f}ms")
-        if total_time > 5000:
-            self.logger.warning(f"⚠️ Parsing took {total_time/1000:.1f}s - investigate slow extractors or large LLM latency")
-
         parsed_report = ParsedReport(
             report_id=report_id or "UNKNOWN",
             date=report_date or datetime.now().date(),
@@ -101,11 +207,9 @@ class InputParser:
         if not raw_text or len(raw_text.strip()) < 50:
             return False
 
-        # En az bir ilaç veya tanı bilgisi olmalı
-        has_drug_info = any(keyword in raw_text.lower() 
-                           for keyword in ["etkin madde", "sgk", "ilaç", "rapor"])
-        
-        return has_drug_info
+        # En az bir ilaç veya tanı bilgisi olmalı (metin bir kez küçültülür)
+        lowered = raw_text.lower()
+        return any(keyword in lowered for keyword in _DRUG_INFO_KEYWORDS)
 
     def clean_text(self, text: str) -> str:
         """
@@ -172,118 +276,158 @@ class InputParser:
         """Single LLM call to extract full structured report data - ONLY ESSENTIAL FIELDS."""
         try:
             system_prompt = FULL_REPORT_EXTRACTION_SYSTEM_PROMPT
+            # Report text last: everything before it is a stable, cacheable prefix
             user_prompt = (
                 "Hasta raporunu analiz et ve SADECE gerekli klinik bilgileri çıkar. Şemaya uygun JSON döndür.\n\n" 
                 "Rapor Metni:\n"
-                f"{text}\n\nJSON yanıt:"
+                f"{_strip_unused_sections(text)}"
             )
 
             response_text = self.openai_client.chat_completion(
                 system_prompt=system_prompt,
                 user_prompt=user_prompt,
-                response_format={"type": "json_object"}
+                response_format={"type": "json_object"},
+                stream=ENABLE_STREAMING,
+                use_cache=False  # Report contents are never written to the response cache
             )
 
-            import json
-            data = json.loads(response_text)
-
-            # Extract simplified fields
-            report_type = data.get("report_type")
-            specialty = data.get("specialty")
-            explanations = data.get("explanations")
-
-            # Parse drugs
-            drugs = []
-            for drug_data in data.get("drugs", []) or []:
-                eklenme_zamani = datetime.now().date()
-                eklenme_value = drug_data.get("eklenme_zamani")
-                if eklenme_value and eklenme_value != "UNKNOWN":
-                    try:
-                        day, month, year = eklenme_value.split('/')
-                        eklenme_zamani = datetime(int(year), int(month), int(day)).date()
-                    except Exception:
-                        pass
-
-                drug = Drug(
-                    kod=drug_data.get("kod", "UNKNOWN"),
-                    etkin_madde=drug_data.get("etkin_madde", "UNKNOWN"),
-                    form=drug_data.get("form", "UNKNOWN"),
-                    tedavi_sema=drug_data.get("tedavi_sema", "UNKNOWN"),
-                    miktar=drug_data.get("miktar", 1),
-                    eklenme_zamani=eklenme_zamani
-                )
-                drugs.append(drug)
-
-            # Parse diagnoses
-            diagnoses = []
-            for diag_data in data.get("diagnoses", []) or []:
-                baslangic = None
-                if diag_data.get("baslangic") and diag_data["baslangic"] != "UNKNOWN":
-                    try:
-                        day, month, year = diag_data["baslangic"].split('/')
-                        baslangic = datetime(int(year), int(month), int(day)).date()
-                    except Exception:
-                        pass
-
-                bitis = None
-                if diag_data.get("bitis") and diag_data["bitis"] != "UNKNOWN":
-                    try:
-                        day, month, year = diag_data["bitis"].split('/')
-                        bitis = datetime(int(year), int(month), int(day)).date()
-                    except Exception:
-                        pass
-
-                diagnosis = Diagnosis(
-                    icd10_code=diag_data.get("icd10_code", "UNKNOWN"),
-                    tanim=diag_data.get("tanim", "UNKNOWN"),
-                    baslangic=baslangic,
-                    bitis=bitis
-                )
-                diagnoses.append(diagnosis)
-
-            # Create minimal patient/doctor info (not extracted from report anymore)
-            patient = PatientInfo(cinsiyet=None, dogum_tarihi=None, yas=None)
-            
-            # Build doctor info with only specialty (extracted)
-            doctor_info = {
-                "name": "UNKNOWN",
-                "specialty": specialty or "UNKNOWN",
-                "diploma": "UNKNOWN"
-            }
-            
-            # Build minimal report info
-            report_info = {
-                "id": "UNKNOWN",
-                "date": "UNKNOWN",
-                "hospital_code": "UNKNOWN"
-            }
-
-            self.logger.info(
-                "✅ Extracted ESSENTIAL fields only: %s drugs, %s diagnoses, specialty=%s, report_type=%s",
-                len(drugs),
-                len(diagnoses),
-                specialty,
-                report_type
-            )
-            
-            return {
-                'report': report_info,
-                'doctor': doctor_info,
-                'drugs': drugs,
-                'diagnoses': diagnoses,
-                'patient': patient,
-                'explanations': explanations,
-                'report_type': report_type
-            }
+            data = json_loads(response_text)
+            return self._extraction_from_json(data)
 
         except Exception as e:
             self.logger.error(f"Error in combined extraction: {e}")
-            self.logger.warning("Falling back to sequential extraction")
-            return {
-                'report': {},
-                'doctor': {},
-                'drugs': self.drug_extractor.extract_drugs(text),
-                'diagnoses': self.diagnosis_extractor.extract_diagnoses(text),
-                'patient': self.patient_extractor.extract_patient_info(text),
-                'explanations': None
-            }
+            self.logger.warning("Falling back to per-field extraction (3 concurrent LLM calls)")
+            # The three extractors are independent: run them together so the
+            # fallback costs the slowest call instead of the sum of all three
+            with ThreadPoolExecutor(max_workers=3) as executor:
+                drugs_future = executor.submit(self.drug_extractor.extract_drugs, text)
+                diagnoses_future = executor.submit(self.diagnosis_extractor.extract_diagnoses, text)
+                patient_future = executor.submit(self.patient_extractor.extract_patient_info, text)
+                return {
+                    'report': {},
+                    'doctor': {},
+                    'drugs': drugs_future.result(),
+                    'diagnoses': diagnoses_future.result(),
+                    'patient': patient_future.result(),
+                    'explanations': None
+                }
+
+    def _extract_reports_with_single_llm_call(self, texts: List[str]) -> List[Optional[dict]]:
+        """
+        Several reports in one LLM call (same schema per report, keyed by index).
+
+        Returns one extraction dict per report; None where the response has no
+        usable entry for that report, or for every report if the call fails.
+        """
+        sections = "".join(
+            f"\n\n=== RAPOR {i} ===\n{_strip_unused_sections(text)}" for i, text in enumerate(texts)
+        )
+        # Instructions first, report texts last (stable, cacheable prefix)
+        user_prompt = (
+            f"Aşağıda {len(texts)} ayrı hasta raporu var. Her rapor için şemaya uygun ayrı bir nesne çıkar ve "
+            "başlıktaki numarayı \"index\" alanına yaz. Yanıt formatı: "
+            "{\"reports\": [{\"index\": 0, \"report_type\": ..., \"specialty\": ..., \"explanations\": ..., "
+            "\"diagnoses\": [...], \"drugs\": [...]}]}\n\n"
+            "Rapor Metinleri:"
+            f"{sections}"
+        )
+
+        try:
+            response_text = self.openai_client.chat_completion(
+                system_prompt=FULL_REPORT_EXTRACTION_SYSTEM_PROMPT,
+                user_prompt=user_prompt,
+                response_format={"type": "json_object"},
+                stream=ENABLE_STREAMING,
+                use_cache=False  # Report contents are never written to the response cache
+            )
+            entries = json_loads(response_text).get("reports") or []
+        except Exception as e:
+            self.logger.error(f"Error in batched extraction of {len(texts)} reports: {e}")
+            return [None] * len(texts)
+
+        extracted: List[Optional[dict]] = [None] * len(texts)
+        for entry in entries:
+            if not isinstance(entry, dict):
+                continue
+            index = entry.get("index")
+            if isinstance(index, int) and 0 <= index < len(texts) and extracted[index] is None:
+                try:
+                    extracted[index] = self._extraction_from_json(entry)
+                except Exception as e:
+                    self.logger.warning(f"Could not read batched extraction for report {index}: {e}")
+
+        missing = sum(1 for item in extracted if item is None)
+        if missing:
+            self.logger.warning(f"⚠️ {missing}/{len(texts)} reports missing from batched extraction, extracting them one by one")
+        return extracted
+
+    def _extraction_from_json(self, data: dict) -> dict:
+        """Convert the LLM's JSON for one report into the parser's extraction dict."""
+        # Extract simplified fields
+        report_type = data.get("report_type")
+        specialty = data.get("specialty")
+        explanations = data.get("explanations")
+
+        # Parse drugs
+        drugs = []
+        for drug_data in data.get("drugs", []) or []:
+            eklenme_zamani = parse_ddmmyyyy(drug_data.get("eklenme_zamani")) or datetime.now().date()
+
+            drug = Drug(
+                kod=drug_data.get("kod", "UNKNOWN"),
+                etkin_madde=drug_data.get("etkin_madde", "UNKNOWN"),
+                form=drug_data.get("form", "UNKNOWN"),
+                tedavi_sema=drug_data.get("tedavi_sema", "UNKNOWN"),
+                miktar=drug_data.get("miktar", 1),
+                eklenme_zamani=eklenme_zamani
+            )
+            drugs.append(drug)
+
+        # Parse diagnoses
+        diagnoses = []
+        for diag_data in data.get("diagnoses", []) or []:
+            baslangic = parse_ddmmyyyy(diag_data.get("baslangic"))
+            bitis = parse_ddmmyyyy(diag_data.get("bitis"))
+
+            diagnosis = Diagnosis(
+                icd10_code=diag_data.get("icd10_code", "UNKNOWN"),
+                tanim=diag_data.get("tanim", "UNKNOWN"),
+                baslangic=baslangic,
+                bitis=bitis
+            )
+            diagnoses.append(diagnosis)
+
+        # Create minimal patient/doctor info (not extracted from report anymore)
+        patient = PatientInfo(cinsiyet=None, dogum_tarihi=None, yas=None)
+        
+        # Build doctor info with only specialty (extracted)
+        doctor_info = {
+            "name": "UNKNOWN",
+            "specialty": specialty or "UNKNOWN",
+            "diploma": "UNKNOWN"
+        }
+        
+        # Build minimal report info
+        report_info = {
+            "id": "UNKNOWN",
+            "date": "UNKNOWN",
+            "hospital_code": "UNKNOWN"
+        }
+
+        self.logger.info(
+            "✅ Extracted ESSENTIAL fields only: %s drugs, %s diagnoses, specialty=%s, report_type=%s",
+            len(drugs),
+            len(diagnoses),
+            specialty,
+            report_type
+        )
+        
+        return {
+            'report': report_info,
+            'doctor': doctor_info,
+            'drugs': drugs,
+            'diagnoses': diagnoses,
+            'patient': patient,
+            'explanations': explanations,
+            'report_type': report_type
+        }
@@ -1,14 +1,11 @@
 """Patient information extraction from reports using LLM."""
 
 import logging
-import json
-from datetime import datetime
 from typing import Optional
 
 from app.models.report import PatientInfo
-from app.core.llm.openai_client import OpenAIClientWrapper
-
-logger = logging.getLogger(__name__)
+from app.core.llm.openai_client import OpenAIClientWrapper, get_openai_client_wrapper, json_loads
+from .dates import parse_ddmmyyyy
 
 logger = logging.getLogger(__name__)
 
@@ -18,7 +15,7 @@ class PatientInfoExtractor:
 
     def __init__(self, openai_client: OpenAIClientWrapper = None):
         self.logger = logging.getLogger(self.__class__.__name__)
-        self.openai_client = openai_client or OpenAIClientWrapper()
+        self.openai_client = openai_client or get_openai_client_wrapper()
 
     def extract_patient_info(self, text: str) -> PatientInfo:
         """
@@ -51,29 +48,25 @@ JSON formatında döndür:
 
 Eğer bir bilgi bulunamazsa null kullan."""
 
-            user_prompt = f"""Aşağıdaki rapor metninden hasta bilgilerini çıkar:
-
-{text}
+            # Report text last: everything before it is a stable, cacheable prefix
+            user_prompt = f"""Aşağıdaki rapor metninden hasta bilgilerini çıkar.
+Lütfen sadece JSON formatında yanıt ver, başka açıklama ekleme.
 
-Lütfen sadece JSON formatında yanıt ver, başka açıklama ekleme."""
+Rapor Metni:
+{text}"""
 
             response_text = self.openai_client.chat_completion(
                 system_prompt=system_prompt,
                 user_prompt=user_prompt,
-                response_format={"type": "json_object"}
+                response_format={"type": "json_object"},
+                use_cache=False  # Report contents are never written to the response cache
             )
 
             # JSON yanıtı parse et
-            data = json.loads(response_text)
+            data = json_loads(response_text)
             
             # Doğum tarihini parse et
-            dogum_tarihi = None
-            if data.get("dogum_tarihi"):
-                try:
-                    day, month, year = data["dogum_tarihi"].split('/')
-                    dogum_tarihi = datetime(int(year), int(month), int(day)).date()
-                except:
-                    pass
+            dogum_tarihi = parse_ddmmyyyy(data.get("dogum_tarihi"))
 
             patient_info = PatientInfo(
                 cinsiyet=data.get("cinsiyet"),
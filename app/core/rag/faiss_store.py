@@ -2,13 +2,28 @@
 
 import os
 import json
+import math
 import logging
 import pickle
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 import numpy as np
 import faiss
 
-from app.config.settings import FAISS_INDEX_PATH, FAISS_METADATA_PATH, EMBEDDING_DIMENSION
+try:
+    import orjson  # Optional: much faster (de)serialization of the metadata file
+except ImportError:  # pragma: no cover - falls back to stdlib json
+    orjson = None
+
+from app.config.settings import (
+    FAISS_INDEX_PATH,
+    FAISS_METADATA_PATH,
+    EMBEDDING_DIMENSION,
+    FAISS_IVF_MIN_VECTORS,
+    FAISS_NPROBE,
+    FAISS_IVF_PQ_M,
+    FAISS_METRIC,
+    EMBEDDING_DTYPE,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -21,22 +36,102 @@ class FAISSVectorStore:
         self.metadata: List[Dict[str, Any]] = []
         self.id_to_idx: Dict[str, int] = {}
         self.drug_index: Dict[str, List[int]] = {}  # Drug name -> chunk indices for O(1) lookup
+        self._filter_ids: Dict[Tuple, np.ndarray] = {}  # Filter items -> matching FAISS ids
+        self.content_lower: List[str] = []  # Lowercased chunk content, aligned with metadata (not saved)
+        self._mmap_path: Optional[str] = None  # Set while the index is memory-mapped read-only
         self.logger = logging.getLogger(self.__class__.__name__)
 
-    def create_index(self, dimension: int = EMBEDDING_DIMENSION) -> None:
+    def create_index(self, dimension: int = EMBEDDING_DIMENSION, expected_vectors: int = 0) -> None:
         """
         Create a new FAISS index.
 
         Args:
             dimension: Embedding dimension
+            expected_vectors: Number of vectors that will be added (selects index type)
         """
-        # Use IndexFlatL2 for exact search (perfect for small datasets)
-        self.index = faiss.IndexFlatL2(dimension)
+        use_ip = FAISS_METRIC == "ip"
+        metric = faiss.METRIC_INNER_PRODUCT if use_ip else faiss.METRIC_L2
+        # Scalar quantizer for reduced-precision storage (None = full float32 vectors)
+        scalar_type = {
+            "float16": faiss.ScalarQuantizer.QT_fp16,
+            "int8": faiss.ScalarQuantizer.QT_8bit,
+        }.get(EMBEDDING_DTYPE)
+
+        if expected_vectors >= FAISS_IVF_MIN_VECTORS:
+            # Large corpus: IVF only scans nprobe of nlist clusters per query.
+            # Trained via train() or on the first add_embeddings() batch.
+            nlist = int(math.sqrt(expected_vectors))
+            quantizer = faiss.IndexFlatIP(dimension) if use_ip else faiss.IndexFlatL2(dimension)
+            if FAISS_IVF_PQ_M > 0:
+                # m bytes per vector instead of 4*d; scores become approximate
+                self.index = faiss.IndexIVFPQ(quantizer, dimension, nlist, FAISS_IVF_PQ_M, 8, metric)
+            elif scalar_type is not None:
+                self.index = faiss.IndexIVFScalarQuantizer(quantizer, dimension, nlist, scalar_type, metric)
+            else:
+                self.index = faiss.IndexIVFFlat(quantizer, dimension, nlist, metric)
+            self.index.nprobe = FAISS_NPROBE if FAISS_NPROBE > 0 else max(4, nlist // 16)
+            self.logger.info(f"Using IVF index (nlist={nlist}, nprobe={self.index.nprobe})")
+        elif scalar_type is not None:
+            # Exhaustive search over vectors stored as float16 (2 bytes/dim, needs no
+            # training) or int8 (1 byte/dim, trained on the per-dimension value range)
+            self.index = faiss.IndexScalarQuantizer(dimension, scalar_type, metric)
+        elif use_ip:
+            # Exact cosine search: vectors are L2-normalized on add and query
+            self.index = faiss.IndexFlatIP(dimension)
+        else:
+            # Use IndexFlatL2 for exact search (perfect for small datasets)
+            self.index = faiss.IndexFlatL2(dimension)
         self.metadata = []
         self.id_to_idx = {}
         self.drug_index = {}
+        self._filter_ids = {}
+        self.content_lower = []
+        self._mmap_path = None
         self.logger.info(f"Created new FAISS index with dimension {dimension}")
 
+    def set_nprobe(self, nprobe: int) -> None:
+        """
+        Set how many IVF lists a search probes (recall/latency trade-off).
+        No-op for flat indexes, which always search exhaustively.
+        """
+        if self.index is None or not hasattr(faiss.try_extract_index_ivf(self.index), "nprobe"):
+            return
+        faiss.ParameterSpace().set_index_parameter(self.index, "nprobe", nprobe)
+
+    def needs_training(self) -> bool:
+        """Whether the index (IVF, int8) must be trained before vectors can be added."""
+        return self.index is not None and not self.index.is_trained
+
+    def training_sample_size(self, total_vectors: int) -> int:
+        """
+        Number of vectors to train on: FAISS wants at least ~39 points per
+        IVF list; beyond 10% of the corpus the centroids barely improve.
+        A flat int8 index trains only per-dimension min/max, which is cheap
+        and should see every vector so none are clipped.
+        """
+        if not hasattr(self.index, "nlist"):
+            return total_vectors
+        return min(total_vectors, max(self.index.nlist * 39, total_vectors // 10))
+
+    def train(self, vectors: np.ndarray) -> None:
+        """
+        Train the index on a sample drawn from the whole corpus, so IVF
+        centroids are not fitted to whichever batch happens to be added first.
+
+        Args:
+            vectors: (n, d) training vectors (copied; the input is not modified)
+        """
+        if self.index is None:
+            self.create_index()
+        self._ensure_writable()
+
+        sample = np.array(vectors, dtype=np.float32, order="C")
+        if self._uses_inner_product():
+            faiss.normalize_L2(sample)
+
+        self.logger.info(f"Training index on {len(sample)} sampled vectors")
+        self.index.train(sample)
+
     def add_embeddings(self, embeddings_data: List[Dict[str, Any]]) -> None:
         """
         Add embeddings to the index.
@@ -46,10 +141,12 @@ class FAISSVectorStore:
         """
         if self.index is None:
             self.create_index()
+        self._ensure_writable()
 
-        vectors = []
-        for item in embeddings_data:
-            vectors.append(item["values"])
+        # Fill one C-contiguous float32 block directly; FAISS can take it without a copy
+        vectors_array = np.empty((len(embeddings_data), self.index.d), dtype=np.float32)
+        for i, item in enumerate(embeddings_data):
+            vectors_array[i] = item["values"]
             
             # Store metadata
             idx = len(self.metadata)
@@ -59,6 +156,7 @@ class FAISSVectorStore:
             }
             self.metadata.append(meta)
             self.id_to_idx[item["id"]] = idx
+            self.content_lower.append(meta.get("content", "").lower())
             
             # Build drug index for fast lookup
             etkin_maddeler = meta.get("etkin_madde", [])
@@ -70,11 +168,16 @@ class FAISSVectorStore:
                     self.drug_index[drug_lower] = []
                 self.drug_index[drug_lower].append(idx)
 
-        # Convert to numpy array and add to index
-        vectors_array = np.array(vectors, dtype=np.float32)
+        if self._uses_inner_product():
+            faiss.normalize_L2(vectors_array)
+
+        if not self.index.is_trained:
+            self.logger.info(f"Training IVF index on {len(vectors_array)} vectors")
+            self.index.train(vectors_array)
         self.index.add(vectors_array)
+        self._filter_ids = {}
         
-        self.logger.info(f"Added {len(vectors)} vectors to FAISS index")
+        self.logger.info(f"Added {len(vectors_array)} vectors to FAISS index")
         self.logger.info(f"Total vectors in index: {self.index.ntotal}")
 
     def search(
@@ -98,45 +201,140 @@ class FAISSVectorStore:
             self.logger.warning("Index is empty or not initialized")
             return []
 
-        # Convert query to numpy array
-        query_vector = np.array([query_embedding], dtype=np.float32)
+        # Convert query to a (1, d) float32 row (no copy if it already is float32)
+        query_vector = np.asarray(query_embedding, dtype=np.float32).reshape(1, -1)
+        if self._uses_inner_product():
+            query_vector = query_vector.copy()  # normalize_L2 works in place
+            faiss.normalize_L2(query_vector)
 
-        # Search
-        # If filters are provided, search more results and filter afterwards
-        search_k = top_k * 10 if filters else top_k
-        distances, indices = self.index.search(query_vector, min(search_k, self.index.ntotal))
+        distances, indices = self._search_index(query_vector, top_k, filters)
+        results = self._build_results(distances[0], indices[0], top_k)
 
-        results = []
-        for dist, idx in zip(distances[0], indices[0]):
-            if idx == -1:  # FAISS returns -1 for empty results
-                continue
+        self.logger.info(f"Found {len(results)} results for query")
+        return results
 
-            metadata = self.metadata[idx].copy()
-            
-            # Apply filters if provided
-            if filters:
-                match = True
-                for key, value in filters.items():
-                    if key in metadata and metadata[key] != value:
-                        match = False
-                        break
-                if not match:
-                    continue
+    def search_batch(
+        self,
+        query_embeddings: List[List[float]],
+        top_k: int = 5,
+        filters: Optional[Dict[str, Any]] = None
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Search for several queries with a single FAISS call.
+
+        Args:
+            query_embeddings: Query vectors, one per query
+            top_k: Number of results to return per query
+            filters: Optional metadata filters (applied to every query)
+
+        Returns:
+            One result list per query, in input order
+        """
+        if not query_embeddings:
+            return []
+        if self.index is None or self.index.ntotal == 0:
+            self.logger.warning("Index is empty or not initialized")
+            return [[] for _ in query_embeddings]
+
+        # (nq, d) matrix -> one BLAS pass instead of nq row-at-a-time searches
+        query_matrix = np.array(query_embeddings, dtype=np.float32, order="C")
+        if self._uses_inner_product():
+            faiss.normalize_L2(query_matrix)
+
+        distances, indices = self._search_index(query_matrix, top_k, filters)
+
+        results = [
+            self._build_results(row_distances, row_indices, top_k)
+            for row_distances, row_indices in zip(distances, indices)
+        ]
+
+        self.logger.info(f"Batch search for {len(results)} queries")
+        return results
+
+    def _search_index(
+        self,
+        query_matrix: np.ndarray,
+        top_k: int,
+        filters: Optional[Dict[str, Any]]
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        index.search restricted to the ids matching filters (FAISS skips the
+        others), so filtered queries get top_k hits without over-fetching.
+        """
+        if not filters:
+            return self.index.search(query_matrix, min(top_k, self.index.ntotal))
 
+        ids = self._ids_matching(filters)
+        if len(ids) == 0:
+            empty = np.full((len(query_matrix), 0), -1, dtype=np.int64)
+            return empty.astype(np.float32), empty
+
+        selector = faiss.IDSelectorBatch(ids)
+        ivf = faiss.try_extract_index_ivf(self.index)
+        if ivf is not None:
+            params = faiss.SearchParametersIVF(sel=selector, nprobe=ivf.nprobe)
+        else:
+            params = faiss.SearchParameters(sel=selector)
+        return self.index.search(query_matrix, min(top_k, len(ids)), params=params)
+
+    def _ids_matching(self, filters: Dict[str, Any]) -> np.ndarray:
+        """
+        Ids of chunks whose metadata matches every filter (a chunk without
+        the key matches too). Cached per filter set until the store changes;
+        filters with unhashable values (e.g. lists) are scanned uncached.
+        """
+        cache_key = tuple(sorted(filters.items()))
+        try:
+            hash(cache_key)
+        except TypeError:
+            return self._scan_ids(filters)
+        ids = self._filter_ids.get(cache_key)
+        if ids is None:
+            ids = self._filter_ids[cache_key] = self._scan_ids(filters)
+        return ids
+
+    def _scan_ids(self, filters: Dict[str, Any]) -> np.ndarray:
+        return np.fromiter(
+            (
+                idx for idx, meta in enumerate(self.metadata)
+                if all(meta.get(key, value) == value for key, value in filters.items())
+            ),
+            dtype=np.int64
+        )
+
+    def _uses_inner_product(self) -> bool:
+        """Whether the loaded/created index scores by inner product (cosine)."""
+        return self.index is not None and self.index.metric_type == faiss.METRIC_INNER_PRODUCT
+
+    def _build_results(
+        self,
+        distances: np.ndarray,
+        indices: np.ndarray,
+        top_k: int
+    ) -> List[Dict[str, Any]]:
+        """
+        Turn one row of FAISS output into scored result dicts. "metadata" is
+        the stored dict itself (not a copy): callers must not modify it.
+        """
+        # FAISS pads missing hits with -1; mask and score the row as arrays
+        valid = indices != -1
+        indices = indices[valid][:top_k]
+        similarities = distances[valid][:top_k]
+        if not self._uses_inner_product():
             # Convert L2 distance to similarity score (0-1 range)
             # Lower distance = higher similarity
-            similarity = 1 / (1 + dist)
-            
+            similarities = 1 / (1 + similarities)
+        # (Inner product of normalized vectors is already cosine similarity)
+
+        results = []
+        for idx, similarity in zip(indices.tolist(), similarities.tolist()):
+            metadata = self.metadata[idx]
             results.append({
                 "id": metadata["id"],
-                "score": float(similarity),
+                "score": similarity,
                 "metadata": metadata
             })
 
-            if len(results) >= top_k:
-                break
-
-        self.logger.info(f"Found {len(results)} results for query")
         return results
 
     def save(self, index_path: str = FAISS_INDEX_PATH, metadata_path: str = FAISS_METADATA_PATH) -> None:
@@ -163,19 +361,31 @@ class FAISSVectorStore:
             "id_to_idx": self.id_to_idx,
             "drug_index": self.drug_index
         }
-        with open(metadata_path, 'w', encoding='utf-8') as f:
-            json.dump(metadata_dict, f, ensure_ascii=False, indent=2)
+        if orjson is not None:
+            with open(metadata_path, 'wb') as f:
+                f.write(orjson.dumps(metadata_dict, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS))
+        else:
+            with open(metadata_path, 'w', encoding='utf-8') as f:
+                json.dump(metadata_dict, f, ensure_ascii=False, indent=2)
         
         self.logger.info(f"Saved FAISS index to {index_path}")
         self.logger.info(f"Saved metadata to {metadata_path}")
 
-    def load(self, index_path: str = FAISS_INDEX_PATH, metadata_path: str = FAISS_METADATA_PATH) -> None:
+    def load(
+        self,
+        index_path: str = FAISS_INDEX_PATH,
+        metadata_path: str = FAISS_METADATA_PATH,
+        mmap: bool = True
+    ) -> None:
         """
         Load index and metadata from disk.
 
         Args:
             index_path: Path to FAISS index
             metadata_path: Path to metadata JSON
+            mmap: Memory-map the index read-only so pages load on first touch.
+                The first write (add/train/reset) re-reads it into RAM; pass
+                False if vectors will be added right away.
         """
         if not os.path.exists(index_path):
             raise FileNotFoundError(f"Index file not found: {index_path}")
@@ -183,20 +393,42 @@ class FAISSVectorStore:
             raise FileNotFoundError(f"Metadata file not found: {metadata_path}")
 
         # Load FAISS index
-        self.index = faiss.read_index(index_path)
+        self._mmap_path = None
+        if mmap:
+            try:
+                self.index = faiss.read_index(index_path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+                self._mmap_path = index_path
+            except RuntimeError as e:
+                # Not every index type supports mmap; fall back to a full read
+                self.logger.warning(f"Memory-mapped load failed, reading index into RAM: {e}")
+                self.index = faiss.read_index(index_path)
+        else:
+            self.index = faiss.read_index(index_path)
+        if FAISS_NPROBE > 0:
+            self.set_nprobe(FAISS_NPROBE)  # Otherwise keep the nprobe saved with the index
         
         # Load metadata
-        with open(metadata_path, 'r', encoding='utf-8') as f:
-            metadata_dict = json.load(f)
+        metadata_dict = self._load_metadata_file(metadata_path)
         
         self.metadata = metadata_dict["metadata"]
         self.id_to_idx = metadata_dict["id_to_idx"]
         self.drug_index = metadata_dict.get("drug_index", {})
+        self._filter_ids = {}
+        self.content_lower = [meta.get("content", "").lower() for meta in self.metadata]
         
         self.logger.info(f"Loaded FAISS index from {index_path}")
         self.logger.info(f"Index contains {self.index.ntotal} vectors")
         self.logger.info(f"Loaded {len(self.metadata)} metadata entries")
 
+    @staticmethod
+    def _load_metadata_file(metadata_path: str) -> Dict[str, Any]:
+        """Parse the metadata JSON (with orjson when available)."""
+        if orjson is not None:
+            with open(metadata_path, 'rb') as f:
+                return orjson.loads(f.read())
+        with open(metadata_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
     def get_stats(self) -> Dict[str, Any]:
         """Get index statistics."""
         if self.index is None:
@@ -206,9 +438,21 @@ class FAISSVectorStore:
             "total_vectors": self.index.ntotal,
             "dimension": self.index.d,
             "metadata_count": len(self.metadata),
-            "index_type": type(self.index).__name__
+            "index_type": type(self.index).__name__,
+            "metric": "ip" if self._uses_inner_product() else "l2"
         }
 
+    def warmup(self) -> None:
+        """
+        Run a throwaway search so the first real query doesn't pay cold-start cost
+        (page faults on the vector block, FAISS runtime structure setup).
+        """
+        if self.index is None or self.index.ntotal == 0:
+            return
+
+        self.index.search(np.zeros((1, self.index.d), dtype=np.float32), 1)
+        self.logger.debug("FAISS index warmed up")
+
     def get_chunks_by_drug(self, drug_name: str) -> List[int]:
         """
         Get chunk indices containing a specific drug (O(1) lookup).
@@ -222,7 +466,48 @@ class FAISSVectorStore:
         drug_lower = drug_name.lower()
         return self.drug_index.get(drug_lower, [])
     
+    def _ensure_writable(self) -> None:
+        """
+        Re-read a memory-mapped index into RAM before modifying it: IVF lists
+        mapped read-only (OnDiskInvertedLists) reject adds and resets.
+        """
+        if self._mmap_path is None:
+            return
+        self.logger.info("Index is memory-mapped read-only; reading it into RAM before writing")
+        self.index = faiss.read_index(self._mmap_path)
+        self._mmap_path = None
+        if FAISS_NPROBE > 0:
+            self.set_nprobe(FAISS_NPROBE)
+
+    def get_content_lower(self, chunk_id: str) -> Optional[str]:
+        """
+        Lowercased content of a chunk, computed once when it was added or
+        loaded (Turkish text lowercases through the slow Unicode path).
+
+        Returns:
+            The lowercased content, or None for an unknown chunk id
+        """
+        idx = self.id_to_idx.get(chunk_id)
+        return self.content_lower[idx] if idx is not None else None
+
+    def reset(self) -> None:
+        """
+        Empty the index in place, keeping its type, dimension and (for IVF)
+        trained centroids, so it can be refilled without reallocating.
+        """
+        if self.index is None:
+            self.create_index()
+            return
+
+        self._ensure_writable()
+        self.index.reset()
+        self.metadata = []
+        self.id_to_idx = {}
+        self.drug_index = {}
+        self._filter_ids = {}
+        self.content_lower = []
+
     def delete_all(self) -> None:
         """Clear the index and metadata."""
-        self.create_index()
+        self.reset()
         self.logger.info("Cleared FAISS index and metadata")
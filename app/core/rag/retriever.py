@@ -2,8 +2,11 @@
 
 import time
 import logging
+import threading
 import hashlib
+import heapq
 import pickle
+from collections import OrderedDict
 from pathlib import Path
 from typing import List, Dict, Any, Optional, Tuple
 
@@ -20,27 +23,54 @@ logger = logging.getLogger(__name__)
 
 
 class EmbeddingCache:
-    """Cache for query embeddings to avoid recomputation."""
+    """
+    Cache for query embeddings to avoid recomputation.
 
-    def __init__(self, cache_dir: str = "data/embedding_cache"):
+    Recent entries are kept in an in-memory LRU in front of the on-disk
+    pickle files. Keys include EMBEDDING_MODEL, so switching models never
+    returns a vector from the old one.
+    """
+
+    def __init__(self, cache_dir: str = "data/embedding_cache", max_memory_entries: int = 1024):
         self.cache_dir = Path(cache_dir)
         self.cache_dir.mkdir(exist_ok=True)
+        self.max_memory_entries = max_memory_entries
+        self._memory: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()  # Retrievals may run on several threads
 
     def get_cache_key(self, text: str) -> str:
-        return hashlib.md5(text.encode()).hexdigest()
+        return hashlib.sha256(f"{EMBEDDING_MODEL}\0{text}".encode("utf-8")).hexdigest()
+
+    def _remember(self, key: str, embedding: List[float]) -> None:
+        with self._lock:
+            self._memory[key] = embedding
+            self._memory.move_to_end(key)
+            if len(self._memory) > self.max_memory_entries:
+                self._memory.popitem(last=False)
 
     def get(self, text: str) -> Optional[List[float]]:
-        cache_file = self.cache_dir / f"{self.get_cache_key(text)}.pkl"
+        key = self.get_cache_key(text)
+        with self._lock:
+            embedding = self._memory.get(key)
+            if embedding is not None:
+                self._memory.move_to_end(key)
+                return embedding
+
+        cache_file = self.cache_dir / f"{key}.pkl"
         if cache_file.exists():
             try:
                 with open(cache_file, 'rb') as f:
-                    return pickle.load(f)
+                    embedding = pickle.load(f)
             except Exception:
                 return None
+            self._remember(key, embedding)
+            return embedding
         return None
 
     def set(self, text: str, embedding: List[float]):
-        cache_file = self.cache_dir / f"{self.get_cache_key(text)}.pkl"
+        key = self.get_cache_key(text)
+        self._remember(key, embedding)
+        cache_file = self.cache_dir / f"{key}.pkl"
         try:
             with open(cache_file, 'wb') as f:
                 pickle.dump(embedding, f)
@@ -111,7 +141,7 @@ class RAGRetriever:
                 self.logger.debug(f"  - Found in report: {[r.full_text for r in report_refs]}")
         
         # Remove duplicates
-        ek4_refs = list(set(ek4_refs))
+        ek4_refs = list(dict.fromkeys(ek4_refs))
         timings['ek4_detection'] = (time.time() - ek4_detect_start) * 1000
         
         if ek4_refs:
@@ -256,23 +286,12 @@ class RAGRetriever:
         Returns:
             List of matching chunks with scores
         """
-        # Search with larger k and filter by doc_type
-        all_results = self.vector_store.search(
+        # The store restricts the FAISS search to this doc_type's chunks
+        return self.vector_store.search(
             query_embedding=query_embedding,
-            top_k=top_k * 5,  # Over-fetch to account for filtering
-            filters=None
+            top_k=top_k,
+            filters={"doc_type": doc_type}
         )
-        
-        # Filter by doc_type
-        filtered_results = []
-        for result in all_results:
-            metadata = result.get("metadata", {})
-            if metadata.get("doc_type") == doc_type:
-                filtered_results.append(result)
-                if len(filtered_results) >= top_k:
-                    break
-        
-        return filtered_results
     
     def _keyword_search(self, drug_name: str) -> List[Dict[str, Any]]:
         """
@@ -288,7 +307,7 @@ class RAGRetriever:
         results = []
         
         for idx in indices:
-            metadata = self.vector_store.metadata[idx].copy()
+            metadata = self.vector_store.metadata[idx]  # Shared with the store, read-only
             results.append({
                 "id": metadata["id"],
                 "score": 1.0,  # Perfect match score
@@ -347,7 +366,10 @@ class RAGRetriever:
                 )
             else:
                 # Check for partial match in content
-                content = result.get("metadata", {}).get("content", "").lower()
+                metadata = result["metadata"]
+                content = self.vector_store.get_content_lower(chunk_id)
+                if content is None:
+                    content = metadata.get("content", "").lower()
                 has_match = drug_lower in content
                 
                 if has_match:
@@ -361,21 +383,15 @@ class RAGRetriever:
                 
                 score_map[chunk_id] = {
                     "score": result["score"] * boost,
-                    "metadata": result["metadata"],
+                    "metadata": metadata,
                     "has_keyword": has_match,
                     "match_type": match_type
                 }
         
-        # Sort by score and return top_k
-        ranked = sorted(
-            [
-                {"id": k, **v} for k, v in score_map.items()
-            ],
-            key=lambda x: x["score"],
-            reverse=True
-        )
-        
-        return ranked[:top_k]
+        # Top_k by score (ties keep insertion order, as sorted() would);
+        # only the returned entries are materialized
+        top = heapq.nlargest(top_k, score_map.items(), key=lambda item: item[1]["score"])
+        return [{"id": chunk_id, **entry} for chunk_id, entry in top]
 
     def retrieve_for_multiple_drugs(
         self,
@@ -399,7 +415,8 @@ class RAGRetriever:
             ({drug_name: [chunks]} dictionary, aggregate timings)
         """
         results: Dict[str, List[Dict[str, Any]]] = {}
-        all_timings: List[Dict[str, float]] = []
+        # Per-stage totals across drugs, accumulated in the loop below
+        keyword_total = vector_total = rerank_total = 0.0
 
         if not drugs:
             return results, {}
@@ -428,7 +445,7 @@ class RAGRetriever:
             if report_refs:
                 self.logger.debug(f"  - Found in report: {[r.full_text for r in report_refs]}")
         
-        ek4_refs = list(set(ek4_refs))
+        ek4_refs = list(dict.fromkeys(ek4_refs))
         ek4_detect_time = (time.time() - ek4_detect_start) * 1000
         
         if ek4_refs:
@@ -466,18 +483,9 @@ class RAGRetriever:
 
             # Create embeddings for uncached queries
             if uncached_queries:
-                # Use batch embedding creation (if supported) or sequential
+                # One embeddings request for all uncached queries
                 self.logger.info(f"Creating batch embeddings for {len(uncached_queries)} uncached queries")
-                
-                try:
-                    # Try batch creation (OpenAI supports, OpenRouter might not)
-                    new_embeddings = []
-                    for query in uncached_queries:
-                        embedding = self.embedding_generator.create_query_embedding(query)
-                        new_embeddings.append(embedding)
-                except Exception as e:
-                    self.logger.error(f"Batch embedding creation failed: {e}")
-                    raise
+                new_embeddings = self.embedding_generator.create_query_embeddings_batch(uncached_queries)
 
                 # Cache new embeddings
                 for query, embedding in zip(uncached_queries, new_embeddings):
@@ -500,50 +508,43 @@ class RAGRetriever:
 
         embedding_time = (time.time() - embedding_start) * 1000
 
-        # 3) For each embedding, perform vector search + keyword + rerank
+        # 3) Vector search for all drugs in one FAISS call
         search_start = time.time()
-        for idx, (meta, emb) in enumerate(zip(query_metadata, embeddings)):
+        batch_start = time.time()
+        if ek4_refs:
+            # Multi-document strategy: top hits from SUT and from each detected
+            # EK-4 document, one doc_type-filtered batch search per document
+            doc_types = ["SUT"] + [f"EK-4/{ek4_ref.variant}" for ek4_ref in ek4_refs]
+            per_doc_results = [
+                self.vector_store.search_batch(
+                    query_embeddings=embeddings,
+                    top_k=top_k_per_drug * 2,
+                    filters={"doc_type": doc_type}
+                )
+                for doc_type in doc_types
+            ]
+            batch_results = [
+                [result for doc_results in per_doc_results for result in doc_results[i]]
+                for i in range(len(drugs))
+            ]
+        else:
+            batch_results = self.vector_store.search_batch(
+                query_embeddings=embeddings,
+                top_k=top_k_per_drug * 2,
+                filters={"drug_related": True} if self._has_metadata_filter() else None
+            )
+        batch_search_time = (time.time() - batch_start) * 1000
+
+        # 4) For each drug, keyword + rerank
+        for idx, (meta, semantic_results) in enumerate(zip(query_metadata, batch_results)):
             drug: Drug = meta["drug"]
-            drug_start = time.time()
 
             # Keyword search (fast)
             k_start = time.time()
             keyword_results = self._keyword_search(drug.etkin_madde)
             k_time = (time.time() - k_start) * 1000
 
-            # Vector search with multi-document strategy
-            v_start = time.time()
-            if ek4_refs:
-                # Multi-document search
-                all_results = []
-                
-                # Get from SUT
-                sut_results = self._search_by_doc_type(
-                    query_embedding=emb,
-                    doc_type="SUT",
-                    top_k=top_k_per_drug * 2
-                )
-                all_results.extend(sut_results)
-                
-                # Get from each EK-4 document
-                for ek4_ref in ek4_refs:
-                    doc_type = f"EK-4/{ek4_ref.variant}"
-                    ek4_results = self._search_by_doc_type(
-                        query_embedding=emb,
-                        doc_type=doc_type,
-                        top_k=top_k_per_drug * 2
-                    )
-                    all_results.extend(ek4_results)
-                
-                semantic_results = all_results
-            else:
-                # Single-document search
-                semantic_results = self.vector_store.search(
-                    query_embedding=emb,
-                    top_k=top_k_per_drug * 2,
-                    filters={"drug_related": True} if self._has_metadata_filter() else None
-                )
-            v_time = (time.time() - v_start) * 1000
+            v_time = batch_search_time / len(drugs)  # Amortized
 
             # Re-rank
             r_start = time.time()
@@ -557,15 +558,9 @@ class RAGRetriever:
 
             results[drug.etkin_madde] = final_results
 
-            drug_total = (time.time() - drug_start) * 1000
-            all_timings.append({
-                'ek4_detection': ek4_detect_time / len(drugs) if drugs else 0,  # Amortized
-                'keyword_search': k_time,
-                'embedding_creation': 0.0,  # accounted for in batch
-                'vector_search': v_time,
-                'reranking': r_time,
-                'total': drug_total
-            })
+            keyword_total += k_time
+            vector_total += v_time
+            rerank_total += r_time
 
         search_time = (time.time() - search_start) * 1000
         total_time = (time.time() - total_start) * 1000
@@ -575,9 +570,9 @@ class RAGRetriever:
             'ek4_detection': ek4_detect_time,
             'query_building': query_build_time,
             'embedding_creation': embedding_time,
-            'keyword_search': sum(t['keyword_search'] for t in all_timings),
-            'vector_search': sum(t['vector_search'] for t in all_timings),
-            'reranking': sum(t['reranking'] for t in all_timings),
+            'keyword_search': keyword_total,
+            'vector_search': vector_total,
+            'reranking': rerank_total,
             'total': total_time,
             'avg_per_drug': total_time / len(drugs) if drugs else 0,
             'ek4_refs_found': len(ek4_refs)
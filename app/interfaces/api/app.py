@@ -1,6 +1,7 @@
 """FastAPI web service for Pharmacy SUT Checker."""
 
 import sys
+import asyncio
 import logging
 from pathlib import Path
 from typing import Dict, Any
@@ -10,6 +11,7 @@ project_root = Path(__file__).parent.parent.parent.parent
 sys.path.insert(0, str(project_root))
 
 from fastapi import FastAPI, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import HTMLResponse
 from fastapi.staticfiles import StaticFiles
@@ -21,11 +23,12 @@ from app.config.settings import (
     FAISS_INDEX_PATH,
     FAISS_METADATA_PATH,
     TOP_K_CHUNKS,
+    MAX_CONCURRENT_ANALYSES,
 )
 from app.core.parsers.input_parser import InputParser
 from app.core.rag.faiss_store import FAISSVectorStore
 from app.core.rag.retriever import RAGRetriever
-from app.core.llm.openai_client import OpenAIClientWrapper
+from app.core.llm.openai_client import get_openai_client_wrapper
 from app.core.llm.eligibility_checker import EligibilityChecker
 
 # Setup logging
@@ -104,12 +107,13 @@ class PharmacyAPI:
         try:
             # OpenAI client
             self.openai_client = OpenAI(api_key=OPENAI_API_KEY)
-            self.openai_client_wrapper = OpenAIClientWrapper()
+            self.openai_client_wrapper = get_openai_client_wrapper()
             logger.info("OpenAI client initialized")
 
             # FAISS vector store
             self.vector_store = FAISSVectorStore()
             self.vector_store.load(FAISS_INDEX_PATH, FAISS_METADATA_PATH)
+            self.vector_store.warmup()
             stats = self.vector_store.get_stats()
             logger.info(f"FAISS index loaded ({stats['total_vectors']} vectors)")
 
@@ -197,6 +201,10 @@ class PharmacyAPI:
 # Global API instance
 api_handler = PharmacyAPI()
 
+# The pipeline is blocking (sync OpenAI client, thread pools), so it runs in
+# the thread pool; the semaphore caps how many analyses hold a thread at once
+analysis_semaphore = asyncio.Semaphore(max(1, MAX_CONCURRENT_ANALYSES))
+
 
 @app.on_event("startup")
 async def startup_event():
@@ -244,7 +252,8 @@ async def analyze_report(request: ReportRequest):
         raise HTTPException(status_code=400, detail="Report text is required")
 
     try:
-        result = api_handler.process_report(request.report_text)
+        async with analysis_semaphore:
+            result = await run_in_threadpool(api_handler.process_report, request.report_text)
         return result
     except Exception as e:
         logger.exception("Error processing report")
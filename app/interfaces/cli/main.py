@@ -28,7 +28,7 @@ from app.config.settings import (
 from app.core.parsers.input_parser import InputParser
 from app.core.rag.faiss_store import FAISSVectorStore
 from app.core.rag.retriever import RAGRetriever
-from app.core.llm.openai_client import OpenAIClientWrapper
+from app.core.llm.openai_client import get_openai_client_wrapper
 from app.core.llm.eligibility_checker import EligibilityChecker
 from app.models.eligibility import EligibilityResult
 
@@ -59,12 +59,13 @@ class PharmacyCLI:
         try:
             # OpenAI client
             self.openai_client = OpenAI(api_key=OPENAI_API_KEY)
-            self.openai_client_wrapper = OpenAIClientWrapper()
+            self.openai_client_wrapper = get_openai_client_wrapper()
             self.console.print("✓ OpenAI bağlantısı kuruldu")
 
             # FAISS vector store
             self.vector_store = FAISSVectorStore()
             self.vector_store.load(FAISS_INDEX_PATH, FAISS_METADATA_PATH)
+            self.vector_store.warmup()
             stats = self.vector_store.get_stats()
             self.console.print(f"✓ FAISS index yüklendi ({stats['total_vectors']} vektör)")
 
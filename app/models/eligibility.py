@@ -24,7 +24,7 @@ class EligibilityResult:
     warnings: List[str]
 
 
-@dataclass
+@dataclass(slots=True)
 class ChunkMetadata:
     """SUT chunk metadata model."""
     section: str              # "4.2.28" (madde numarası)
@@ -37,7 +37,7 @@ class ChunkMetadata:
     doc_source: str = ""      # Source filename for traceability
 
 
-@dataclass
+@dataclass(slots=True)
 class Chunk:
     """SUT doküman chunk model."""
     chunk_id: str
@@ -5,7 +5,7 @@ from datetime import date
 from typing import List, Optional
 
 
-@dataclass
+@dataclass(slots=True)
 class Drug:
     """İlaç bilgilerini temsil eden model."""
     kod: str                    # SGKF07
@@ -16,7 +16,7 @@ class Drug:
     eklenme_zamani: date      # 26/12/2024
 
 
-@dataclass
+@dataclass(slots=True)
 class Diagnosis:
     """Tanı bilgilerini temsil eden model."""
     icd10_code: str           # I25.1
@@ -25,7 +25,7 @@ class Diagnosis:
     bitis: Optional[date] = None
 
 
-@dataclass
+@dataclass(slots=True)
 class PatientInfo:
     """Hasta bilgilerini temsil eden model."""
     cinsiyet: Optional[str] = None
@@ -34,7 +34,7 @@ class PatientInfo:
     # Privacy: TC kimlik saklanmayacak
 
 
-@dataclass
+@dataclass(slots=True)
 class DoctorInfo:
     """Doktor bilgilerini temsil eden model."""
     name: str
@@ -42,7 +42,7 @@ class DoctorInfo:
     diploma: str
 
 
-@dataclass
+@dataclass(slots=True)
 class ParsedReport:
     """Parse edilmiş rapor model."""
     report_id: str
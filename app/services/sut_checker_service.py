@@ -10,7 +10,7 @@ from openai import OpenAI
 from app.core.parsers.input_parser import InputParser
 from app.core.rag.faiss_store import FAISSVectorStore
 from app.core.rag.retriever import RAGRetriever
-from app.core.llm.openai_client import OpenAIClientWrapper
+from app.core.llm.openai_client import get_openai_client_wrapper
 from app.core.llm.eligibility_checker import EligibilityChecker
 from app.models.report import ParsedReport
 from app.models.eligibility import EligibilityResult
@@ -49,12 +49,13 @@ class SUTCheckerService:
         try:
             # Initialize OpenAI client
             self.openai_client = OpenAI(api_key=OPENAI_API_KEY)
-            openai_wrapper = OpenAIClientWrapper()
+            openai_wrapper = get_openai_client_wrapper()
             logger.info("✓ OpenAI client initialized")
 
             # Load FAISS index
             self.vector_store = FAISSVectorStore()
             self.vector_store.load(FAISS_INDEX_PATH, FAISS_METADATA_PATH)
+            self.vector_store.warmup()
             stats = self.vector_store.get_stats()
             logger.info(f"✓ FAISS index loaded ({stats['total_vectors']} vectors)")
 
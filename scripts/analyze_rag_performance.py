@@ -3,15 +3,17 @@
 import json
 import numpy as np
 from pathlib import Path
-from collections import defaultdict
+from collections import Counter
+from typing import Any, Dict, List, Optional
 
-def analyze_metadata_coverage():
-    """Analyze metadata field coverage."""
-    metadata_path = Path("data/faiss_metadata.json")
-    
+METADATA_PATH = Path("data/faiss_metadata.json")
+
+
+def load_metadata(metadata_path: Path = METADATA_PATH) -> Optional[List[Dict[str, Any]]]:
+    """Load chunk metadata once for all analyzers."""
     if not metadata_path.exists():
         print("❌ FAISS metadata not found. Please run: python scripts/setup_faiss.py")
-        return
+        return None
     
     with open(metadata_path) as f:
         data = json.load(f)
@@ -21,18 +23,20 @@ def analyze_metadata_coverage():
     
     if not metadata:
         print("❌ No metadata entries found")
-        return
+        return None
     
-    print("📊 Metadata Coverage:")
-    field_coverage = defaultdict(int)
-    for chunk in metadata:
-        for field in chunk.keys():
-            field_coverage[field] += 1
+    return metadata
+
+def analyze_metadata_coverage(metadata: List[Dict[str, Any]]) -> str:
+    """Analyze metadata field coverage."""
+    lines = []
+    lines.append("📊 Metadata Coverage:")
+    field_coverage = Counter(field for chunk in metadata for field in chunk.keys())
     
     for field, count in sorted(field_coverage.items()):
         pct = count / len(metadata) * 100
         status = "✅" if pct == 100 else "⚠️"
-        print(f"  {status} {field}: {count}/{len(metadata)} ({pct:.1f}%)")
+        lines.append(f"  {status} {field}: {count}/{len(metadata)} ({pct:.1f}%)")
     
     # Check for critical missing fields
     sample = metadata[0]
@@ -40,156 +44,129 @@ def analyze_metadata_coverage():
     missing_fields = [f for f in required_fields if f not in sample]
     
     if missing_fields:
-        print(f"\n❌ CRITICAL: Missing required fields: {missing_fields}")
-        print(f"   Action: Run 'python scripts/setup_faiss.py' to rebuild index")
+        lines.append(f"\n❌ CRITICAL: Missing required fields: {missing_fields}")
+        lines.append(f"   Action: Run 'python scripts/setup_faiss.py' to rebuild index")
     else:
-        print(f"\n✅ All required metadata fields present")
+        lines.append(f"\n✅ All required metadata fields present")
+    
+    return "\n".join(lines)
 
-def analyze_chunk_distribution():
+def analyze_chunk_distribution(metadata: List[Dict[str, Any]]) -> str:
     """Analyze chunk size distribution."""
-    metadata_path = Path("data/faiss_metadata.json")
+    lines = []
+    sizes = np.fromiter((len(c.get("content", "")) for c in metadata), dtype=np.int64, count=len(metadata))
     
-    if not metadata_path.exists():
-        return
-    
-    with open(metadata_path) as f:
-        data = json.load(f)
+    # One sort-based pass for all order statistics
+    q1, q2, q3, p95 = np.percentile(sizes, [25, 50, 75, 95])
     
-    metadata = data.get("metadata", data) if isinstance(data, dict) else data
-    
-    if not metadata:
-        return
-    
-    sizes = [len(c.get("content", "")) for c in metadata]
-    
-    print("\n📊 Chunk Size Distribution:")
-    print(f"  Mean: {np.mean(sizes):.0f} chars")
-    print(f"  Median: {np.median(sizes):.0f} chars")
-    print(f"  Std Dev: {np.std(sizes):.0f} chars")
-    print(f"  Min: {min(sizes)} chars")
-    print(f"  Max: {max(sizes)} chars")
-    print(f"  Target: 2048 chars (from settings)")
+    lines.append("\n📊 Chunk Size Distribution:")
+    lines.append(f"  Mean: {sizes.mean():.0f} chars")
+    lines.append(f"  Median: {q2:.0f} chars")
+    lines.append(f"  Std Dev: {sizes.std():.0f} chars")
+    lines.append(f"  Min: {sizes.min()} chars")
+    lines.append(f"  Max: {sizes.max()} chars")
+    lines.append(f"  P95: {p95:.0f} chars")
+    lines.append(f"  Target: 2048 chars (from settings)")
     
     # Analyze distribution
-    in_range = sum(1 for s in sizes if 1024 <= s <= 3072)
+    in_range = int(np.count_nonzero((sizes >= 1024) & (sizes <= 3072)))
     pct_in_range = in_range / len(sizes) * 100
     
-    print(f"\n  Chunks in target range (1024-3072): {in_range}/{len(sizes)} ({pct_in_range:.1f}%)")
+    lines.append(f"\n  Chunks in target range (1024-3072): {in_range}/{len(sizes)} ({pct_in_range:.1f}%)")
     
     # Quartiles
-    q1 = np.percentile(sizes, 25)
-    q2 = np.percentile(sizes, 50)
-    q3 = np.percentile(sizes, 75)
-    
-    print(f"\n  Quartiles:")
-    print(f"    Q1 (25%): {q1:.0f} chars")
-    print(f"    Q2 (50%): {q2:.0f} chars")
-    print(f"    Q3 (75%): {q3:.0f} chars")
+    lines.append(f"\n  Quartiles:")
+    lines.append(f"    Q1 (25%): {q1:.0f} chars")
+    lines.append(f"    Q2 (50%): {q2:.0f} chars")
+    lines.append(f"    Q3 (75%): {q3:.0f} chars")
+    
+    return "\n".join(lines)
 
-def analyze_doc_type_distribution():
+def analyze_doc_type_distribution(metadata: List[Dict[str, Any]]) -> str:
     """Analyze document type distribution."""
-    metadata_path = Path("data/faiss_metadata.json")
-    
-    if not metadata_path.exists():
-        return
-    
-    with open(metadata_path) as f:
-        data = json.load(f)
-    
-    metadata = data.get("metadata", data) if isinstance(data, dict) else data
-    
-    if not metadata:
-        return
-    
-    doc_type_counts = defaultdict(int)
-    for chunk in metadata:
-        doc_type = chunk.get("doc_type", "MISSING")
-        doc_type_counts[doc_type] += 1
+    lines = []
+    doc_type_counts = Counter(chunk.get("doc_type", "MISSING") for chunk in metadata)
     
-    print("\n📊 Document Type Distribution:")
+    lines.append("\n📊 Document Type Distribution:")
     total = len(metadata)
     
     if "MISSING" in doc_type_counts:
-        print(f"  ❌ MISSING doc_type: {doc_type_counts['MISSING']} chunks")
-        print(f"     Action: Run 'python scripts/setup_faiss.py' to rebuild index")
+        lines.append(f"  ❌ MISSING doc_type: {doc_type_counts['MISSING']} chunks")
+        lines.append(f"     Action: Run 'python scripts/setup_faiss.py' to rebuild index")
     
     for doc_type, count in sorted(doc_type_counts.items()):
         pct = count / total * 100
         status = "✅" if doc_type != "MISSING" else "❌"
-        print(f"  {status} {doc_type}: {count} chunks ({pct:.1f}%)")
+        lines.append(f"  {status} {doc_type}: {count} chunks ({pct:.1f}%)")
+    
+    return "\n".join(lines)
 
-def analyze_keyword_coverage():
+def analyze_keyword_coverage(metadata: List[Dict[str, Any]]) -> str:
     """Analyze drug keyword coverage."""
-    metadata_path = Path("data/faiss_metadata.json")
-    
-    if not metadata_path.exists():
-        return
-    
-    with open(metadata_path) as f:
-        data = json.load(f)
-    
-    metadata = data.get("metadata", data) if isinstance(data, dict) else data
-    
-    if not metadata:
-        return
-    
-    drug_related = sum(1 for c in metadata if c.get("drug_related", False))
-    has_etkin_madde = sum(1 for c in metadata if c.get("etkin_madde", []))
-    has_keywords = sum(1 for c in metadata if c.get("keywords", []))
-    
-    print("\n📊 Keyword Coverage:")
-    print(f"  Drug-related chunks: {drug_related}/{len(metadata)} ({drug_related/len(metadata)*100:.1f}%)")
-    print(f"  Chunks with etkin_madde: {has_etkin_madde}/{len(metadata)} ({has_etkin_madde/len(metadata)*100:.1f}%)")
-    print(f"  Chunks with keywords: {has_keywords}/{len(metadata)} ({has_keywords/len(metadata)*100:.1f}%)")
+    lines = []
+    # Single pass: boolean flags and the drug -> chunk count index together
+    drug_related = has_etkin_madde = has_keywords = 0
+    drug_counts = Counter()
+    for c in metadata:
+        drugs = c.get("etkin_madde", [])
+        drug_related += bool(c.get("drug_related", False))
+        has_etkin_madde += bool(drugs)
+        has_keywords += bool(c.get("keywords", []))
+        drug_counts.update(drugs)
+    
+    lines.append("\n📊 Keyword Coverage:")
+    lines.append(f"  Drug-related chunks: {drug_related}/{len(metadata)} ({drug_related/len(metadata)*100:.1f}%)")
+    lines.append(f"  Chunks with etkin_madde: {has_etkin_madde}/{len(metadata)} ({has_etkin_madde/len(metadata)*100:.1f}%)")
+    lines.append(f"  Chunks with keywords: {has_keywords}/{len(metadata)} ({has_keywords/len(metadata)*100:.1f}%)")
     
     # Sample top drugs
-    drug_counts = defaultdict(int)
-    for chunk in metadata:
-        for drug in chunk.get("etkin_madde", []):
-            drug_counts[drug] += 1
-    
     if drug_counts:
-        print(f"\n  Top 10 Indexed Drugs:")
-        for drug, count in sorted(drug_counts.items(), key=lambda x: x[1], reverse=True)[:10]:
-            print(f"    {drug}: {count} chunks")
+        lines.append(f"\n  Top 10 Indexed Drugs:")
+        for drug, count in drug_counts.most_common(10):
+            lines.append(f"    {drug}: {count} chunks")
+    
+    return "\n".join(lines)
 
-def analyze_section_coverage():
+def _major_section(section: str) -> str:
+    """Get major section (e.g., "4.2" from "4.2.28")."""
+    return ".".join(section.split(".")[:2]) if "." in section else section
+
+def analyze_section_coverage(metadata: List[Dict[str, Any]]) -> str:
     """Analyze section distribution."""
-    metadata_path = Path("data/faiss_metadata.json")
-    
-    if not metadata_path.exists():
-        return
-    
-    with open(metadata_path) as f:
-        data = json.load(f)
-    
-    metadata = data.get("metadata", data) if isinstance(data, dict) else data
-    
-    if not metadata:
-        return
-    
-    section_counts = defaultdict(int)
-    for chunk in metadata:
-        section = chunk.get("section", "NO_SECTION")
-        if section:
-            # Get major section (e.g., "4.2" from "4.2.28")
-            major_section = ".".join(section.split(".")[:2]) if "." in section else section
-            section_counts[major_section] += 1
-    
-    print("\n📊 Section Coverage (Top 10):")
-    for section, count in sorted(section_counts.items(), key=lambda x: x[1], reverse=True)[:10]:
-        print(f"  {section}: {count} chunks")
+    lines = []
+    section_counts = Counter(
+        _major_section(section)
+        for section in (chunk.get("section", "NO_SECTION") for chunk in metadata)
+        if section
+    )
+    
+    lines.append("\n📊 Section Coverage (Top 10):")
+    for section, count in section_counts.most_common(10):
+        lines.append(f"  {section}: {count} chunks")
+    
+    return "\n".join(lines)
+
+ANALYZERS = (
+    analyze_metadata_coverage,
+    analyze_chunk_distribution,
+    analyze_doc_type_distribution,
+    analyze_keyword_coverage,
+    analyze_section_coverage,
+)
 
 def main():
     """Run all analyses."""
     print("🔍 RAG System Performance Analysis")
     print("=" * 60)
     
-    analyze_metadata_coverage()
-    analyze_chunk_distribution()
-    analyze_doc_type_distribution()
-    analyze_keyword_coverage()
-    analyze_section_coverage()
+    metadata = load_metadata()
+    if metadata is None:
+        return
+    
+    # Each analyzer is a cheap pass over the already-loaded metadata; process
+    # pools cost more in pickling the metadata than the analyses themselves
+    for analyzer in ANALYZERS:
+        print(analyzer(metadata))
     
     print("\n" + "=" * 60)
     print("✅ Analysis complete!")
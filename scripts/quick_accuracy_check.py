@@ -4,21 +4,26 @@ Run this after rebuilding the FAISS index to verify basic retrieval works.
 """
 
 import sys
+from datetime import date
 from pathlib import Path
 
 # Add project root to path
 project_root = Path(__file__).parent.parent
 sys.path.insert(0, str(project_root))
 
-from app.core.rag.faiss_store import FAISSVectorStore
-from app.core.rag.retriever import RAGRetriever
-from app.models.report import Drug, Diagnosis
+# p95 retrieval latency target (ms) for the performance summary
+RETRIEVAL_P95_SLO_MS = 500
 
 def test_known_good_cases():
     """Test known-good retrieval cases."""
     print("🧪 Quick Accuracy Check")
     print("=" * 60)
     
+    # Heavy imports (faiss, numpy, openai) deferred until the check actually runs
+    from app.core.rag.faiss_store import FAISSVectorStore
+    from app.core.rag.retriever import RAGRetriever
+    from app.models.report import Drug, Diagnosis
+    
     # Initialize retriever
     print("\n📥 Loading FAISS index...")
     try:
@@ -138,48 +143,66 @@ def test_known_good_cases():
         }
     ]
     
+    # Lowercase expected terms once, not per chunk/test check
+    for test in test_cases:
+        test["_terms_lower"] = [term.lower() for term in test["expected_terms"]]
+    
     passed = 0
     failed = 0
+    total_times = []
+    embedding_times = []
+    vector_times = []
     
-    for test in test_cases:
-        print(f"\n{'─' * 60}")
-        print(f"🧪 Test: {test['name']}")
-        print(f"   Drug: {test['drug']}")
-        print(f"   Diagnosis: {test['diagnosis'][:50]}...")
-        
-        try:
-            from datetime import date
-            
+    # Build report objects for every case up front
+    today = date.today()
+    cases = [
+        (
             # Create Drug object with all required fields
-            drug = Drug(
+            Drug(
                 kod="TEST",
                 etkin_madde=test["drug"],
                 form="Ağızdan tablet",
                 tedavi_sema="Günde 1 x 1.0",
                 miktar=1,
-                eklenme_zamani=date.today()
-            )
-            
-            diagnosis = Diagnosis(tanim=test["diagnosis"], icd10_code="TEST")
-            
+                eklenme_zamani=today
+            ),
+            Diagnosis(tanim=test["diagnosis"], icd10_code="TEST"),
+            test,
+        )
+        for test in test_cases
+    ]
+    
+    # Retrievals run one at a time so the latency figures below are per-request
+    # numbers, not inflated by concurrent embedding calls competing for the API
+    for drug, diagnosis, test in cases:
+        print(f"\n{'─' * 60}")
+        print(f"🧪 Test: {test['name']}")
+        print(f"   Drug: {test['drug']}")
+        print(f"   Diagnosis: {test['diagnosis'][:50]}...")
+        
+        try:
             chunks, timings = retriever.retrieve_relevant_chunks(
                 drug=drug,
                 diagnosis=diagnosis,
                 report_text=test["diagnosis"],  # Use diagnosis as report_text for EK-4 detection
                 top_k=5
             )
+            total_times.append(timings.get('total', 0.0))
+            embedding_times.append(timings.get('embedding_creation', 0.0))
+            vector_times.append(timings.get('vector_search', 0.0))
             
             print(f"\n   Retrieved {len(chunks)} chunks in {timings.get('total', 0):.1f}ms")
             
-            # Check expected terms
-            found_terms = []
-            for chunk in chunks[:3]:
-                content = chunk["metadata"]["content"].lower()
-                for term in test["expected_terms"]:
-                    if term.lower() in content:
-                        found_terms.append(term)
+            # Check expected terms in each of the top 3 chunks separately (a term
+            # must not match across the boundary of two joined chunks)
+            top_contents = [chunk["metadata"]["content"] for chunk in chunks[:3]]
+            lowered_contents = [content.lower() for content in top_contents]
+            found_unique = {
+                term
+                for term, term_lower in zip(test["expected_terms"], test["_terms_lower"])
+                if any(term_lower in content for content in lowered_contents)
+            }
             
-            found_unique = set(found_terms)
             coverage = len(found_unique) / len(test["expected_terms"])
             
             print(f"\n   📊 Term Coverage: {coverage:.1%} ({len(found_unique)}/{len(test['expected_terms'])})")
@@ -190,22 +213,23 @@ def test_known_good_cases():
             doc_types = set(c["metadata"].get("doc_type", "UNKNOWN") for c in chunks)
             print(f"\n   📄 Document Types: {sorted(doc_types)}")
             
-            doc_type_match = True
+            missing_doc_types = set(test["expected_doc_types"]) - doc_types
+            doc_type_match = not missing_doc_types
             for expected_type in test["expected_doc_types"]:
-                if expected_type in doc_types:
-                    print(f"      ✅ Found {expected_type} chunks")
-                else:
+                if expected_type in missing_doc_types:
                     print(f"      ❌ Missing {expected_type} chunks")
-                    doc_type_match = False
+                else:
+                    print(f"      ✅ Found {expected_type} chunks")
             
             # Show top 3 chunks
             print(f"\n   🔍 Top 3 Chunks:")
-            for i, chunk in enumerate(chunks[:3], 1):
-                doc_type = chunk["metadata"].get("doc_type", "UNKNOWN")
+            for i, (chunk, content) in enumerate(zip(chunks, top_contents), 1):
+                md = chunk["metadata"]
+                doc_type = md.get("doc_type", "UNKNOWN")
                 score = chunk.get("score", 0)
                 match_type = chunk.get("match_type", "unknown")
-                section = chunk["metadata"].get("section", "N/A")
-                content_preview = chunk["metadata"]["content"][:80].replace("\n", " ")
+                section = md.get("section", "N/A")
+                content_preview = content[:80].replace("\n", " ")
                 
                 print(f"      [{i}] Score: {score:.3f} | {doc_type} | {match_type} | §{section}")
                 print(f"          {content_preview}...")
@@ -245,7 +269,18 @@ def test_known_good_cases():
     
     # Performance stats
     print(f"\n⚡ Performance:")
-    print(f"   Average retrieval time: Not tracked (add timing if needed)")
+    if total_times:
+        import numpy as np
+        
+        t = np.asarray(total_times)
+        p50, p95 = np.percentile(t, [50, 95])
+        print(f"   Retrieval time: mean {t.mean():.1f}ms | p50 {p50:.1f}ms | p95 {p95:.1f}ms | max {t.max():.1f}ms")
+        print(f"   Embedding call: mean {np.mean(embedding_times):.1f}ms")
+        print(f"   Vector search:  mean {np.mean(vector_times):.1f}ms")
+        if p95 > RETRIEVAL_P95_SLO_MS:
+            print(f"   ⚠️  p95 above {RETRIEVAL_P95_SLO_MS}ms target")
+    else:
+        print(f"   Retrieval time: no successful retrievals")
     
     if failed == 0:
         print(f"\n🎉 All tests passed! Your RAG system is working correctly.")
@@ -7,15 +7,17 @@ This script processes SUT PDF + EK-4 documents, creates chunks, generates embedd
 import logging
 import sys
 import os
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from pathlib import Path
 from typing import List, Dict, Tuple
 
+import numpy as np
+
 # Add project root to path
 project_root = Path(__file__).parent.parent
 sys.path.insert(0, str(project_root))
 
-from openai import OpenAI
-
 from app.config.settings import (
     OPENAI_API_KEY, 
     EMBEDDING_DIMENSION, 
@@ -26,11 +28,11 @@ from app.config.settings import (
     EK4_DOCUMENTS
 )
 
-# Import modules
+# Import modules. Only what process_document needs is imported at module
+# level: spawn-based worker processes re-import this file, and openai (~0.6s)
+# and faiss are only used in the parent (see index_all_documents).
 from app.core.document_processing.pdf_loader import PDFLoader
 from app.core.document_processing.chunker import SUTDocumentChunker
-from app.core.document_processing.embeddings import EmbeddingGenerator
-from app.core.rag.faiss_store import FAISSVectorStore
 from app.models.eligibility import Chunk
 
 # Setup logging
@@ -70,8 +72,44 @@ def process_document(
     return chunks
 
 
+def build_training_sample(
+    document_embeddings: List[List[Dict]],
+    sample_size: int,
+    dimension: int,
+    seed: int = 0
+) -> np.ndarray:
+    """
+    Draw a uniform random sample of vectors across all documents.
+
+    Args:
+        document_embeddings: Per-document embedding data (as returned by create_embeddings)
+        sample_size: Number of vectors to draw
+        dimension: Embedding dimension
+        seed: RNG seed, so rebuilding the index is reproducible
+
+    Returns:
+        (sample_size, d) float32 array
+    """
+    total = sum(len(data) for data in document_embeddings)
+    chosen = np.sort(np.random.default_rng(seed).choice(total, size=sample_size, replace=False))
+
+    flat = (item["values"] for data in document_embeddings for item in data)
+    sample = np.empty((sample_size, dimension), dtype=np.float32)
+    row = 0
+    for position, values in enumerate(flat):
+        if row == sample_size:
+            break
+        if position == chosen[row]:
+            sample[row] = values
+            row += 1
+    return sample
+
+
 def index_all_documents():
     """Main function to index SUT + all EK-4 documents."""
+    from app.core.document_processing.embeddings import EmbeddingGenerator
+    from app.core.rag.faiss_store import FAISSVectorStore
+
     try:
         logger.info("🚀 Starting multi-document indexing process with FAISS")
         logger.info(f"📊 Embedding Provider: {EMBEDDING_PROVIDER}")
@@ -81,70 +119,80 @@ def index_all_documents():
         # Initialize OpenAI client (not needed for OpenRouter embeddings)
         openai_client = None
         if EMBEDDING_PROVIDER == "openai":
+            from openai import OpenAI
             openai_client = OpenAI(api_key=OPENAI_API_KEY)
         
         vector_store = FAISSVectorStore()
         pdf_loader = PDFLoader()
         embedding_generator = EmbeddingGenerator(client=openai_client)
 
-        # ===== Step 1: Process SUT document =====
+        # ===== Step 1-4: Process documents and create embeddings as a pipeline =====
         logger.info("\n" + "="*60)
-        logger.info("STEP 1: Processing Main SUT Document")
+        logger.info(f"STEP 1-4: Processing SUT and EK-4 Documents, Creating Embeddings using {EMBEDDING_PROVIDER}")
         logger.info("="*60)
         
-        sut_chunks = process_document(
-            pdf_path=SUT_PDF_PATH,
-            doc_type="SUT",
-            doc_source=os.path.basename(SUT_PDF_PATH),
-            pdf_loader=pdf_loader
-        )
-
-        # ===== Step 2: Process all EK-4 documents =====
-        logger.info("\n" + "="*60)
-        logger.info("STEP 2: Processing EK-4 Documents")
-        logger.info("="*60)
+        documents = [(SUT_PDF_PATH, "SUT")] + [
+            (pdf_path, f"EK-4/{variant}") for variant, pdf_path in EK4_DOCUMENTS.items()
+        ]
+        document_chunks: List[List[Chunk]] = [[] for _ in documents]
+        embedding_futures = [None] * len(documents)
+        type_counts: Counter = Counter()  # doc_type -> chunk count, filled as documents finish
         
-        ek4_chunks = []
-        for variant, pdf_path in EK4_DOCUMENTS.items():
-            doc_type = f"EK-4/{variant}"
-            doc_source = os.path.basename(pdf_path)
+        # PDF extraction + chunking is pure-Python CPU work; one process per document.
+        # Each document's embeddings start as soon as its chunks arrive, so the
+        # embedding HTTP I/O overlaps parsing of the remaining PDFs.
+        with ProcessPoolExecutor(max_workers=min(len(documents), os.cpu_count() or 1)) as doc_executor, \
+                ThreadPoolExecutor(max_workers=len(documents)) as embed_executor:
+            doc_futures = {
+                doc_executor.submit(
+                    process_document,
+                    pdf_path=pdf_path,
+                    doc_type=doc_type,
+                    doc_source=os.path.basename(pdf_path),
+                    pdf_loader=pdf_loader
+                ): i
+                for i, (pdf_path, doc_type) in enumerate(documents)
+            }
+            for future in as_completed(doc_futures):
+                i = doc_futures[future]
+                document_chunks[i] = future.result()
+                type_counts[documents[i][1]] += len(document_chunks[i])
+                embedding_futures[i] = embed_executor.submit(
+                    embedding_generator.create_embeddings, document_chunks[i]
+                )
             
-            chunks = process_document(
-                pdf_path=pdf_path,
-                doc_type=doc_type,
-                doc_source=doc_source,
-                pdf_loader=pdf_loader
-            )
-            ek4_chunks.extend(chunks)
-        
-        # ===== Step 3: Combine all chunks =====
-        logger.info("\n" + "="*60)
-        logger.info("STEP 3: Combining Chunks")
-        logger.info("="*60)
-        
-        all_chunks = sut_chunks + ek4_chunks
-        logger.info(f"✓ Total chunks: {len(all_chunks)}")
-        logger.info(f"  - SUT chunks: {len(sut_chunks)}")
-        logger.info(f"  - EK-4 chunks: {len(ek4_chunks)}")
-
-        # ===== Step 4: Create embeddings =====
-        logger.info("\n" + "="*60)
-        logger.info(f"STEP 4: Creating Embeddings using {EMBEDDING_PROVIDER}")
-        logger.info("="*60)
-        
-        embeddings_data = embedding_generator.create_embeddings(all_chunks)
-        logger.info(f"✓ Created {len(embeddings_data)} embeddings")
-
-        # ===== Step 5: Create and populate FAISS index =====
-        logger.info("\n" + "="*60)
-        logger.info("STEP 5: Creating FAISS Index")
-        logger.info("="*60)
-        
-        vector_store.create_index(dimension=EMBEDDING_DIMENSION)
-        logger.info(f"✓ Created FAISS index with dimension {EMBEDDING_DIMENSION}")
-
-        logger.info(f"📥 Adding {len(embeddings_data)} vectors to FAISS index")
-        vector_store.add_embeddings(embeddings_data)
+            total_chunks = sum(type_counts.values())
+            logger.info(f"✓ Total chunks: {total_chunks}")
+            logger.info(f"  - SUT chunks: {type_counts['SUT']}")
+            logger.info(f"  - EK-4 chunks: {total_chunks - type_counts['SUT']}")
+
+            # ===== Step 5: Create and populate FAISS index =====
+            logger.info("\n" + "="*60)
+            logger.info("STEP 5: Creating FAISS Index")
+            logger.info("="*60)
+            
+            vector_store.create_index(dimension=EMBEDDING_DIMENSION, expected_vectors=total_chunks)
+            logger.info(f"✓ Created FAISS index with dimension {EMBEDDING_DIMENSION}")
+
+            if vector_store.needs_training():
+                # IVF centroids must cover every document, not just the first one
+                # to finish, so wait for all embeddings and train on a sample
+                document_embeddings = [future.result() for future in embedding_futures]
+                vector_store.train(build_training_sample(
+                    document_embeddings,
+                    vector_store.training_sample_size(total_chunks),
+                    vector_store.index.d
+                ))
+                del document_embeddings
+
+            # Add each document's vectors as soon as they are ready (in document
+            # order, so chunk positions match a sequential run) and drop them
+            for i, (_, doc_type) in enumerate(documents):
+                embeddings_data = embedding_futures[i].result()
+                embedding_futures[i] = None  # The future would otherwise keep the vectors alive
+                logger.info(f"📥 Adding {len(embeddings_data)} {doc_type} vectors to FAISS index")
+                vector_store.add_embeddings(embeddings_data)
+                del embeddings_data
 
         # ===== Step 6: Save index to disk =====
         logger.info("\n" + "="*60)
@@ -166,11 +214,11 @@ def index_all_documents():
         logger.info(f"  - Index type: {stats['index_type']}")
         
         # Document breakdown
-        sut_count = len([c for c in all_chunks if c.metadata.doc_type == "SUT"])
-        ek4_d = len([c for c in all_chunks if c.metadata.doc_type == "EK-4/D"])
-        ek4_e = len([c for c in all_chunks if c.metadata.doc_type == "EK-4/E"])
-        ek4_f = len([c for c in all_chunks if c.metadata.doc_type == "EK-4/F"])
-        ek4_g = len([c for c in all_chunks if c.metadata.doc_type == "EK-4/G"])
+        sut_count = type_counts["SUT"]
+        ek4_d = type_counts["EK-4/D"]
+        ek4_e = type_counts["EK-4/E"]
+        ek4_f = type_counts["EK-4/F"]
+        ek4_g = type_counts["EK-4/G"]
         
         logger.info(f"\n� Document Breakdown:")
         logger.info(f"  - SUT: {sut_count} chunks")
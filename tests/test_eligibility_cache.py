@@ -0,0 +1,161 @@
+"""
+Tests for the eligibility result cache and batch planning in EligibilityChecker.
+"""
+
+import sys
+from datetime import date
+from pathlib import Path
+
+import pytest
+
+# Add project root to path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from app.core.llm import eligibility_checker
+from app.core.llm.eligibility_checker import EligibilityChecker, EligibilityResultCache
+from app.models.eligibility import Condition, EligibilityResult
+from app.models.report import Diagnosis, DoctorInfo, Drug, PatientInfo
+
+DIAGNOSIS = Diagnosis(icd10_code="E78.0", tanim="Saf hiperkolesterolemi")
+PATIENT = PatientInfo(cinsiyet="Erkek", yas=58)
+DOCTOR = DoctorInfo(name="Dr. Test", specialty="Kardiyoloji", diploma="123")
+CHUNKS = [{"id": "sut_1", "metadata": {"content": "4.2.28 - LDL > 190 mg/dL", "doc_type": "SUT"}}]
+
+
+def _drug(name: str) -> Drug:
+    return Drug(
+        kod="SGKF07", etkin_madde=name, form="Ağızdan katı", tedavi_sema="Günde 1 x 1",
+        miktar=1, eklenme_zamani=date(2025, 1, 1)
+    )
+
+
+def _result(name: str) -> EligibilityResult:
+    return EligibilityResult(
+        drug_name=name,
+        status="ELIGIBLE",
+        confidence=0.9,
+        sut_reference="4.2.28",
+        conditions=[Condition(description="LDL > 190", is_met=True)],
+        explanation="Uygun",
+        warnings=[],
+    )
+
+
+class FakeClient:
+    """Stands in for OpenAIClientWrapper; records every call."""
+
+    def __init__(self):
+        self.calls = []
+
+    def chat_completion_json(self, system_prompt, user_prompt, **kwargs):
+        self.calls.append(kwargs)
+        return {
+            "drug_name": "EZETIMIB",
+            "status": "ELIGIBLE",
+            "confidence": 0.9,
+            "sut_reference": "4.2.28",
+            "conditions": [],
+            "explanation": "Uygun",
+            "warnings": [],
+        }
+
+
+def _key(checker: EligibilityChecker, drug_name: str = "EZETIMIB") -> str:
+    return checker._result_cache_key(_drug(drug_name), DIAGNOSIS, PATIENT, DOCTOR, CHUNKS, None, None)
+
+
+def test_result_cache_roundtrip_and_ttl(tmp_path):
+    cache = EligibilityResultCache(str(tmp_path / "cache.sqlite"), ttl=3600)
+    cache.put("key", _result("EZETIMIB"))
+    assert cache.get("key") == _result("EZETIMIB")
+
+    expired = EligibilityResultCache(str(tmp_path / "cache.sqlite"), ttl=-1)
+    assert expired.get("key") is None
+
+
+@pytest.mark.parametrize("stored", ["{not json", '{"drug_name": "X", "conditions": [], "removed_field": 1}'])
+def test_unreadable_cache_row_is_a_miss_and_deleted(tmp_path, stored):
+    cache = EligibilityResultCache(str(tmp_path / "cache.sqlite"), ttl=3600)
+    cache._conn.execute(
+        "INSERT INTO results (key, result_json, created_at) VALUES (?, ?, strftime('%s','now'))",
+        ("key", stored)
+    )
+    assert cache.get("key") is None
+    assert cache._conn.execute("SELECT COUNT(*) FROM results").fetchone()[0] == 0
+
+
+def test_cache_key_tracks_inputs_and_prompt_templates(monkeypatch):
+    checker = EligibilityChecker(openai_client=FakeClient())
+    assert _key(checker) == _key(EligibilityChecker(openai_client=FakeClient()))
+    assert _key(checker) != _key(checker, "ATORVASTATIN")
+
+    # Editing the batch prompt text invalidates every stored result
+    original = EligibilityChecker._build_batch_prompt
+    monkeypatch.setattr(
+        EligibilityChecker, "_build_batch_prompt",
+        lambda self, *args: original(self, *args) + "\nYeni kural."
+    )
+    assert _key(EligibilityChecker(openai_client=FakeClient())) != _key(checker)
+
+
+def test_use_cache_false_bypasses_both_caches(tmp_path, monkeypatch):
+    cache = EligibilityResultCache(str(tmp_path / "cache.sqlite"), ttl=3600)
+    monkeypatch.setattr(EligibilityChecker, "_get_result_cache", lambda self: cache)
+    client = FakeClient()
+    checker = EligibilityChecker(openai_client=client)
+    kwargs = dict(
+        drug=_drug("EZETIMIB"), diagnosis=DIAGNOSIS, patient=PATIENT, doctor=DOCTOR, sut_chunks=CHUNKS
+    )
+
+    checker.check_eligibility(**kwargs)
+    checker.check_eligibility(**kwargs)
+    assert len(client.calls) == 1  # Second call served from the result cache
+
+    checker.check_eligibility(**kwargs, use_cache=False)
+    assert len(client.calls) == 2
+    assert client.calls[-1]["bypass_cache"] is True
+
+
+def test_plan_batches_respects_size_and_order(monkeypatch):
+    monkeypatch.setattr(eligibility_checker, "MAX_BATCH_SIZE", 2)
+    checker = EligibilityChecker(openai_client=FakeClient())
+    drugs = [_drug(name) for name in ("A", "B", "C", "D", "E")]
+    groups = checker._plan_batches(drugs, {drug.etkin_madde: CHUNKS for drug in drugs})
+    assert [[drug.etkin_madde for drug in group] for group in groups] == [["A", "B"], ["C", "D"], ["E"]]
+
+
+def test_plan_batches_splits_on_token_budget(monkeypatch):
+    big_chunks = [{"metadata": {"content": "kural " * 2000, "doc_type": "SUT"}}]
+    checker = EligibilityChecker(openai_client=FakeClient())
+    section_tokens = eligibility_checker._estimate_tokens(
+        checker._build_drug_section(1, 1, _drug("A"), big_chunks)
+    )
+    # Room for one drug section per call, not two
+    monkeypatch.setattr(
+        eligibility_checker, "MAX_PROMPT_TOKENS",
+        eligibility_checker.BATCH_PROMPT_OVERHEAD_TOKENS + section_tokens + section_tokens // 2
+    )
+    drugs = [_drug("A"), _drug("B")]
+    groups = checker._plan_batches(drugs, {"A": big_chunks, "B": big_chunks})
+    assert [len(group) for group in groups] == [1, 1]
+
+
+def test_no_cache_keys_without_result_cache(monkeypatch):
+    monkeypatch.setattr(EligibilityChecker, "_get_result_cache", lambda self: None)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("cache key computed with the result cache disabled")
+
+    monkeypatch.setattr(EligibilityChecker, "_result_cache_key", fail)
+    checker = EligibilityChecker(openai_client=FakeClient())
+    result = checker.check_eligibility(
+        drug=_drug("EZETIMIB"), diagnosis=DIAGNOSIS, patient=PATIENT, doctor=DOCTOR, sut_chunks=CHUNKS
+    )
+    assert result.status == "ELIGIBLE"
+    results = checker.check_multiple_drugs(
+        drugs=[_drug("EZETIMIB"), _drug("ATORVASTATIN")], diagnoses=[DIAGNOSIS], patient=PATIENT,
+        doctor=DOCTOR, sut_chunks_per_drug={"EZETIMIB": CHUNKS, "ATORVASTATIN": CHUNKS}
+    )
+    assert len(results) == 2
+    assert "_prompt_fingerprint" not in vars(checker)
@@ -0,0 +1,107 @@
+"""
+Tests for FAISSVectorStore persistence and filtering.
+"""
+
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+# Add project root to path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from app.core.rag import faiss_store
+from app.core.rag.faiss_store import FAISSVectorStore
+
+DIMENSION = 16
+
+
+def _embeddings(vectors, doc_types=None):
+    return [
+        {
+            "id": f"chunk_{i}",
+            "values": vector,
+            "metadata": {
+                "content": f"İçerik {i}",
+                "doc_type": doc_types[i] if doc_types else "SUT",
+                "etkin_madde": [],
+            },
+        }
+        for i, vector in enumerate(vectors)
+    ]
+
+
+@pytest.fixture
+def ivf_store(monkeypatch):
+    """Trained IVF store with 600 random vectors."""
+    monkeypatch.setattr(faiss_store, "FAISS_IVF_MIN_VECTORS", 100)
+    vectors = np.random.default_rng(0).standard_normal((600, DIMENSION)).astype(np.float32)
+    store = FAISSVectorStore()
+    store.create_index(DIMENSION, expected_vectors=len(vectors))
+    store.train(vectors)
+    store.add_embeddings(_embeddings(vectors))
+    return store, vectors
+
+
+def test_mmap_loaded_ivf_index_accepts_writes(ivf_store, tmp_path):
+    """A memory-mapped IVF index is re-read into RAM before add/reset."""
+    store, vectors = ivf_store
+    index_path, metadata_path = str(tmp_path / "index"), str(tmp_path / "metadata.json")
+    store.save(index_path, metadata_path)
+
+    loaded = FAISSVectorStore()
+    loaded.load(index_path, metadata_path)
+    loaded.add_embeddings([{"id": "extra", "values": vectors[0], "metadata": {"content": "x"}}])
+    assert loaded.index.ntotal == len(vectors) + 1
+    assert loaded.search(vectors[0], top_k=1)[0]["id"] in ("chunk_0", "extra")
+
+    cleared = FAISSVectorStore()
+    cleared.load(index_path, metadata_path)
+    cleared.delete_all()
+    assert cleared.index.ntotal == 0
+    assert cleared.index.is_trained
+    assert cleared.metadata == []
+
+
+@pytest.fixture
+def flat_store():
+    """Flat store with alternating SUT / EK-4/D chunks."""
+    vectors = np.random.default_rng(1).standard_normal((20, DIMENSION)).astype(np.float32)
+    store = FAISSVectorStore()
+    store.create_index(DIMENSION)
+    store.add_embeddings(_embeddings(vectors, ["SUT" if i % 2 == 0 else "EK-4/D" for i in range(20)]))
+    return store, vectors
+
+
+def test_filtered_search_returns_only_matching_chunks(flat_store):
+    store, vectors = flat_store
+    results = store.search(vectors[1], top_k=5, filters={"doc_type": "SUT"})
+    assert len(results) == 5
+    assert all(result["metadata"]["doc_type"] == "SUT" for result in results)
+
+
+def test_filter_id_cache_is_invalidated_by_writes(flat_store):
+    store, vectors = flat_store
+    assert len(store._ids_matching({"doc_type": "EK-4/D"})) == 10
+    store.add_embeddings(_embeddings(vectors[:1], ["EK-4/D"]))
+    assert len(store._ids_matching({"doc_type": "EK-4/D"})) == 11
+
+
+def test_unhashable_filter_values_are_scanned_uncached(flat_store):
+    store, _ = flat_store
+    ids = store._ids_matching({"etkin_madde": []})
+    assert len(ids) == 20
+    assert store._filter_ids == {}
+
+
+def test_save_writes_only_index_and_json_metadata(flat_store, tmp_path):
+    store, vectors = flat_store
+    store.save(str(tmp_path / "index"), str(tmp_path / "metadata.json"))
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["index", "metadata.json"]
+
+    loaded = FAISSVectorStore()
+    loaded.load(str(tmp_path / "index"), str(tmp_path / "metadata.json"))
+    assert loaded.metadata == store.metadata
+    assert loaded.id_to_idx == store.id_to_idx
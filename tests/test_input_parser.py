@@ -0,0 +1,50 @@
+"""
+Tests for the text preprocessing done by InputParser before the LLM call.
+"""
+
+import sys
+from pathlib import Path
+
+# Add project root to path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from app.core.parsers.input_parser import _strip_unused_sections
+
+
+def test_personal_fields_are_removed():
+    text = (
+        "Rapor No: 277870\n"
+        "HASTA BİLGİLERİ\n"
+        "ADI SOYADI: ALİ KAYA\n"
+        "T.C. KİMLİK NO\t12345678901\n"
+        "\n"
+        "Doğum Tarihi: 01/01/1966\n"
+        "Tanı Bilgileri\n"
+        "I25.1 Aterosklerotik Kalp Hastalığı"
+    )
+    assert _strip_unused_sections(text) == (
+        "Rapor No: 277870\n"
+        "Tanı Bilgileri\n"
+        "I25.1 Aterosklerotik Kalp Hastalığı"
+    )
+
+
+def test_clinical_lines_after_personal_section_are_kept_without_known_header():
+    text = (
+        "Hasta Bilgileri\n"
+        "Ad Soyad: Ahmet Yılmaz\n"
+        "Tanı: G62.9 POLİNÖROPATİ, TANIMLANMAMIŞ\n"
+        "İlaçlar:\n"
+        "SGKF07 EZETIMIB - Günde 1x1 Adet"
+    )
+    assert _strip_unused_sections(text) == (
+        "Tanı: G62.9 POLİNÖROPATİ, TANIMLANMAMIŞ\n"
+        "İlaçlar:\n"
+        "SGKF07 EZETIMIB - Günde 1x1 Adet"
+    )
+
+
+def test_text_without_personal_section_is_unchanged():
+    text = "Tanı Bilgileri\nE78.0 Saf hiperkolesterolemi\n\nAçıklamalar:\nLDL 190 mg/dL"
+    assert _strip_unused_sections(text) == text
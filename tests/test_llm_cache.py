@@ -0,0 +1,129 @@
+"""
+Tests for the LLM response cache and JSON mode fallback in OpenAIClientWrapper.
+"""
+
+import sys
+from pathlib import Path
+
+import httpx
+import pytest
+from openai import BadRequestError
+
+# Add project root to path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from app.core.llm.openai_client import LLMResponseCache, OpenAIClientWrapper
+
+
+@pytest.fixture
+def wrapper(tmp_path, monkeypatch):
+    """Wrapper with a temporary response cache and a fake model that counts calls."""
+    client = OpenAIClientWrapper(api_key="test-key", provider="openrouter")
+    cache = LLMResponseCache(str(tmp_path / "llm_cache.sqlite"), ttl=3600)
+    monkeypatch.setattr(client, "_get_response_cache", lambda: cache)
+
+    calls = []
+
+    def fake_send(system_prompt, user_prompt, response_format, stream):
+        calls.append(user_prompt)
+        return f'{{"answer": {len(calls)}}}'
+
+    monkeypatch.setattr(client, "_send_chat_completion", fake_send)
+    return client, cache, calls
+
+
+def test_response_cache_roundtrip_and_ttl(tmp_path):
+    cache = LLMResponseCache(str(tmp_path / "cache.sqlite"), ttl=3600)
+    cache.put("key", "yanıt")
+    assert cache.get("key") == "yanıt"
+    assert cache.get("other") is None
+
+    expired = LLMResponseCache(str(tmp_path / "cache.sqlite"), ttl=-1)
+    assert expired.get("key") is None
+
+
+def test_identical_request_is_served_from_cache(wrapper):
+    client, _, calls = wrapper
+    first = client.chat_completion("system", "user", response_format={"type": "json_object"})
+    second = client.chat_completion("system", "user", response_format={"type": "json_object"})
+    assert first == second
+    assert len(calls) == 1
+
+    # Any change to the prompt is a different key
+    client.chat_completion("system", "user 2", response_format={"type": "json_object"})
+    assert len(calls) == 2
+
+
+def test_use_cache_false_neither_reads_nor_writes(wrapper):
+    client, cache, calls = wrapper
+    client.chat_completion("system", "rapor metni", use_cache=False)
+    client.chat_completion("system", "rapor metni", use_cache=False)
+    assert len(calls) == 2
+    assert cache._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0] == 0
+
+
+def test_stream_use_cache_false_neither_reads_nor_writes(wrapper, monkeypatch):
+    client, cache, _ = wrapper
+    streamed = []
+
+    def fake_iter_stream(kwargs, api_start):
+        streamed.append(kwargs)
+        yield "ya"
+        yield "nıt"
+
+    monkeypatch.setattr(client, "_iter_stream", fake_iter_stream)
+    cache.put(client._response_cache_key("system", "rapor metni", None), "önbellek")
+
+    assert "".join(client.chat_completion_stream("system", "rapor metni", use_cache=False)) == "yanıt"
+    assert "".join(client.chat_completion_stream("system", "yeni rapor", use_cache=False)) == "yanıt"
+    assert len(streamed) == 2
+    assert cache._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0] == 1
+
+    # Cached by default; bypass_cache skips the read but still writes
+    assert "".join(client.chat_completion_stream("system", "rapor metni")) == "önbellek"
+    assert "".join(client.chat_completion_stream("system", "rapor metni", bypass_cache=True)) == "yanıt"
+    assert len(streamed) == 3
+    assert cache.get(client._response_cache_key("system", "rapor metni", None)) == "yanıt"
+
+
+def test_json_bypass_cache_reaches_model(wrapper):
+    client, _, calls = wrapper
+    client.chat_completion_json("system", "user")
+    result = client.chat_completion_json("system", "user", bypass_cache=True)
+    assert len(calls) == 2
+    assert result == {"answer": 2}
+
+
+def _bad_request(message: str) -> BadRequestError:
+    response = httpx.Response(400, request=httpx.Request("POST", "https://openrouter.ai/api/v1/chat/completions"))
+    return BadRequestError(message, response=response, body={"error": {"message": message}})
+
+
+@pytest.mark.parametrize("message, falls_back", [
+    ("Invalid parameter: 'response_format' of type 'json_schema' is not supported with this model.", True),
+    ("This model's maximum context length is 128000 tokens.", False),
+])
+def test_only_schema_rejections_disable_structured_outputs(monkeypatch, message, falls_back):
+    client = OpenAIClientWrapper(api_key="test-key", provider="openrouter")
+    client.structured_outputs = True
+    formats = []
+
+    def fake_chat_completion(system_prompt, user_prompt, response_format, bypass_cache):
+        formats.append(response_format["type"])
+        if response_format["type"] == "json_schema":
+            raise _bad_request(message)
+        return "{}"
+
+    monkeypatch.setattr(client, "chat_completion", fake_chat_completion)
+    schema = {"name": "result", "schema": {"type": "object"}}
+
+    if falls_back:
+        assert client._json_completion("system", "user", schema, bypass_cache=False) == "{}"
+        assert formats == ["json_schema", "json_object"]
+        assert client.structured_outputs is False
+    else:
+        with pytest.raises(BadRequestError):
+            client._json_completion("system", "user", schema, bypass_cache=False)
+        assert formats == ["json_schema"]
+        assert client.structured_outputs is True